@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite连接参数基准测试
+
+对比旧的默认连接参数(回滚日志、synchronous=FULL、无mmap)与 SQLITE_PRAGMA_DEFAULTS
+在多进程并发读写下的吞吐量。每个进程模拟一个gunicorn工作进程, 按比例执行
+按uid查询用户(读)和更新 lastLogin(写)。
+
+用法:
+    python benchmarks/sqlite_profile.py [--workers N] [--seconds S] [--write-ratio R]
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import logging
+import argparse
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from magic.utils.db.adapters import SQLiteAdapter  # noqa: E402
+from magic.utils.db.migrations import MigrateDatabase  # noqa: E402
+from magic.utils.db.models import UserModel  # noqa: E402
+
+
+PREFIX = "bench_"
+USERS = 10000
+
+# 改动前 sqlite3.connect 的默认行为(Python默认等待锁5秒)
+LEGACY_PROFILE = {
+    "busy_timeout": 5000,
+    "journal_mode": "DELETE",
+    "synchronous": "FULL",
+    "mmap_size": 0,
+    "cache_size": -2000,
+    "temp_store": "DEFAULT",
+}
+PROFILES = {
+    "legacy": LEGACY_PROFILE,
+    "tuned": {},  # 使用 SQLITE_PRAGMA_DEFAULTS
+}
+
+
+def _prepare(path: str, pragmas: dict) -> None:
+    """建表并写入测试用户"""
+    db = SQLiteAdapter({"path": path, "prefix": PREFIX, "type": "sqlite", "pragmas": pragmas})
+    db.connect()
+    MigrateDatabase(db)
+    UserModel.set_table_name(f"{PREFIX}users")
+    UserModel.bulk_create(db, ({"name": f"user{i}", "mail": f"user{i}@example.com"} for i in range(USERS)))
+    db.close()
+
+
+def _worker(path: str, pragmas: dict, seconds: float, write_ratio: float, result: "multiprocessing.Queue") -> None:
+    """在限定时间内循环执行读写, 返回 (读次数, 写次数, 锁错误次数)"""
+    logging.disable(logging.CRITICAL)
+    db = SQLiteAdapter({"path": path, "prefix": PREFIX, "type": "sqlite", "pragmas": pragmas})
+    db.connect()
+    rnd = random.Random(os.getpid())
+    reads = writes = locked = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        uid = rnd.randint(1, USERS)
+        try:
+            if rnd.random() < write_ratio:
+                db.execute(f"UPDATE {PREFIX}users SET lastLogin = ? WHERE uid = ?", (int(time.time()), uid))
+                db.commit()
+                writes += 1
+            else:
+                db.execute(f"SELECT uid, name, mail, `group` FROM {PREFIX}users WHERE uid = ?", (uid,))
+                db.fetchone()
+                reads += 1
+        except sqlite3.OperationalError:
+            locked += 1
+            db.rollback()
+    db.close()
+    result.put((reads, writes, locked))
+
+
+def run_profile(name: str, workers: int, seconds: float, write_ratio: float) -> dict:
+    """在新数据库上运行一个配置"""
+    pragmas = PROFILES[name]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        _prepare(path, pragmas)
+        result: multiprocessing.Queue = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=_worker, args=(path, pragmas, seconds, write_ratio, result))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        totals = [result.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    reads = sum(item[0] for item in totals)
+    writes = sum(item[1] for item in totals)
+    locked = sum(item[2] for item in totals)
+    return {
+        "profile": name,
+        "reads/s": reads / seconds,
+        "writes/s": writes / seconds,
+        "locked": locked,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SQLite连接参数基准测试")
+    parser.add_argument("--workers", type=int, default=(os.cpu_count() or 1) * 2 + 1, help="并发进程数, 默认与gunicorn配置相同")
+    parser.add_argument("--seconds", type=float, default=5.0, help="每个配置的运行时间(秒)")
+    parser.add_argument("--write-ratio", type=float, default=0.1, help="写操作占比")
+    args = parser.parse_args()
+
+    print(f"workers={args.workers} seconds={args.seconds} write_ratio={args.write_ratio} sqlite={sqlite3.sqlite_version}")
+    print(f"{'profile':<8} {'reads/s':>10} {'writes/s':>10} {'locked':>8}")
+    for name in PROFILES:
+        row = run_profile(name, args.workers, args.seconds, args.write_ratio)
+        print(f"{row['profile']:<8} {row['reads/s']:>10.0f} {row['writes/s']:>10.0f} {row['locked']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ from flask import Flask
 from flask_cors import CORS
 from werkzeug.middleware.proxy_fix import ProxyFix
 from magic.utils.TomlConfig import check_config_file
+from magic.utils.db import InitDatabaseContext, LoadSiteOptionsCache, db_orm
 from magic.utils.Mail import init_mail, load_matl_config
 from magic.utils.log2 import logger, _is_reload  # noqa: F401
 from magic.PluginSystem import init_plugin_system
@@ -25,6 +26,9 @@ def Init_module(app: Flask) -> None:
     """初始化模块"""
     
     check_config_file()
+    if InitDatabaseContext() is not None:
+        LoadSiteOptionsCache()
+    db_orm.init_app(app)
     plugin_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'contents', 'plugin')
     plugin_manager = init_plugin_system(plugin_dir)
     plugin_manager.load_plugins()
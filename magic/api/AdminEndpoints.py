@@ -9,15 +9,18 @@ import json
 from flask import Blueprint, Response, request
 from admin import admin_required
 from magic.utils.jwt import GetCurrentUserIdentity
-from magic.utils.TomlConfig import DoesitexistConfigToml
 from magic.utils.db import (
+    db_orm,
     GetUserRoleByIdentity,
     GetUserCount,
     GetUserNameByIdentity,
     GetSiteOptionByName,
-    GetOrSetSiteOption,
+    SetSiteOptions,
+    GetIdentityCacheStats,
+    GetSiteOptionsCacheStats,
     SearchUsers
 )
+from magic.utils.db.db_utils import SEARCH_MAX_LIMIT
 
 
 admin_bp = Blueprint('admin', __name__)
@@ -94,22 +97,26 @@ def admin_get_name_options() -> Response:
 @admin_bp.route('/users/search', methods=['GET'])
 @admin_required
 def admin_search_users() -> Response:
-    """搜索用户API"""
+    """搜索用户API
+
+    参数: q 关键词, after 上一页最后一个用户的uid, limit 每页条数;
+    返回的 next_after 不为null时可用于请求下一页
+    """
     keyword = request.args.get('q', '').strip()
     
     if not keyword:
-        return Response('{"users": []}', mimetype='application/json')
+        return Response('{"users": [], "next_after": null}', mimetype='application/json')
     try:
-        results = SearchUsers(keyword)
+        limit = max(1, min(request.args.get('limit', 50, type=int), SEARCH_MAX_LIMIT))
+        results = SearchUsers(keyword, after_uid=request.args.get('after', 0, type=int), limit=limit)
         if isinstance(results, list) and results and isinstance(results[0], dict):
-            return Response(json.dumps({"users": results}), mimetype='application/json')
-        elif isinstance(results, list) and not results:
-            return Response('{"users": []}', mimetype='application/json')
+            next_after = results[-1]['id'] if len(results) >= limit else None
+            return Response(json.dumps({"users": results, "next_after": next_after}), mimetype='application/json')
         else:
-            return Response('{"users": []}', mimetype='application/json')
+            return Response('{"users": [], "next_after": null}', mimetype='application/json')
     except Exception as e:
         logging.error(f"搜索用户API出错: {e}")
-        return Response('{"users": []}', mimetype='application/json')
+        return Response('{"users": [], "next_after": null}', mimetype='application/json')
 
 
 @admin_bp.route('/set_name_options', methods=['POST'])
@@ -123,26 +130,38 @@ def admin_set_name_options() -> Response:
         site_description = request.json.get('site_description').strip()
         site_keywords = request.json.get('site_keywords').strip()
         enable_registration = str(request.json.get('enable_registration')).lower()
-        db_prefix = DoesitexistConfigToml("db", "sql_prefix")
-        sql_sqlite_path = DoesitexistConfigToml("db", "sql_sqlite_path")
-
-        if not db_prefix or not sql_sqlite_path:
-            return Response("数据库配置缺失", mimetype='text/plain')
-
-        # 保存网站名称
-        result_name = GetOrSetSiteOption(db_prefix, sql_sqlite_path, 'site_name', site_name)
-        # 保存网站描述
-        result_description = GetOrSetSiteOption(db_prefix, sql_sqlite_path, 'site_description', site_description)
-        # 保存网站关键词
-        result_keywords = GetOrSetSiteOption(db_prefix, sql_sqlite_path, 'site_keywords', site_keywords)
-        # 保存允许用户注册设置
-        result_registration = GetOrSetSiteOption(db_prefix, sql_sqlite_path, 'enable_registration', enable_registration)
-        
-        if result_name[0] and result_description[0] and result_keywords[0] and result_registration[0]:
+
+        # 一次保存网站名称、描述、关键词和允许用户注册设置
+        result = SetSiteOptions({
+            'site_name': site_name,
+            'site_description': site_description,
+            'site_keywords': site_keywords,
+            'enable_registration': enable_registration,
+        })
+
+        if result[0]:
             return Response("网站设置保存成功", mimetype='text/plain')
         else:
-            print(f'网站设置保存失败喵: {result_name[1]}, {result_description[1]}, {result_keywords[1]}, {result_registration[1]}')
-            return Response(f"网站设置保存失败: {result_name[1]}, {result_description[1]}, {result_keywords[1]}, {result_registration[1]}", mimetype='text/plain')
+            print(f'网站设置保存失败喵: {result[1]}')
+            return Response(f"网站设置保存失败: {result[1]}", mimetype='text/plain')
     except Exception as e:
         logging.error(f'保存全局设置失败喵: {e}')
         return Response(f'保存全局设置失败: {e}', mimetype='text/plain')
+
+
+@admin_bp.route('/metrics/db', methods=['GET'])
+@admin_required
+def admin_get_db_metrics() -> Response:
+    """数据库连接池和缓存指标, 数据来自当前工作进程"""
+    try:
+        metrics = {
+            "pools": db_orm.get_metrics(),
+            "caches": {
+                "identity": GetIdentityCacheStats(),
+                "site_options": GetSiteOptionsCacheStats(),
+            },
+        }
+        return Response(json.dumps(metrics), mimetype='application/json')
+    except Exception as e:
+        logging.error(f"获取数据库连接池指标失败: {e}")
+        return Response('{"pools": {}}', mimetype='application/json')
@@ -20,7 +20,7 @@ from magic.utils.Mail import mail, SMTP_CONFIG
 from magic.utils.Argon2Password import VerifyPassword, HashPassword
 from magic.utils.jwt import CreateTokens, GetCurrentUserIdentity
 from magic.utils.TomlConfig import DoesitexistConfigToml
-from magic.utils.db import db_orm, GetUserByEmail, GetDbConnection
+from magic.utils.db import db_orm, GetUserByEmail, CheckUserEmailExists, GetDatabaseContext, Query
 from magic.utils.cookies import cookie_manager
 from magic.PluginSystem import call_plugin_hook
 from magic.middleware.response import response_handler
@@ -120,10 +120,10 @@ class auth:
         if not user:
             return response_handler.custom_error_response("邮箱或密码错误喵喵")
         
-        if not VerifyPassword(user['password'], data["password"]):
+        if not VerifyPassword(user.password, data["password"]):
             return response_handler.custom_error_response("邮箱或密码错误喵喵")
         
-        tokens = CreateTokens(identity=str(user['uid']))
+        tokens = CreateTokens(identity=str(user.uid))
         if not tokens:
             return response_handler.error_response("生成令牌失败喵喵")
 
@@ -131,10 +131,10 @@ class auth:
         refresh_token = tokens['lmoadll_refresh_token']
 
         response_data = {
-            "uid": user['uid'],
-            "name": user['name'],
+            "uid": user.uid,
+            "name": user.name,
             "avatar": "",
-            "group": user['group']
+            "group": user.group
         }
             
         """
@@ -152,21 +152,13 @@ class auth:
         # response = cookie_manager.set_access_token(response, access_token)
 
         try:
-            db = db_orm.get_db("default")
-            success, message, _, _, table_name = GetDbConnection("users")
-            if success:
+            context = GetDatabaseContext()
+            with db_orm.connection(context.name) as db:
                 current_time = int(time.time())  # 获取当前时间戳
-                # 使用同一个连接执行更新操作
-                db.execute(f"UPDATE {table_name} SET lastLogin = ? WHERE uid = ?", (current_time, user['uid']))
+                db.execute(f"UPDATE {context.table('users')} SET lastLogin = ? WHERE uid = ?", (current_time, user['uid']))
                 db.commit()
         except Exception as e:
             logging.warning(f"更新用户最后登录时间失败喵: {e}")
-        finally:
-            # 确保连接被归还到连接池
-            try:
-                db_orm.return_db(db, "default")
-            except:
-                pass
 
         return response
 
@@ -214,14 +206,20 @@ class auth:
         if user_identity is None:
             return response_handler.custom_error_response("用户未登录喵喵")
         
-        success, message, db, cursor, table_name = GetDbConnection("users")
-        if not success:
-            return response_handler.error_response(f"数据库连接失败喵喵: {message}")
+        try:
+            context = GetDatabaseContext()
+        except Exception as e:
+            return response_handler.error_response(f"数据库连接失败喵喵: {e}")
         
         try:
             # 查询用户详细信息
-            cursor.execute(f"SELECT uid, name, mail, createdAt, lastLogin FROM {table_name} WHERE uid = ?", (user_identity,))
-            user = cursor.fetchone()
+            with db_orm.connection(context.name) as db:
+                user = (
+                    Query(context.table("users"))
+                    .select("uid", "name", email="mail", RegisterTime="createdAt", LastLoginTime="lastLogin")
+                    .where(uid=user_identity)
+                    .first(db)
+                )
             
             if not user:
                 return response_handler.custom_error_response("用户不存在喵喵")
@@ -232,21 +230,11 @@ class auth:
             for result in user_info_results:
                 if result and isinstance(result, dict):
                     user_meta.update(result)
-            user_info = {
-                "uid": user[0],
-                "name": user[1],
-                "email": user[2],
-                "RegisterTime": user[3],
-                "LastLoginTime": user[4],
-                **user_meta
-            }
+            user_info = {**user._asdict(), **user_meta}
             return user_info
         except Exception as e:
             logging.error(f"查询用户信息时出错喵: {e}")
             return response_handler.error_response("查询用户信息失败喵喵")
-        finally:
-            if db:
-                db_orm.return_db(db, "default")
 
 
     @staticmethod
@@ -315,8 +303,7 @@ class auth:
             return response_handler.error_response("读取配置失败喵喵")
         
         try:
-            user = GetUserByEmail(email)
-            if user:
+            if CheckUserEmailExists(email):
                 return response_handler.custom_error_response("该邮箱已被注册喵喵")
         except Exception as e:
             logging.error(f"检查邮箱是否已存在时出错喵喵: {str(e)}")
@@ -332,14 +319,16 @@ class auth:
             
         # 创建新用户
         try:
-            success, message, db, cursor, table_name = GetDbConnection("users")
-            if not success:
-                print(f"数据库连接失败: {message}")
-                return response_handler.error_response(f"数据库连接失败喵喵: {message}")
-            try:
+            context = GetDatabaseContext()
+        except Exception as e:
+            print(f"数据库连接失败: {e}")
+            return response_handler.error_response(f"数据库连接失败喵喵: {e}")
+
+        try:
+            with db_orm.connection(context.name) as db:
                 current_time = int(time.time())
-                cursor.execute(
-                    f"INSERT INTO {table_name} (name, password, mail, `group`, createdAt, isActive, isLoggedIn) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                db.execute(
+                    f"INSERT INTO {context.table('users')} (name, password, mail, `group`, createdAt, isActive, isLoggedIn) VALUES (?, ?, ?, ?, ?, ?, ?)",
                     (
                         username,              # name
                         password_hash,         # password
@@ -355,39 +344,30 @@ class auth:
                 db.commit()
                 
                 # 获取插入的用户ID
-                inserted_user_id = cursor.lastrowid
-                
-                # 成功后删除验证码
-                if email in verification_codes:
-                    del verification_codes[email]
-                
-                # 生成返回的用户信息
-                # 注：头像、记忆点、签到状态等字段为模拟数据;
-                # [ ] TODO 需要头像、记忆点、签到状态等字段
-                user_info = {
-                    "uid": inserted_user_id,
-                    "name": username,
-                    "avatar": f"/api/files/avatar/{inserted_user_id}.png",         # 模拟头像URL
-                    "avatarMin": f"/api/files/avatar/{inserted_user_id}_min.png",  # 模拟小头像URL
-                    "moemoepoint": 0,             # 初始记忆点为0
-                    "role": "user",               # 角色为user
-                    "isChechIn": False,           # 未签到
-                    "dailyToolsetUploadCount": 0  # 每日上传数量为0
-                }
-                return user_info
-            except Exception as e:
-                # 回滚事务
-                if db:
-                    db.rollback()
-                logging.error(f"创建用户时出错: {str(e)}")
-                return response_handler.error_response(f"创建用户失败喵喵: {str(e)}")
-            finally:
-                if db:
-                    db_orm.return_db(db, "default")
-        
+                inserted_user_id = db.cursor.lastrowid
+            
+            # 成功后删除验证码
+            if email in verification_codes:
+                del verification_codes[email]
+            
+            # 生成返回的用户信息
+            # 注：头像、记忆点、签到状态等字段为模拟数据;
+            # [ ] TODO 需要头像、记忆点、签到状态等字段
+            user_info = {
+                "uid": inserted_user_id,
+                "name": username,
+                "avatar": f"/api/files/avatar/{inserted_user_id}.png",         # 模拟头像URL
+                "avatarMin": f"/api/files/avatar/{inserted_user_id}_min.png",  # 模拟小头像URL
+                "moemoepoint": 0,             # 初始记忆点为0
+                "role": "user",               # 角色为user
+                "isChechIn": False,           # 未签到
+                "dailyToolsetUploadCount": 0  # 每日上传数量为0
+            }
+            return user_info
         except Exception as e:
-            logging.error(f"数据库操作时出错: {str(e)}")
-            return response_handler.error_response("数据库操作失败喵喵")
+            # 事务已在连接作用域内回滚
+            logging.error(f"创建用户时出错: {str(e)}")
+            return response_handler.error_response(f"创建用户失败喵喵: {str(e)}")
 
 
     @staticmethod
@@ -425,8 +405,7 @@ class auth:
             return response_handler.error_response("读取配置失败喵喵")
         
         try:
-            user = GetUserByEmail(email)
-            if user:
+            if CheckUserEmailExists(email):
                 return response_handler.custom_error_response("您的邮箱已经被使用了喵, 请换一个试试喵")
         except Exception as e:
             logging.error(f"检查邮箱是否已存在时出错喵喵: {str(e)}")
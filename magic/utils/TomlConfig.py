@@ -8,8 +8,16 @@
 import os
 import tomllib
 import pathlib
+import tempfile
+import threading
+from typing import Any
 from tomli_w import dump
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 
 CONFIG_PATH = pathlib.Path(__file__).parent.parent.parent / "config.toml"
 
@@ -17,11 +25,20 @@ CONFIG_PATH = pathlib.Path(__file__).parent.parent.parent / "config.toml"
 __all__ = [
     "check_config_file",
     "DoesitexistConfigToml",
-    "WriteConfigToml"
+    "ReadConfigToml",
+    "WriteConfigToml",
+    "UpdateConfigToml",
+    "InvalidateConfigCache",
+    "GetConfigCacheStats"
 ]
 
 config_path = "config.toml"
 
+# 进程内的配置缓存: (文件标识, 解析后的配置), 整体替换以保证读取时的一致性
+_config_entry: tuple[tuple[int, int, int], dict[str, Any]] | None = None
+_config_lock = threading.Lock()
+_config_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
 
 
 def check_config_file():
@@ -37,39 +54,134 @@ def check_config_file():
             dump(default_config, f)
 
 
+def _config_stamp() -> tuple[int, int, int] | None:
+    """获取配置文件的标识(inode, mtime, size), 文件不存在时返回None"""
+    try:
+        st = os.stat(config_path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _load_config() -> dict[str, Any] | None:
+    """读取配置文件, 文件未变化时直接返回缓存, 不做任何文件读取"""
+    global _config_entry
+    stamp = _config_stamp()
+    if stamp is None:
+        return None
+
+    entry = _config_entry
+    if entry is not None and entry[0] == stamp:
+        _config_stats["hits"] += 1
+        return entry[1]
+
+    with _config_lock:
+        entry = _config_entry
+        if entry is not None and entry[0] == stamp:
+            _config_stats["hits"] += 1
+            return entry[1]
+
+        with open(config_path, "rb") as f:
+            config = tomllib.load(f)
+        _config_entry = (stamp, config)
+        _config_stats["misses"] += 1
+        return config
+
+
+def InvalidateConfigCache() -> None:
+    """清除进程内的配置缓存, 下次读取时重新解析配置文件"""
+    global _config_entry
+    with _config_lock:
+        _config_entry = None
+        _config_stats["invalidations"] += 1
+
+
+def GetConfigCacheStats() -> dict[str, int]:
+    """获取配置缓存的命中/未命中次数"""
+    return dict(_config_stats)
+
+
 def DoesitexistConfigToml(a, b):
     """检查配置文件是否存在并读取"""
-    if not os.path.exists(config_path):
+    config = _load_config()
+    if config is None:
         return False
     else:
-        with open(config_path, "rb") as f:
-            config = tomllib.load(f)
-
         if not config[a][b]:
             return False
         else:
             return config[a][b]
 
 
-def WriteConfigToml(a, b, c):
-    """检查键并写入配置文件"""
-    # 检查配置文件是否存在, 不存在则创建新的配置文件和配置项
-    if not os.path.exists(config_path):
-        config = {a: {b: c}}
-        with open(config_path, "wb") as f:
+def ReadConfigToml(a, b, default=None):
+    """读取配置项, 配置文件、部分a或键b不存在时返回默认值"""
+    config = _load_config()
+    if config is None:
+        return default
+    return config.get(a, {}).get(b, default)
+
+
+def _atomic_dump(config: dict[str, Any]) -> None:
+    """将配置写入临时文件并fsync, 再原子替换config.toml, 读取方不会看到写了一半的文件"""
+    directory = os.path.dirname(os.path.abspath(config_path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".config.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
             dump(config, f)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(config_path):
+            os.chmod(tmp_path, os.stat(config_path).st_mode & 0o777)
+        os.replace(tmp_path, config_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def UpdateConfigToml(changes: dict[str, dict[str, Any]]) -> None:
+    """批量更新配置文件
+
+    所有修改只读取、写入一次配置文件, 通过临时文件+rename原子替换.
+    替换后文件的inode发生变化, 其他gunicorn工作进程的配置缓存会在下次读取时自动失效.
+
+    Args:
+        changes: {部分: {键: 值}}, 如 {"db": {"sql_rd": "sqlite", "sql_prefix": "lmoadll_"}}
+    """
+    global _config_entry
+    if not changes:
         return
 
-    # 读取现有配置文件
-    with open(config_path, "rb") as f:
-        config = tomllib.load(f)
+    # 跨进程写锁, 避免多个工作进程同时读-改-写造成修改丢失
+    lock_file = open(f"{config_path}.lock", "a") if fcntl is not None else None
+    try:
+        if lock_file is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+
+        with _config_lock:
+            if os.path.exists(config_path):
+                with open(config_path, "rb") as f:
+                    config = tomllib.load(f)
+            else:
+                config = {}
+
+            for section, values in changes.items():
+                # 确保部分section存在
+                if section not in config:
+                    config[section] = {}
+                config[section].update(values)
+
+            _atomic_dump(config)
+            stamp = _config_stamp()
+            _config_entry = (stamp, config) if stamp is not None else None
+            _config_stats["invalidations"] += 1
+    finally:
+        if lock_file is not None:
+            lock_file.close()
 
-    # 确保部分a存在
-    if a not in config:
-        config[a] = {}
 
-    # 设置配置值
-    config[a][b] = c
-
-    with open(config_path, "wb") as f:
-        dump(config, f)
+def WriteConfigToml(a, b, c):
+    """检查键并写入配置文件"""
+    UpdateConfigToml({a: {b: c}})
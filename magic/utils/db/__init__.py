@@ -4,18 +4,44 @@
 提供数据库连接池、适配器、模型和工具函数。
 '''
 
-from .connection_pool import ConnectionPool
+from .connection_pool import ConnectionPool, PoolExhaustedError
+from .async_pool import AsyncConnectionPool
 from .adapters import DatabaseAdapter, SQLiteAdapter, MySQLAdapter, PostgreSQLAdapter, DatabaseFactory
+from .adapters import AsyncDatabaseAdapter, AsyncSQLiteAdapter, AsyncMySQLAdapter, AsyncPostgreSQLAdapter, AsyncDatabaseFactory
+from .adapters import Record, record_type
 from .models import Model, UserModel, OptionModel
-from .orm import ORM, db_orm
+from .query import Query
+from .orm import ORM, REPLICA_STRATEGIES, db_orm
+from .async_orm import AsyncORM, async_db_orm
+from .migrations import Migration, MIGRATIONS, migration, MigrateDatabase, GetSchemaVersion, EnsureSchema
+from .context import DatabaseContext, GetDatabaseContext, InitDatabaseContext, ReloadDatabaseContext
+from .identity_cache import (
+    UserIdentity,
+    GetUserIdentity,
+    GetUserIdentities,
+    GetUserIdentitiesByMail,
+    InvalidateUserIdentity,
+    GetIdentityCacheStats,
+    UserLoader,
+    GetUserLoader,
+)
+from .options_cache import (
+    GetSiteOptions,
+    GetSiteOptionValue,
+    LoadSiteOptionsCache,
+    InvalidateSiteOptionsCache,
+    GetSiteOptionsCacheStats,
+)
 from .db_utils import (
     CheckSuperadminExists,
     CreateSiteOption,
     InitVerificationDbConn,
     GetDbConnection,
     GetOrSetSiteOption,
+    SetSiteOptions,
     GetSiteOptionByName,
     GetUserByEmail,
+    CheckUserEmailExists,
     GetUserRoleByIdentity,
     GetUserNameByIdentity,
     GetUserCount,
@@ -25,27 +51,70 @@ from .db_utils import (
 __all__ = [
     # 连接池
     'ConnectionPool',
+    'PoolExhaustedError',
+    'AsyncConnectionPool',
     # 适配器
     'DatabaseAdapter',
     'SQLiteAdapter',
     'MySQLAdapter',
     'PostgreSQLAdapter',
     'DatabaseFactory',
+    'AsyncDatabaseAdapter',
+    'AsyncSQLiteAdapter',
+    'AsyncMySQLAdapter',
+    'AsyncPostgreSQLAdapter',
+    'AsyncDatabaseFactory',
+    # 查询结果记录
+    'Record',
+    'record_type',
     # 模型
     'Model',
     'UserModel',
     'OptionModel',
+    'Query',
     # ORM核心
     'ORM',
+    'REPLICA_STRATEGIES',
     'db_orm',
+    'AsyncORM',
+    'async_db_orm',
+    # 结构迁移
+    'Migration',
+    'MIGRATIONS',
+    'migration',
+    'MigrateDatabase',
+    'GetSchemaVersion',
+    'EnsureSchema',
+    # 数据库上下文
+    'DatabaseContext',
+    'GetDatabaseContext',
+    'InitDatabaseContext',
+    'ReloadDatabaseContext',
+    # 用户身份缓存
+    'UserIdentity',
+    'GetUserIdentity',
+    'GetUserIdentities',
+    'GetUserIdentitiesByMail',
+    'InvalidateUserIdentity',
+    'GetIdentityCacheStats',
+    'UserLoader',
+    'GetUserLoader',
+    # 网站选项缓存
+    'GetSiteOptions',
+    'GetSiteOptionValue',
+    'LoadSiteOptionsCache',
+    'InvalidateSiteOptionsCache',
+    'GetSiteOptionsCacheStats',
     # 工具函数
     'CheckSuperadminExists',
     'CreateSiteOption',
     'InitVerificationDbConn',
     'GetDbConnection',
     'GetOrSetSiteOption',
+    'SetSiteOptions',
     'GetSiteOptionByName',
     'GetUserByEmail',
+    'CheckUserEmailExists',
     'GetUserRoleByIdentity',
     'GetUserNameByIdentity',
     'GetUserCount',
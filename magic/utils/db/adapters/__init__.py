@@ -1,6 +1,7 @@
 """
 数据库适配器模块
-包含DatabaseAdapter基类、SQLiteAdapter、MySQLAdapter、PostgreSQLAdapter和DatabaseFactory工厂类。
+包含DatabaseAdapter基类、SQLiteAdapter、MySQLAdapter、PostgreSQLAdapter和DatabaseFactory工厂类,
+对应的异步适配器AsyncDatabaseAdapter等, SQL方言转换函数translate_sql、escape_like、quote_identifier, 以及查询结果记录类型Record、record_type。
 """
 
 from .adapters import (
@@ -10,11 +11,30 @@ from .adapters import (
     PostgreSQLAdapter,
     DatabaseFactory
 )
+from .async_adapters import (
+    AsyncDatabaseAdapter,
+    AsyncSQLiteAdapter,
+    AsyncMySQLAdapter,
+    AsyncPostgreSQLAdapter,
+    AsyncDatabaseFactory
+)
+from .dialect import escape_like, quote_identifier, translate_sql
+from .records import Record, record_type
 
 __all__ = [
     'DatabaseAdapter',
     'SQLiteAdapter',
     'MySQLAdapter',
     'PostgreSQLAdapter',
-    'DatabaseFactory'
+    'DatabaseFactory',
+    'AsyncDatabaseAdapter',
+    'AsyncSQLiteAdapter',
+    'AsyncMySQLAdapter',
+    'AsyncPostgreSQLAdapter',
+    'AsyncDatabaseFactory',
+    'translate_sql',
+    'escape_like',
+    'quote_identifier',
+    'Record',
+    'record_type'
 ]
@@ -8,10 +8,18 @@
 包含DatabaseAdapter基类、SQLiteAdapter、MySQLAdapter、PostgreSQLAdapter和DatabaseFactory工厂类。
 """
 
+import io
 import os
+import time
+import datetime
 import logging
-from typing import override, Protocol, Self
+import itertools
+from typing import Any, Callable, Iterable, Iterator, Sequence, override, Protocol, Self
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 try:
     import sqlite3
 except ImportError:
@@ -22,8 +30,12 @@ except ImportError:
     pymysql = None
 try:
     import psycopg2
+    import psycopg2.extensions
+    import psycopg2.extras
 except ImportError:
     psycopg2 = None
+from .dialect import escape_like, quote_identifier, translate_sql
+from .records import Record, record_type_for
 
 
 class ConnectionProtocol(Protocol):
@@ -36,13 +48,28 @@ class CursorProtocol(Protocol):
     """数据库游标协议"""
     def close(self) -> None: ...
     def execute(self, query: str, params: tuple[object, ...] | None = None): ...
+    def executemany(self, query: str, seq_of_params: Iterable[Sequence[object]]): ...
     def executescript(self, sql_script: str) -> Self: ...
-    def fetchone(self) -> dict[str, object] | None: ...
-    def fetchall(self) -> list[dict[str, object]]: ...
+    description: Sequence[Sequence[Any]] | None
+    def fetchone(self) -> tuple[object, ...] | None: ...
+    def fetchall(self) -> list[tuple[object, ...]]: ...
+
+
+# 每个连接缓存的SQL语句数上限
+STATEMENT_CACHE_SIZE = 256
+
+StatementKey = tuple[object, ...]
+
+# stream() 每批从服务器取回的行数
+STREAM_BATCH_SIZE = 1000
 
 
 class DatabaseAdapter:
     """数据库适配器基类"""
+
+    # SQL方言(见 dialect.translate_sql)和驱动的参数占位符风格: qmark 为 ?, format 为 %s
+    dialect: str = "sqlite"
+    paramstyle: str = "qmark"
     
     def __init__(self, config: dict[str, str]):
         """
@@ -53,8 +80,19 @@ class DatabaseAdapter:
         self.config: dict[str, str] = config
         self.connection: ConnectionProtocol | None = None
         self.cursor: CursorProtocol | None = None
-        self._in_transaction: bool = False
+        # ORM.transaction() 作用域的嵌套层数, 大于0时 commit/rollback 推迟到最外层作用域结束
+        self.transaction_depth: int = 0
+        # 外层事务中有作用域要求回滚, 最外层作用域结束时回滚而不是提交
+        self._rollback_only: bool = False
         self.db_prefix: str = self.config.get("prefix", "")
+        # 自上次提交/回滚以来成功执行的语句数
+        self._pending_statements: int = 0
+        # 提交了已执行语句的次数, ORM据此判断请求内是否写入过主库
+        self.commit_count: int = 0
+        # 连接断开时是否自动重连并重试一次(仅在事务外的第一条语句上重试)
+        self.retry_on_disconnect: bool = False
+        # 生成好的SQL语句缓存, 键如 (模型, 操作, 列名)
+        self._statements: dict[StatementKey, str] = {}
         
     def connect(self) -> None:
         """建立数据库连接"""
@@ -62,6 +100,7 @@ class DatabaseAdapter:
         
     def disconnect(self):
         """断开数据库连接"""
+        self._pending_statements = 0
         if self.cursor:
             self.cursor.close()
             self.cursor = None
@@ -70,7 +109,12 @@ class DatabaseAdapter:
             self.connection = None
         
     def execute(self, query: str, params: tuple[object, ...] | None = None):
-        """执行SQL查询"""
+        """
+        执行SQL查询
+
+        查询统一使用 ? 占位符和反引号标识符, 执行前按数据库方言转换。
+        """
+        query = translate_sql(query, self.dialect, self.paramstyle if params else "literal")
         if not self.cursor:
             self.connect()
             # 确保connect()成功创建了游标
@@ -82,39 +126,238 @@ class DatabaseAdapter:
             else:
                 self.cursor.execute(query)
         except Exception as e:
-            logging.error(f"执行SQL查询失败: {query}, 参数: {params}, 错误: {e}")
+            if not (self.retry_on_disconnect and self._pending_statements == 0 and self._is_disconnect_error(e)):
+                logging.error(f"执行SQL查询失败: {query}, 参数: {params}, 错误: {e}")
+                raise
+            # 事务外的第一条语句遇到断线, 重连后重试一次
+            logging.warning(f"数据库连接已断开, 重新连接后重试: {e}")
+            self.disconnect()
+            self.connect()
+            try:
+                if params:
+                    self.cursor.execute(query, params)  # pyright: ignore[reportOptionalMemberAccess]
+                else:
+                    self.cursor.execute(query)  # pyright: ignore[reportOptionalMemberAccess]
+            except Exception as e:
+                logging.error(f"执行SQL查询失败: {query}, 参数: {params}, 错误: {e}")
+                raise
+        self._pending_statements += 1
+
+    def executemany(self, query: str, seq_of_params: Iterable[Sequence[object]]):
+        """
+        使用同一条SQL批量执行多组参数
+
+        使用驱动自带的 executemany: sqlite3 复用同一预编译语句,
+        pymysql 将 INSERT ... VALUES 改写为多行插入。
+
+        :param query: SQL语句, 使用 ? 占位符
+        :param seq_of_params: 参数序列
+        """
+        query = translate_sql(query, self.dialect, self.paramstyle)
+        if not self.cursor:
+            self.connect()
+            # 确保connect()成功创建了游标
+            if not self.cursor:
+                raise RuntimeError("无法创建数据库游标")
+        try:
+            self.cursor.executemany(query, seq_of_params)
+        except Exception as e:
+            logging.error(f"批量执行SQL失败: {query}, 错误: {e}")
             raise
+        self._pending_statements += 1
+
+    def upsert(self, table_name: str, columns: Sequence[str], conflict_columns: Sequence[str], rows: Sequence[Sequence[object]]):
+        """
+        插入多行, 与唯一键冲突的行改为更新其余列, 一条语句完成
+
+        :param table_name: 表名
+        :param columns: 插入的列名
+        :param conflict_columns: 唯一键列名, 需要有对应的唯一索引
+        :param rows: 行数据, 每行的值与 columns 一一对应, 同一条语句中唯一键不能重复
+        """
+        if not rows:
+            return
+        columns = tuple(columns)
+        conflict_columns = tuple(conflict_columns)
+        update_columns = tuple(column for column in columns if column not in conflict_columns)
+        self.execute_statement(
+            ("upsert", table_name, columns, conflict_columns, len(rows)),
+            lambda: self._get_upsert_sql(table_name, columns, conflict_columns, update_columns, len(rows)),
+            tuple(value for row in rows for value in row),
+        )
+
+    def _get_upsert_sql(self, table_name: str, columns: tuple[str, ...], conflict_columns: tuple[str, ...], update_columns: tuple[str, ...], row_count: int) -> str:
+        """获取UPSERT语句, SQLite(3.24+)与PostgreSQL使用 ON CONFLICT ... DO UPDATE"""
+        row_placeholder = f"({', '.join(['?'] * len(columns))})"
+        query = (
+            f"INSERT INTO {table_name} ({', '.join(f'`{column}`' for column in columns)}) "
+            f"VALUES {', '.join([row_placeholder] * row_count)} "
+            f"ON CONFLICT ({', '.join(f'`{column}`' for column in conflict_columns)}) "
+        )
+        if not update_columns:
+            return query + "DO NOTHING"
+        return query + "DO UPDATE SET " + ", ".join(f"`{column}` = excluded.`{column}`" for column in update_columns)
+
+    def statement(self, key: StatementKey, build: Callable[[], str]) -> str:
+        """
+        获取缓存的SQL语句
+
+        :param key: 语句的缓存键, 如 (模型, 操作, 列名)
+        :param build: 缓存未命中时生成SQL的函数, 生成的SQL使用 ? 占位符
+        :return: 生成好的SQL, 执行时由 execute 按方言转换
+        """
+        sql = self._statements.get(key)
+        if sql is None:
+            sql = build()
+            if len(self._statements) < STATEMENT_CACHE_SIZE:
+                self._statements[key] = sql
+        return sql
+
+    def execute_statement(self, key: StatementKey, build: Callable[[], str], params: tuple[object, ...] | None = None):
+        """执行缓存的SQL语句, 子类可改用服务器端预处理语句"""
+        self.execute(self.statement(key, build), params)
+
+    def ping(self) -> bool:
+        """检查连接是否可用, 子类可使用驱动自带的检测方式"""
+        try:
+            self.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    def in_transaction(self) -> bool:
+        """连接上是否有尚未提交或回滚的事务"""
+        return self._pending_statements > 0
+
+    def _is_disconnect_error(self, _error: Exception) -> bool:
+        """判断异常是否由连接断开引起"""
+        return False
             
-    def fetchone(self):
-        """获取一条查询结果"""
+    def fetchone(self) -> Record | None:
+        """获取一条查询结果, 结果行为记录(见 records 模块)"""
         if not self.cursor:
             raise RuntimeError("没有活动的游标")
-        return self.cursor.fetchone()
+        row = self.cursor.fetchone()
+        if row is None:
+            return None
+        return record_type_for(self.cursor.description)(row)  # pyright: ignore[reportArgumentType]
         
-    def fetchall(self):
-        """获取所有查询结果"""
+    def fetchall(self) -> list[Record]:
+        """获取所有查询结果, 所有结果行共用同一个记录类型"""
+        if not self.cursor:
+            raise RuntimeError("没有活动的游标")
+        rows = self.cursor.fetchall()
+        if not rows:
+            return []
+        make = record_type_for(self.cursor.description)  # pyright: ignore[reportArgumentType]
+        return [make(row) for row in rows]
+
+    def _stream_cursor(self, batch_size: int) -> Any:
+        """创建用于流式读取的游标, 默认为连接上的新游标(客户端逐批读取)"""
+        return self.connection.cursor()  # pyright: ignore[reportOptionalMemberAccess, reportAttributeAccessIssue]
+
+    def stream(self, query: str, params: tuple[object, ...] | None = None, batch_size: int = STREAM_BATCH_SIZE) -> Iterator[Record]:
+        """
+        逐行迭代查询结果, 每次只从数据库取回 batch_size 行, 内存占用与结果集大小无关
+
+        使用单独的游标读取, 迭代期间不影响 execute/fetchone。迭代结束或生成器被关闭时释放游标;
+        MySQL的服务器端游标在迭代结束前不能在同一连接上执行其他语句。
+
+        用法:
+            for user in db.stream("SELECT uid, mail FROM users"):
+                ...
+
+        :param query: SQL语句, 使用 ? 占位符
+        :param params: 参数
+        :param batch_size: 每批取回的行数
+        """
+        query = translate_sql(query, self.dialect, self.paramstyle if params else "literal")
+        if not self.connection:
+            self.connect()
+        cursor = self._stream_cursor(batch_size)
+        try:
+            try:
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+            except Exception as e:
+                logging.error(f"执行SQL查询失败: {query}, 参数: {params}, 错误: {e}")
+                raise
+            self._pending_statements += 1
+
+            make = None
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                # 服务器端游标在取回第一批后才有 description
+                if make is None:
+                    make = record_type_for(cursor.description)
+                for row in rows:
+                    yield make(row)
+        finally:
+            cursor.close()
+
+    def fetchscalar(self):
+        """获取下一行的第一列, 没有结果时返回None, 不创建记录"""
         if not self.cursor:
             raise RuntimeError("没有活动的游标")
-        return self.cursor.fetchall()
+        row = self.cursor.fetchone()
+        if row is None:
+            return None
+        return row[0]
         
     def commit(self):
-        """提交事务"""
+        """提交事务, 处于 begin_transaction 开始的事务中时不提交, 由最外层的 end_transaction 统一提交"""
+        if self.transaction_depth:
+            return
+        self._commit()
+
+    def _commit(self):
+        """提交连接上的事务"""
         if self.connection:
             self.connection.commit()
-            self._in_transaction = False
-        
+            if self._pending_statements:
+                self.commit_count += 1
+            self._pending_statements = 0
+
     def rollback(self):
-        """回滚事务"""
+        """回滚事务, 处于 begin_transaction 开始的事务中时只标记整个事务需要回滚"""
+        if self.transaction_depth:
+            self._rollback_only = True
+            return
+        self._rollback()
+
+    def _rollback(self):
+        """回滚连接上的事务"""
         if self.connection:
             self.connection.rollback()
-            self._in_transaction = False
-        
+            self._pending_statements = 0
+
     def begin_transaction(self):
-        """开始事务"""
-        if not self._in_transaction:
-            self._in_transaction = True
-            # 某些数据库需要在连接级别开始事务
-            # 对于支持自动提交的数据库,这里可以留空
+        """开始事务, 可以嵌套, 内层事务是外层事务的一部分"""
+        self.transaction_depth += 1
+
+    def end_transaction(self, commit: bool = True):
+        """
+        结束 begin_transaction 开始的事务, 最外层时提交或回滚
+
+        :param commit: 作用域是否正常结束, False 时整个事务回滚
+        :raises RuntimeError: 事务中有作用域要求回滚, 提交时改为回滚整个事务
+        """
+        if not commit:
+            self._rollback_only = True
+        self.transaction_depth -= 1
+        if self.transaction_depth:
+            return
+        rollback_only, self._rollback_only = self._rollback_only, False
+        if not rollback_only:
+            self._commit()
+            return
+        self._rollback()
+        if commit:
+            raise RuntimeError("事务中有操作失败并要求回滚, 整个事务已回滚")
         
     def close(self):
         """关闭连接"""
@@ -138,7 +381,7 @@ class DatabaseAdapter:
             raise
             
     def _initialize_tables(self):
-        """初始化数据库表结构"""
+        """初始化数据库表结构, 由 migrations 中的初始迁移调用"""
         
         users_table = f"{self.db_prefix}users"
         create_users_sql: str = self._get_create_users_sql(users_table)
@@ -170,23 +413,187 @@ class DatabaseAdapter:
         """获取创建usermeta表的SQL语句"""
         raise NotImplementedError("子类必须实现此方法")
         
+    def _create_index(self, index_name: str, table_name: str, columns: str, unique: bool = False):
+        """创建索引, 索引已存在时跳过"""
+        unique_sql = "UNIQUE " if unique else ""
+        self.execute(f"CREATE {unique_sql}INDEX IF NOT EXISTS {index_name} ON {table_name} ({columns})")
+
+    def column_exists(self, table_name: str, column: str) -> bool:
+        """检查表中是否存在指定列"""
+        self.execute(f"PRAGMA table_info({table_name})")
+        return any(row[1] == column for row in self.fetchall())
+
+    def add_column(self, table_name: str, column: str, definition: str):
+        """
+        为表添加列, 列已存在时跳过
+
+        :param table_name: 表名
+        :param column: 列名
+        :param definition: 列定义, 如 "INTEGER DEFAULT 0"
+        """
+        if not self.column_exists(table_name, column):
+            self.execute(f"ALTER TABLE {table_name} ADD COLUMN `{column}` {definition}")
+
+    def acquire_migration_lock(self, timeout: float = 60.0) -> bool:
+        """
+        获取跨进程的结构迁移锁, SQLite使用数据库文件旁的锁文件
+
+        :param timeout: 等待锁的最长时间(秒)
+        :return: 是否获取成功
+        """
+        db_path = self.config.get("path")
+        if fcntl is None or not db_path:
+            return True
+        lock_file = open(f"{db_path}.migrate.lock", "a")
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self._migration_lock_file = lock_file
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    lock_file.close()
+                    return False
+                time.sleep(0.05)
+
+    def release_migration_lock(self):
+        """释放结构迁移锁"""
+        lock_file = getattr(self, "_migration_lock_file", None)
+        if lock_file is not None:
+            self._migration_lock_file = None
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)  # pyright: ignore[reportOptionalMemberAccess]
+            lock_file.close()
+
+    def ilike_condition(self, column: str) -> str:
+        """
+        不区分大小写的 LIKE 条件, 参数为已转义的模式(转义字符为 !)
+
+        SQLite的LIKE不区分大小写(ASCII), MySQL默认排序规则不区分大小写, 直接使用LIKE。
+        """
+        return f"{column} LIKE ? ESCAPE '!'"
+
+    def _search_index_column(self, column: str) -> str:
+        """前缀搜索(ilike_condition 匹配 'kw%')可以使用的索引列写法, SQLite的LIKE不区分大小写, 索引需使用NOCASE"""
+        return f"{column} COLLATE NOCASE"
+
+    def _create_users_indexes(self, users_table: str):
+        """创建users表索引: 邮箱唯一索引用于登录查询, 用户名、邮箱索引用于前缀搜索"""
+        # 已有数据中存在重复邮箱时无法创建唯一索引, 退回普通索引, 先提交建表语句以免回滚时一并撤销
+        self.commit()
+        try:
+            self._create_index(f"{self.db_prefix}users__mail", users_table, "mail", unique=True)
+        except Exception as e:
+            logging.warning(f"{users_table} 中存在重复的邮箱, 无法创建唯一索引, 改用普通索引: {e}")
+            self.rollback()
+            self._create_index(f"{self.db_prefix}users__mail", users_table, "mail")
+
+        self._create_index(f"{self.db_prefix}users_name", users_table, self._search_index_column("name"))
+        mail_search_column = self._search_index_column("mail")
+        # 邮箱索引本身可以用于前缀搜索时不再重复创建
+        if mail_search_column != "mail":
+            self._create_index(f"{self.db_prefix}users_mail", users_table, mail_search_column)
+
+    def _recreate_users_search_indexes(self, users_table: str):
+        """按 _search_index_column 的当前写法重建用户名、邮箱搜索索引, 写法没有变化的数据库不需要重建"""
+        pass
+
     def _create_options_index(self, options_table: str):
         """创建options表索引"""
-        create_index_sql = f"CREATE UNIQUE INDEX IF NOT EXISTS {self.db_prefix}options__name_user ON {options_table} (name, user)"
-        self.execute(create_index_sql)
+        self._create_index(f"{self.db_prefix}options__name_user", options_table, "name, `user`", unique=True)
         
     def _create_usermeta_indexes(self, usermeta_table: str):
         """创建usermeta表索引"""
-        create_index1_sql = f"CREATE INDEX IF NOT EXISTS {self.db_prefix}usermeta_user_id ON {usermeta_table} (user_id)"
-        self.execute(create_index1_sql)
-        create_index2_sql = f"CREATE INDEX IF NOT EXISTS {self.db_prefix}usermeta_meta_key ON {usermeta_table} (meta_key)"
-        self.execute(create_index2_sql)
-        create_index3_sql = f"CREATE INDEX IF NOT EXISTS {self.db_prefix}usermeta_user_meta ON {usermeta_table} (user_id, meta_key)"
-        self.execute(create_index3_sql)
+        self._create_index(f"{self.db_prefix}usermeta_user_id", usermeta_table, "user_id")
+        self._create_index(f"{self.db_prefix}usermeta_meta_key", usermeta_table, "meta_key")
+        self._create_index(f"{self.db_prefix}usermeta_user_meta", usermeta_table, "user_id, meta_key")
+
+    def setup_user_fulltext(self, users_table: str) -> bool:
+        """
+        创建users表的全文(子串)搜索结构
+
+        :param users_table: users表名
+        :return: 数据库不支持时返回False
+        """
+        return False
+
+    def user_fulltext_available(self, users_table: str) -> bool:
+        """
+        users表的全文搜索结构是否已建立(由结构迁移调用 setup_user_fulltext 建立), 只查询系统表
+
+        :param users_table: users表名
+        """
+        return False
+
+    def execute_user_fulltext_search(self, users_table: str, keyword: str, after_uid: int, limit: int) -> bool:
+        """
+        按用户名、邮箱子串搜索用户, 结果 (uid, name, mail) 按uid升序, 通过 fetchall 获取
+
+        :param users_table: users表名
+        :param keyword: 搜索关键词
+        :param after_uid: 只返回uid大于该值的用户(分页游标)
+        :param limit: 最多返回的条数
+        :return: 数据库不支持或关键词不适用时返回False, 此时不执行查询
+        """
+        return False
+
+
+# SQLite连接参数(PRAGMA)默认值, 可在 config.toml 的 [db.sqlite] 中逐项覆盖
+SQLITE_PRAGMA_DEFAULTS: dict[str, str | int] = {
+    # 等待其他进程释放锁的最长时间(毫秒), 最先设置, 之后的PRAGMA也会等待锁
+    "busy_timeout": 5000,
+    # WAL模式下读写互不阻塞, 多个工作进程可以并发读
+    "journal_mode": "WAL",
+    # WAL模式下NORMAL只在检查点时同步磁盘, 断电可能丢失最近的事务但不会损坏数据库
+    "synchronous": "NORMAL",
+    # 内存映射读取的最大字节数
+    "mmap_size": 268435456,
+    # 页缓存大小, 负数表示KiB
+    "cache_size": -20000,
+    # 临时表和排序使用内存
+    "temp_store": "MEMORY",
+}
+
+# 取值为关键字的PRAGMA及其可选值, 其余PRAGMA取值必须为整数
+SQLITE_PRAGMA_CHOICES: dict[str, tuple[str, ...]] = {
+    "journal_mode": ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"),
+    "synchronous": ("OFF", "NORMAL", "FULL", "EXTRA"),
+    "temp_store": ("DEFAULT", "FILE", "MEMORY"),
+}
+
+
+def get_sqlite_pragmas(config: dict[str, Any]) -> list[tuple[str, str]]:
+    """合并默认值与配置中的PRAGMA(config["pragmas"]), 校验后按默认值中的顺序返回"""
+    overrides: dict[str, object] = dict(config.get("pragmas") or {})
+    for name in overrides:
+        if name not in SQLITE_PRAGMA_DEFAULTS:
+            logging.warning(f"不支持的SQLite配置项, 已忽略: {name}")
+
+    pragmas: list[tuple[str, str]] = []
+    for name, default in SQLITE_PRAGMA_DEFAULTS.items():
+        value = overrides.get(name, default)
+        choices = SQLITE_PRAGMA_CHOICES.get(name)
+        if choices is not None and str(value).upper() in choices:
+            pragmas.append((name, str(value).upper()))
+        elif choices is None and isinstance(value, int) and not isinstance(value, bool):
+            pragmas.append((name, str(value)))
+        else:
+            logging.warning(f"SQLite配置项 {name} 的值无效, 已忽略: {value}")
+    return pragmas
 
 
 class SQLiteAdapter(DatabaseAdapter):
     """SQLite数据库适配器"""
+
+    def _apply_pragmas(self):
+        """在新连接上设置PRAGMA, 每个连接只执行一次"""
+        for name, value in get_sqlite_pragmas(self.config):
+            self.cursor.execute(f"PRAGMA {name} = {value}")  # pyright: ignore[reportOptionalMemberAccess]
+            if name == "journal_mode":
+                # journal_mode 会返回实际生效的模式
+                mode = self.cursor.fetchone()  # pyright: ignore[reportOptionalMemberAccess]
+                if mode and str(mode[0]).upper() != value and self.config.get("path") != ":memory:":
+                    logging.warning(f"SQLite journal_mode 设置为 {value} 失败, 当前为 {mode[0]}")
     
     @override
     def connect(self):
@@ -205,15 +612,84 @@ class SQLiteAdapter(DatabaseAdapter):
                 os.makedirs(db_dir)
                 
             self.connection: ConnectionProtocol | None = sqlite3.connect(db_path, check_same_thread=False)
-            self.connection.row_factory = sqlite3.Row
             self.cursor: CursorProtocol | None = self.connection.cursor()  # pyright: ignore[reportAttributeAccessIssue]
+            self._apply_pragmas()
             # logging.info(f"成功连接到SQLite数据库: {db_path}")
-            
-            # 初始化表结构
-            self._initialize_tables()
         except Exception as e:
             logging.error(f"连接SQLite数据库失败: {e}")
             raise
+
+    @override
+    def ping(self) -> bool:
+        """SQLite是本地文件数据库, 连接对象存在即可用"""
+        return self.connection is not None
+
+    @override
+    def in_transaction(self) -> bool:
+        """使用sqlite3自带的事务状态, 不需要访问数据库"""
+        return bool(self.connection is not None and self.connection.in_transaction)  # pyright: ignore[reportAttributeAccessIssue]
+
+    @override
+    def setup_user_fulltext(self, users_table: str) -> bool:
+        """使用FTS5 trigram外部内容表索引用户名和邮箱, 由触发器与users表保持同步"""
+        if sqlite3.sqlite_version_info < (3, 34, 0):
+            return False
+        fts_table = f"{users_table}_fts"
+        self.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts_table,))
+        if self.fetchone():
+            return True
+        try:
+            self.execute(
+                f"CREATE VIRTUAL TABLE {fts_table} USING fts5("
+                f"name, mail, content='{users_table}', content_rowid='uid', tokenize='trigram')"
+            )
+        except Exception as e:
+            logging.warning(f"当前SQLite不支持FTS5 trigram, 无法启用全文搜索: {e}")
+            self.rollback()
+            return False
+        self.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {users_table} BEGIN "
+            f"INSERT INTO {fts_table} (rowid, name, mail) VALUES (new.uid, new.name, new.mail); END"
+        )
+        self.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {users_table} BEGIN "
+            f"INSERT INTO {fts_table} ({fts_table}, rowid, name, mail) VALUES ('delete', old.uid, old.name, old.mail); END"
+        )
+        self.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE ON {users_table} BEGIN "
+            f"INSERT INTO {fts_table} ({fts_table}, rowid, name, mail) VALUES ('delete', old.uid, old.name, old.mail); "
+            f"INSERT INTO {fts_table} (rowid, name, mail) VALUES (new.uid, new.name, new.mail); END"
+        )
+        # 为已有用户建立索引
+        self.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
+        self.commit()
+        return True
+
+    @override
+    def user_fulltext_available(self, users_table: str) -> bool:
+        """FTS5表存在即可用"""
+        if sqlite3.sqlite_version_info < (3, 34, 0):
+            return False
+        self.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (f"{users_table}_fts",))
+        return self.fetchone() is not None
+
+    @override
+    def execute_user_fulltext_search(self, users_table: str, keyword: str, after_uid: int, limit: int) -> bool:
+        """在FTS5表中按rowid(uid)分页匹配, 再取出用户信息; trigram至少需要3个字符"""
+        if len(keyword) < 3:
+            return False
+        fts_table = f"{users_table}_fts"
+        self.execute_statement(
+            ("SearchUsers.fulltext", users_table),
+            lambda: (
+                f"SELECT uid, name, mail FROM {users_table} WHERE uid IN ("
+                f"SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH ? AND rowid > ? ORDER BY rowid LIMIT ?"
+                f") ORDER BY uid"
+            ),
+            # 作为FTS5字符串匹配, 避免关键词被解析为查询语法
+            ('"' + keyword.replace('"', '""') + '"', after_uid, limit),
+        )
+        return True
     
     @override
     def _get_create_users_sql(self, users_table: str):
@@ -262,6 +738,14 @@ class SQLiteAdapter(DatabaseAdapter):
 
 class MySQLAdapter(DatabaseAdapter):
     """MySQL数据库适配器"""
+
+    dialect = "mysql"
+    paramstyle = "format"
+
+    @override
+    def _stream_cursor(self, batch_size: int) -> Any:
+        """使用非缓冲的 SSCursor, 结果行留在服务器端按需读取"""
+        return self.connection.cursor(pymysql.cursors.SSCursor)  # pyright: ignore[reportOptionalMemberAccess, reportAttributeAccessIssue]
     
     @override
     def connect(self):
@@ -277,16 +761,96 @@ class MySQLAdapter(DatabaseAdapter):
                 password=self.config.get("password", ""),
                 database=self.config.get("database", "lmoadll_bl"),
                 charset="utf8mb4",
-                cursorclass=pymysql.cursors.DictCursor
             )
             self.cursor: CursorProtocol | None = self.connection.cursor()  # pyright: ignore[reportAttributeAccessIssue]
             logging.info(f"成功连接到MySQL数据库: {self.config.get('host')}:{self.config.get('port')}/{self.config.get('database')}")
-            
-            # 初始化表结构
-            self._initialize_tables()
         except Exception as e:
             logging.error(f"连接MySQL数据库失败: {e}")
             raise
+
+    @override
+    def ping(self) -> bool:
+        """使用MySQL协议的COM_PING检测连接, 断开时由pymysql自动重连"""
+        if self.connection is None:
+            return False
+        try:
+            self.connection.ping(reconnect=True)  # pyright: ignore[reportAttributeAccessIssue]
+            return True
+        except Exception:
+            return False
+
+    @override
+    def in_transaction(self) -> bool:
+        """根据服务器最近一次返回的状态位判断是否处于事务中, 不需要访问数据库"""
+        if self.connection is None:
+            return False
+        server_status = getattr(self.connection, "server_status", None)
+        if server_status is None:
+            return super().in_transaction()
+        return bool(server_status & pymysql.constants.SERVER_STATUS.SERVER_STATUS_IN_TRANS)
+
+    @override
+    def _create_index(self, index_name: str, table_name: str, columns: str, unique: bool = False):
+        """MySQL不支持 CREATE INDEX IF NOT EXISTS, 先查询索引是否存在"""
+        self.execute(
+            "SELECT 1 FROM information_schema.statistics WHERE table_schema = DATABASE() AND table_name = ? AND index_name = ? LIMIT 1",
+            (table_name, index_name),
+        )
+        if self.fetchone():
+            return
+        unique_sql = "UNIQUE " if unique else ""
+        self.execute(f"CREATE {unique_sql}INDEX {index_name} ON {table_name} ({columns})")
+
+    @override
+    def _search_index_column(self, column: str) -> str:
+        """MySQL默认排序规则不区分大小写, 普通索引即可用于前缀搜索"""
+        return column
+
+    @override
+    def column_exists(self, table_name: str, column: str) -> bool:
+        """从information_schema查询列是否存在"""
+        self.execute(
+            "SELECT 1 FROM information_schema.columns WHERE table_schema = DATABASE() AND table_name = ? AND column_name = ? LIMIT 1",
+            (table_name, column),
+        )
+        return self.fetchone() is not None
+
+    @override
+    def acquire_migration_lock(self, timeout: float = 60.0) -> bool:
+        """使用MySQL的命名锁 GET_LOCK"""
+        self.execute("SELECT GET_LOCK(?, ?)", (self._migration_lock_name(), int(timeout)))
+        return self.fetchscalar() == 1
+
+    @override
+    def release_migration_lock(self):
+        """释放命名锁"""
+        self.execute("SELECT RELEASE_LOCK(?)", (self._migration_lock_name(),))
+        self.fetchone()
+
+    def _migration_lock_name(self) -> str:
+        """命名锁名称, MySQL限制为64个字符"""
+        return f"lmoadll_migrate:{self.config.get('database', '')}:{self.db_prefix}"[:64]
+
+    @override
+    def _get_upsert_sql(self, table_name: str, columns: tuple[str, ...], conflict_columns: tuple[str, ...], update_columns: tuple[str, ...], row_count: int) -> str:
+        """获取UPSERT语句, MySQL使用 ON DUPLICATE KEY UPDATE, 冲突判断基于表上的唯一索引"""
+        row_placeholder = f"({', '.join(['?'] * len(columns))})"
+        # 没有需要更新的列时将唯一键赋值给自身, 效果等同于忽略冲突
+        assignments = update_columns or conflict_columns[:1]
+        return (
+            f"INSERT INTO {table_name} ({', '.join(f'`{column}`' for column in columns)}) "
+            f"VALUES {', '.join([row_placeholder] * row_count)} "
+            f"ON DUPLICATE KEY UPDATE " + ", ".join(f"`{column}` = VALUES(`{column}`)" for column in assignments)
+        )
+
+    @override
+    def _is_disconnect_error(self, error: Exception) -> bool:
+        """2006/2013/2055: 服务器已断开; InterfaceError: 连接已关闭"""
+        if isinstance(error, pymysql.err.InterfaceError):
+            return True
+        if isinstance(error, pymysql.err.OperationalError):
+            return bool(error.args) and error.args[0] in (2006, 2013, 2055)
+        return False
     
     @override
     def _get_create_users_sql(self, users_table: str):
@@ -333,8 +897,135 @@ class MySQLAdapter(DatabaseAdapter):
         """
 
 
+# 命名游标在会话内需唯一
+_stream_cursor_ids = itertools.count(1)
+
+
+def _copy_csv_field(value: Any) -> str:
+    """
+    COPY (FORMAT csv) 的字段值, 与 execute 传参写入的值一致
+
+    None 为未加引号的空值(NULL); 布尔值写为 1/0(表中没有boolean列, 标志位均为INTEGER);
+    二进制写为 bytea 的十六进制格式; 日期时间写为ISO格式; 其余值按字符串写入。
+    """
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        text = "1" if value else "0"
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        text = "\\x" + bytes(value).hex()
+    elif isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        text = value.isoformat()
+    else:
+        text = str(value)
+    return '"' + text.replace('"', '""') + '"'
+
+
 class PostgreSQLAdapter(DatabaseAdapter):
     """PostgreSQL数据库适配器"""
+
+    dialect = "postgresql"
+    paramstyle = "format"
+    # 同一语句执行到第几次时在服务器端预处理(PREPARE)
+    prepare_threshold: int = 2
+    # execute_batch 每次发送的参数组数
+    batch_page_size: int = 500
+
+    def __init__(self, config: dict[str, str]):
+        super().__init__(config)
+        # 服务器端预处理语句, 属于当前会话, 断开连接后失效
+        self._prepared: dict[StatementKey, str] = {}
+        self._statement_uses: dict[StatementKey, int] = {}
+
+    @override
+    def disconnect(self):
+        """断开数据库连接, 预处理语句随会话一起失效"""
+        self._prepared.clear()
+        self._statement_uses.clear()
+        super().disconnect()
+
+    @override
+    def executemany(self, query: str, seq_of_params: Iterable[Sequence[object]]):
+        """
+        使用同一条SQL批量执行多组参数
+
+        psycopg2 的 executemany 每组参数一次往返, 这里使用 execute_batch 分页合并发送。
+        """
+        query = translate_sql(query, self.dialect, self.paramstyle)
+        if not self.cursor:
+            self.connect()
+            if not self.cursor:
+                raise RuntimeError("无法创建数据库游标")
+        try:
+            psycopg2.extras.execute_batch(self.cursor, query, seq_of_params, page_size=self.batch_page_size)
+        except Exception as e:
+            logging.error(f"批量执行SQL失败: {query}, 错误: {e}")
+            raise
+        self._pending_statements += 1
+
+    def copy_rows(self, table_name: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+        """
+        使用 COPY ... FROM STDIN 批量导入数据, 适合大批量导入
+
+        :param table_name: 表名
+        :param columns: 列名, 保留字(如 group、user)自动加引号
+        :param rows: 行数据, 每行的值与 columns 一一对应, None 导入为 NULL
+        :return: 导入的行数
+        :raises ValueError: 列名不是有效的标识符时
+        """
+        buffer = io.StringIO()
+        count = 0
+        for row in rows:
+            buffer.write(",".join(_copy_csv_field(value) for value in row))
+            buffer.write("\n")
+            count += 1
+        buffer.seek(0)
+
+        column_list = ", ".join(translate_sql(quote_identifier(column.strip("`")), self.dialect, "literal") for column in columns)
+        if not self.cursor:
+            self.connect()
+            if not self.cursor:
+                raise RuntimeError("无法创建数据库游标")
+        try:
+            self.cursor.copy_expert(f"COPY {table_name} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)  # pyright: ignore[reportAttributeAccessIssue]
+        except Exception as e:
+            logging.error(f"COPY导入数据失败: {table_name}, 错误: {e}")
+            raise
+        self._pending_statements += 1
+        return count
+
+    @override
+    def execute_statement(self, key: StatementKey, build: Callable[[], str], params: tuple[object, ...] | None = None):
+        """
+        执行缓存的SQL语句
+
+        同一语句重复执行时使用 PREPARE 在服务器端预处理, 之后通过 EXECUTE 执行,
+        服务器不再重复解析和规划该语句。
+        """
+        sql = self.statement(key, build)
+        name = self._prepared.get(key)
+        if name is None:
+            uses = self._statement_uses.get(key, 0) + 1
+            self._statement_uses[key] = uses
+            if uses < self.prepare_threshold or len(self._prepared) >= STATEMENT_CACHE_SIZE:
+                self.execute(sql, params)
+                return
+            name = f"lmo_stmt_{len(self._prepared) + 1}"
+            self.execute(f"PREPARE {name} AS {translate_sql(sql, self.dialect, 'numeric')}")
+            self._prepared[key] = name
+
+        if params:
+            execute_sql = f"EXECUTE {name} ({', '.join(['?'] * len(params))})"
+        else:
+            execute_sql = f"EXECUTE {name}"
+        try:
+            self.execute(execute_sql, params)
+        except Exception:
+            if self._prepared.get(key) == name:
+                raise
+            # 断线重连后预处理语句已失效, 回滚失败的语句后按普通语句执行
+            self.rollback()
+            self.execute(sql, params)
     
     @override
     def connect(self):
@@ -352,30 +1043,131 @@ class PostgreSQLAdapter(DatabaseAdapter):
             )
             self.cursor: CursorProtocol | None = self.connection.cursor()  # pyright: ignore[reportAttributeAccessIssue]
             logging.info(f"成功连接到PostgreSQL数据库: {self.config.get('host')}:{self.config.get('port')}/{self.config.get('database')}")
-            
-            # 初始化表结构
-            self._initialize_tables()
         except Exception as e:
             logging.error(f"连接PostgreSQL数据库失败: {e}")
             raise
-    
+
     @override
-    def execute(self, query: str, params: tuple[object, ...] | None = None):
-        """执行SQL查询(PostgreSQL适配)"""
-        if not self.cursor:
-            self.connect()
-            # 确保connect()成功创建了游标
-            if not self.cursor:
-                raise RuntimeError("无法创建数据库游标")
+    def ping(self) -> bool:
+        """检查psycopg2的连接状态, 不需要访问数据库"""
+        return self.connection is not None and self.connection.closed == 0  # pyright: ignore[reportAttributeAccessIssue]
+
+    @override
+    def _stream_cursor(self, batch_size: int) -> Any:
+        """使用命名(服务器端)游标, 每次 FETCH batch_size 行, 游标在当前事务内有效"""
+        cursor = self.connection.cursor(name=f"lmoadll_stream_{next(_stream_cursor_ids)}")  # pyright: ignore[reportOptionalMemberAccess, reportAttributeAccessIssue]
+        cursor.itersize = batch_size
+        return cursor
+
+    @override
+    def in_transaction(self) -> bool:
+        """使用libpq记录的事务状态, 不需要访问数据库"""
+        if self.connection is None:
+            return False
+        status = self.connection.get_transaction_status()  # pyright: ignore[reportAttributeAccessIssue]
+        return status != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    @override
+    def ilike_condition(self, column: str) -> str:
+        """PostgreSQL的LIKE区分大小写, 两边转为小写后比较, 与全文搜索的ILIKE一致"""
+        return f"lower({column}) LIKE lower(?) ESCAPE '!'"
+
+    @override
+    def _search_index_column(self, column: str) -> str:
+        """非C排序规则下, lower(列) 的LIKE前缀匹配需要 text_pattern_ops 表达式索引"""
+        return f"lower({column}) text_pattern_ops"
+
+    @override
+    def _recreate_users_search_indexes(self, users_table: str):
+        """旧版本的搜索索引建在区分大小写的列上(varchar_pattern_ops), 删除后按 lower(列) 重建"""
+        for column in ("name", "mail"):
+            index_name = f"{self.db_prefix}users_{column}"
+            self.execute(f"DROP INDEX IF EXISTS {index_name}")
+            self._create_index(index_name, users_table, self._search_index_column(column))
+
+    @override
+    def column_exists(self, table_name: str, column: str) -> bool:
+        """从information_schema查询列是否存在, 未加引号的列名在PostgreSQL中为小写"""
+        self.execute(
+            "SELECT 1 FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = ? AND column_name IN (?, ?) LIMIT 1",
+            (table_name, column, column.lower()),
+        )
+        return self.fetchone() is not None
+
+    @override
+    def acquire_migration_lock(self, timeout: float = 60.0) -> bool:
+        """使用会话级咨询锁 pg_advisory_lock, 超过lock_timeout时放弃"""
         try:
-            if params:
-                # PostgreSQL使用%s作为参数占位符
-                self.cursor.execute(query, params)
-            else:
-                self.cursor.execute(query)
+            self.execute(f"SET lock_timeout = {int(timeout * 1000)}")
+            self.execute("SELECT pg_advisory_lock(hashtext(?))", (self._migration_lock_name(),))
+            self.fetchone()
+            return True
         except Exception as e:
-            logging.error(f"执行SQL查询失败: {query}, 参数: {params}, 错误: {e}")
-            raise
+            logging.warning(f"获取结构迁移锁失败: {e}")
+            self.rollback()
+            return False
+        finally:
+            try:
+                self.execute("SET lock_timeout = 0")
+            except Exception:
+                pass
+
+    @override
+    def release_migration_lock(self):
+        """释放咨询锁"""
+        self.execute("SELECT pg_advisory_unlock(hashtext(?))", (self._migration_lock_name(),))
+        self.fetchone()
+        self.commit()
+
+    def _migration_lock_name(self) -> str:
+        """咨询锁名称"""
+        return f"lmoadll_migrate:{self.db_prefix}"
+
+    @override
+    def setup_user_fulltext(self, users_table: str) -> bool:
+        """使用pg_trgm的GIN索引支持用户名和邮箱的子串搜索"""
+        try:
+            self.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            self.execute(f"CREATE INDEX IF NOT EXISTS {users_table}_name_trgm ON {users_table} USING gin (name gin_trgm_ops)")
+            self.execute(f"CREATE INDEX IF NOT EXISTS {users_table}_mail_trgm ON {users_table} USING gin (mail gin_trgm_ops)")
+        except Exception as e:
+            logging.warning(f"无法启用pg_trgm, 全文搜索不可用: {e}")
+            self.rollback()
+            return False
+        self.commit()
+        return True
+
+    @override
+    def user_fulltext_available(self, users_table: str) -> bool:
+        """用户名和邮箱的pg_trgm索引都存在时可用, 未加引号的索引名在PostgreSQL中为小写"""
+        self.execute(
+            "SELECT COUNT(*) FROM pg_indexes WHERE schemaname = current_schema() AND indexname IN (?, ?)",
+            (f"{users_table}_name_trgm".lower(), f"{users_table}_mail_trgm".lower()),
+        )
+        return self.fetchscalar() == 2
+
+    @override
+    def execute_user_fulltext_search(self, users_table: str, keyword: str, after_uid: int, limit: int) -> bool:
+        """ILIKE '%kw%' 可以使用pg_trgm索引, 用户名和邮箱分别查询后合并"""
+        pattern = "%" + escape_like(keyword) + "%"
+        self.execute_statement(
+            ("SearchUsers.fulltext", users_table),
+            lambda: (
+                f"SELECT uid, name, mail FROM {users_table} WHERE uid IN ("
+                f"SELECT uid FROM {users_table} WHERE name ILIKE ? ESCAPE '!' AND uid > ? "
+                f"UNION SELECT uid FROM {users_table} WHERE mail ILIKE ? ESCAPE '!' AND uid > ?"
+                f") ORDER BY uid LIMIT ?"
+            ),
+            (pattern, after_uid, pattern, after_uid, limit),
+        )
+        return True
+
+    @override
+    def _is_disconnect_error(self, error: Exception) -> bool:
+        """连接被服务器关闭或网络中断"""
+        if isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+            return self.connection is None or self.connection.closed != 0  # pyright: ignore[reportAttributeAccessIssue]
+        return False
     
     @override
     def _get_create_users_sql(self, users_table: str):
@@ -401,7 +1193,7 @@ class PostgreSQLAdapter(DatabaseAdapter):
         return f"""
             CREATE TABLE IF NOT EXISTS {options_table} (
             name VARCHAR(32) NOT NULL,
-            user INTEGER DEFAULT 0 NOT NULL,
+            "user" INTEGER DEFAULT 0 NOT NULL,
             value TEXT
         )
         """
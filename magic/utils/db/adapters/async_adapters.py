@@ -0,0 +1,558 @@
+# -*- coding: utf-8 -*-
+# lmoadll_bl platform
+#
+# @copyright  Copyright (c) 2025 lmoadll_bl team
+# @license  GNU General Public License 3.0
+"""
+异步数据库适配器模块
+包含AsyncDatabaseAdapter基类、AsyncSQLiteAdapter(aiosqlite)、AsyncMySQLAdapter(aiomysql)、
+AsyncPostgreSQLAdapter(asyncpg)和AsyncDatabaseFactory工厂类。
+
+与同步适配器使用相同的SQL写法(? 占位符和反引号标识符)、语句缓存和事务语义:
+查询、执行、提交、回滚都是协程, 一个连接同一时间只能被一个协程使用。
+"""
+
+import os
+import logging
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, Iterable, Sequence, override
+
+try:
+    import aiosqlite
+except ImportError:
+    aiosqlite = None
+try:
+    import aiomysql
+except ImportError:
+    aiomysql = None
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+from .adapters import STATEMENT_CACHE_SIZE, STREAM_BATCH_SIZE, StatementKey, get_sqlite_pragmas
+from .dialect import quote_identifier, translate_sql
+from .records import Record, record_type, record_type_for
+
+# aiosqlite 在DEBUG级别记录每一次操作, 应用的根日志为DEBUG级别, 这里只保留INFO及以上
+logging.getLogger("aiosqlite").setLevel(logging.INFO)
+
+
+class AsyncDatabaseAdapter:
+    """异步数据库适配器基类"""
+
+    # SQL方言(见 dialect.translate_sql)和驱动的参数占位符风格
+    dialect: str = "sqlite"
+    paramstyle: str = "qmark"
+
+    def __init__(self, config: dict[str, Any]):
+        """
+        初始化适配器
+
+        :param config: 数据库配置字典
+        """
+        self.config: dict[str, Any] = config
+        self.connection: Any = None
+        self.cursor: Any = None
+        self.db_prefix: str = self.config.get("prefix", "")
+        # 自上次提交/回滚以来成功执行的语句数
+        self._pending_statements: int = 0
+        # 提交了已执行语句的次数
+        self.commit_count: int = 0
+        # 生成好的SQL语句缓存, 键如 (模型, 操作, 列名)
+        self._statements: dict[StatementKey, str] = {}
+
+    async def connect(self) -> None:
+        """建立数据库连接"""
+        raise NotImplementedError("子类必须实现connect方法")
+
+    async def disconnect(self) -> None:
+        """断开数据库连接"""
+        self._pending_statements = 0
+        if self.cursor is not None:
+            await self.cursor.close()
+            self.cursor = None
+        if self.connection is not None:
+            await self.connection.close()
+            self.connection = None
+
+    async def close(self) -> None:
+        """关闭连接"""
+        await self.disconnect()
+
+    async def _ensure_connected(self) -> None:
+        """尚未连接时建立连接"""
+        if self.connection is None:
+            await self.connect()
+            if self.connection is None:
+                raise RuntimeError("无法建立数据库连接")
+
+    async def execute(self, query: str, params: tuple[object, ...] | None = None) -> None:
+        """
+        执行SQL查询
+
+        查询统一使用 ? 占位符和反引号标识符, 执行前按数据库方言转换。
+        """
+        query = translate_sql(query, self.dialect, self.paramstyle if params else "literal")
+        await self._ensure_connected()
+        try:
+            await self._execute(query, params)
+        except Exception as e:
+            logging.error(f"执行SQL查询失败: {query}, 参数: {params}, 错误: {e}")
+            raise
+        self._pending_statements += 1
+
+    async def _execute(self, query: str, params: tuple[object, ...] | None) -> None:
+        """使用驱动执行已转换的SQL, 默认通过游标执行"""
+        if params:
+            await self.cursor.execute(query, params)
+        else:
+            await self.cursor.execute(query)
+
+    async def executemany(self, query: str, seq_of_params: Iterable[Sequence[object]]) -> None:
+        """
+        使用同一条SQL批量执行多组参数
+
+        :param query: SQL语句, 使用 ? 占位符
+        :param seq_of_params: 参数序列
+        """
+        query = translate_sql(query, self.dialect, self.paramstyle)
+        await self._ensure_connected()
+        try:
+            await self.cursor.executemany(query, list(seq_of_params))
+        except Exception as e:
+            logging.error(f"批量执行SQL失败: {query}, 错误: {e}")
+            raise
+        self._pending_statements += 1
+
+    def statement(self, key: StatementKey, build: Callable[[], str]) -> str:
+        """
+        获取缓存的SQL语句
+
+        :param key: 语句的缓存键, 如 (模型, 操作, 列名)
+        :param build: 缓存未命中时生成SQL的函数, 生成的SQL使用 ? 占位符
+        :return: 生成好的SQL, 执行时由 execute 按方言转换
+        """
+        sql = self._statements.get(key)
+        if sql is None:
+            sql = build()
+            if len(self._statements) < STATEMENT_CACHE_SIZE:
+                self._statements[key] = sql
+        return sql
+
+    async def execute_statement(self, key: StatementKey, build: Callable[[], str], params: tuple[object, ...] | None = None) -> None:
+        """执行缓存的SQL语句"""
+        await self.execute(self.statement(key, build), params)
+
+    async def fetchone(self) -> Record | None:
+        """获取一条查询结果, 结果行为记录(见 records 模块)"""
+        if self.cursor is None:
+            raise RuntimeError("没有活动的游标")
+        row = await self.cursor.fetchone()
+        if row is None:
+            return None
+        return record_type_for(self.cursor.description)(row)
+
+    async def fetchall(self) -> list[Record]:
+        """获取所有查询结果, 所有结果行共用同一个记录类型"""
+        if self.cursor is None:
+            raise RuntimeError("没有活动的游标")
+        rows = await self.cursor.fetchall()
+        if not rows:
+            return []
+        make = record_type_for(self.cursor.description)
+        return [make(row) for row in rows]
+
+    async def _stream_cursor(self) -> Any:
+        """创建用于流式读取的游标, 默认为连接上的新游标"""
+        return await self.connection.cursor()
+
+    async def stream(self, query: str, params: tuple[object, ...] | None = None, batch_size: int = STREAM_BATCH_SIZE) -> AsyncIterator[Record]:
+        """
+        逐行迭代查询结果, 每次只从数据库取回 batch_size 行, 见 DatabaseAdapter.stream
+
+        用法:
+            async for user in db.stream("SELECT uid, mail FROM users"):
+                ...
+        """
+        query = translate_sql(query, self.dialect, self.paramstyle if params else "literal")
+        await self._ensure_connected()
+        cursor = await self._stream_cursor()
+        try:
+            try:
+                if params:
+                    await cursor.execute(query, params)
+                else:
+                    await cursor.execute(query)
+            except Exception as e:
+                logging.error(f"执行SQL查询失败: {query}, 参数: {params}, 错误: {e}")
+                raise
+            self._pending_statements += 1
+
+            make = None
+            while True:
+                rows = await cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                if make is None:
+                    make = record_type_for(cursor.description)
+                for row in rows:
+                    yield make(row)
+        finally:
+            await cursor.close()
+
+    async def fetchscalar(self) -> Any:
+        """获取下一行的第一列, 没有结果时返回None"""
+        row = await self.fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    @property
+    def lastrowid(self) -> Any:
+        """最近一条INSERT生成的主键"""
+        return getattr(self.cursor, "lastrowid", None)
+
+    @property
+    def rowcount(self) -> int:
+        """最近一条语句影响的行数"""
+        return getattr(self.cursor, "rowcount", -1)
+
+    async def commit(self) -> None:
+        """提交事务"""
+        if self.connection is not None:
+            await self.connection.commit()
+            if self._pending_statements:
+                self.commit_count += 1
+            self._pending_statements = 0
+
+    async def rollback(self) -> None:
+        """回滚事务"""
+        if self.connection is not None:
+            await self.connection.rollback()
+            self._pending_statements = 0
+
+    async def ping(self) -> bool:
+        """检查连接是否可用"""
+        try:
+            await self.execute("SELECT 1")
+            await self.fetchone()
+            return True
+        except Exception:
+            return False
+
+    def in_transaction(self) -> bool:
+        """连接上是否有尚未提交或回滚的事务"""
+        return self._pending_statements > 0
+
+
+class AsyncSQLiteAdapter(AsyncDatabaseAdapter):
+    """SQLite异步适配器, 基于aiosqlite(每个连接一个后台线程)"""
+
+    @override
+    async def connect(self) -> None:
+        """建立SQLite数据库连接, 设置与同步适配器相同的PRAGMA"""
+        if aiosqlite is None:
+            raise ImportError("aiosqlite模块未安装,请使用 'pip install aiosqlite' 安装")
+
+        try:
+            db_path = self.config.get("path")
+            if not db_path:
+                raise ValueError("SQLite数据库路径未配置")
+
+            # 确保数据库文件所在目录存在
+            db_dir = os.path.dirname(db_path)
+            if db_dir and not os.path.exists(db_dir):
+                os.makedirs(db_dir)
+
+            self.connection = await aiosqlite.connect(db_path)
+            self.cursor = await self.connection.cursor()
+            for name, value in get_sqlite_pragmas(self.config):
+                await self.cursor.execute(f"PRAGMA {name} = {value}")
+        except Exception as e:
+            logging.error(f"连接SQLite数据库失败: {e}")
+            raise
+
+    @override
+    async def ping(self) -> bool:
+        """SQLite是本地文件数据库, 连接对象存在即可用"""
+        return self.connection is not None
+
+    @override
+    def in_transaction(self) -> bool:
+        """使用sqlite3自带的事务状态, 不需要访问数据库"""
+        return bool(self.connection is not None and self.connection.in_transaction)
+
+
+class AsyncMySQLAdapter(AsyncDatabaseAdapter):
+    """MySQL异步适配器, 基于aiomysql"""
+
+    dialect = "mysql"
+    paramstyle = "format"
+
+    @override
+    async def connect(self) -> None:
+        """建立MySQL数据库连接, 结果行为元组"""
+        if aiomysql is None:
+            raise ImportError("aiomysql模块未安装,请使用 'pip install aiomysql' 安装")
+
+        try:
+            self.connection = await aiomysql.connect(
+                host=self.config.get("host", "localhost"),
+                port=int(self.config.get("port", 3306)),
+                user=self.config.get("user", "root"),
+                password=self.config.get("password", ""),
+                db=self.config.get("database", "lmoadll_bl"),
+                charset="utf8mb4",
+                autocommit=False,
+            )
+            self.cursor = await self.connection.cursor()
+        except Exception as e:
+            logging.error(f"连接MySQL数据库失败: {e}")
+            raise
+
+    @override
+    async def disconnect(self) -> None:
+        """断开数据库连接, aiomysql 的连接使用同步的 close()"""
+        self._pending_statements = 0
+        if self.cursor is not None:
+            await self.cursor.close()
+            self.cursor = None
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    @override
+    async def _stream_cursor(self) -> Any:
+        """使用非缓冲的 SSCursor, 结果行留在服务器端按需读取"""
+        return await self.connection.cursor(aiomysql.SSCursor)
+
+    @override
+    async def ping(self) -> bool:
+        """使用MySQL协议的 COM_PING 检测, 不执行SQL"""
+        if self.connection is None:
+            return False
+        try:
+            await self.connection.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+
+@lru_cache(maxsize=1024)
+def _returns_rows(query: str) -> bool:
+    """语句是否返回结果行"""
+    head = query.lstrip()[:8].upper()
+    return head.startswith(("SELECT", "WITH", "VALUES", "SHOW", "EXPLAIN")) or " RETURNING " in query.upper()
+
+
+class AsyncPostgreSQLAdapter(AsyncDatabaseAdapter):
+    """
+    PostgreSQL异步适配器, 基于asyncpg
+
+    asyncpg 没有游标, 查询结果在执行时全部取回; 带参数的语句由 asyncpg 在连接上自动预处理并缓存。
+    asyncpg 默认自动提交, 这里在第一条语句前开启事务, 保持与其他适配器相同的提交/回滚语义。
+    """
+
+    dialect = "postgresql"
+    paramstyle = "numeric"
+
+    def __init__(self, config: dict[str, Any]):
+        super().__init__(config)
+        self._transaction: Any = None
+        self._rows: list[Record] = []
+        self._row_index: int = 0
+        self._rowcount: int = -1
+
+    @override
+    async def connect(self) -> None:
+        """建立PostgreSQL数据库连接"""
+        if asyncpg is None:
+            raise ImportError("asyncpg模块未安装,请使用 'pip install asyncpg' 安装")
+
+        try:
+            self.connection = await asyncpg.connect(
+                host=self.config.get("host", "localhost"),
+                port=int(self.config.get("port", 5432)),
+                user=self.config.get("user", "postgres"),
+                password=self.config.get("password", ""),
+                database=self.config.get("database", "lmoadll_bl"),
+            )
+        except Exception as e:
+            logging.error(f"连接PostgreSQL数据库失败: {e}")
+            raise
+
+    @override
+    async def disconnect(self) -> None:
+        """断开数据库连接, 未提交的事务随连接一起丢弃"""
+        self._pending_statements = 0
+        self._transaction = None
+        self._rows = []
+        if self.connection is not None:
+            await self.connection.close()
+            self.connection = None
+
+    async def _begin(self) -> None:
+        """第一条语句前开启事务"""
+        if self._transaction is None:
+            self._transaction = self.connection.transaction()
+            await self._transaction.start()
+
+    @override
+    async def _execute(self, query: str, params: tuple[object, ...] | None) -> None:
+        """返回结果行的语句取回全部结果, 其余语句从状态信息中解析影响的行数"""
+        await self._begin()
+        args = params or ()
+        if _returns_rows(query):
+            rows = await self.connection.fetch(query, *args)
+            # asyncpg.Record 转换为与其他适配器相同的记录类型
+            if rows:
+                make = record_type(tuple(rows[0].keys()))
+                self._rows = [make(row) for row in rows]
+            else:
+                self._rows = []
+            self._rowcount = len(self._rows)
+        else:
+            status = await self.connection.execute(query, *args)
+            self._rows = []
+            # 状态信息如 "UPDATE 3"、"INSERT 0 1"
+            last = status.rsplit(" ", 1)[-1] if status else ""
+            self._rowcount = int(last) if last.isdigit() else -1
+        self._row_index = 0
+
+    @override
+    async def executemany(self, query: str, seq_of_params: Iterable[Sequence[object]]) -> None:
+        """使用 asyncpg 的 executemany, 所有参数组在一次往返中流水线发送"""
+        query = translate_sql(query, self.dialect, self.paramstyle)
+        await self._ensure_connected()
+        await self._begin()
+        try:
+            await self.connection.executemany(query, [tuple(params) for params in seq_of_params])
+        except Exception as e:
+            logging.error(f"批量执行SQL失败: {query}, 错误: {e}")
+            raise
+        self._pending_statements += 1
+
+    @override
+    async def stream(self, query: str, params: tuple[object, ...] | None = None, batch_size: int = STREAM_BATCH_SIZE) -> AsyncIterator[Record]:
+        """使用 asyncpg 的服务器端游标逐批读取, 游标在当前事务内有效"""
+        query = translate_sql(query, self.dialect, self.paramstyle if params else "literal")
+        await self._ensure_connected()
+        await self._begin()
+        self._pending_statements += 1
+        make = None
+        async for row in self.connection.cursor(query, *(params or ()), prefetch=batch_size):
+            if make is None:
+                make = record_type(tuple(row.keys()))
+            yield make(row)
+
+    async def copy_rows(self, table_name: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+        """
+        使用 COPY 协议批量导入数据, 适合大批量导入
+
+        :param table_name: 表名
+        :param columns: 列名
+        :param rows: 行数据, 每行的值与 columns 一一对应
+        :return: 导入的行数
+        :raises ValueError: 列名不是有效的标识符时
+        """
+        # asyncpg 给列名加双引号, 未加引号建立的列在服务器端为小写, 保留字列建表时即为小写
+        names = [quote_identifier(column.strip("`")).strip("`").lower() for column in columns]
+        # 标志位均为INTEGER列, 布尔值按整数导入, 与 execute 传参时一致
+        records = [tuple(int(value) if isinstance(value, bool) else value for value in row) for row in rows]
+        await self._ensure_connected()
+        await self._begin()
+        try:
+            await self.connection.copy_records_to_table(
+                table_name,
+                records=records,
+                columns=names,
+            )
+        except Exception as e:
+            logging.error(f"COPY导入数据失败: {table_name}, 错误: {e}")
+            raise
+        self._pending_statements += 1
+        return len(records)
+
+    @override
+    async def fetchone(self) -> Record | None:
+        """获取一条查询结果"""
+        if self._row_index >= len(self._rows):
+            return None
+        row = self._rows[self._row_index]
+        self._row_index += 1
+        return row
+
+    @override
+    async def fetchall(self) -> list[Record]:
+        """获取剩余的查询结果"""
+        rows = list(self._rows[self._row_index:])
+        self._row_index = len(self._rows)
+        return rows
+
+    @property
+    @override
+    def lastrowid(self) -> Any:
+        """PostgreSQL 使用 RETURNING 获取主键"""
+        return None
+
+    @property
+    @override
+    def rowcount(self) -> int:
+        """最近一条语句影响的行数"""
+        return self._rowcount
+
+    @override
+    async def commit(self) -> None:
+        """提交事务"""
+        if self._transaction is not None:
+            await self._transaction.commit()
+            self._transaction = None
+            if self._pending_statements:
+                self.commit_count += 1
+        self._pending_statements = 0
+
+    @override
+    async def rollback(self) -> None:
+        """回滚事务"""
+        if self._transaction is not None:
+            transaction, self._transaction = self._transaction, None
+            await transaction.rollback()
+        self._pending_statements = 0
+
+    @override
+    async def ping(self) -> bool:
+        """连接未关闭时执行一次空查询"""
+        if self.connection is None or self.connection.is_closed():
+            return False
+        try:
+            await self.connection.fetchval("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    @override
+    def in_transaction(self) -> bool:
+        """是否已开启尚未提交或回滚的事务"""
+        return self._transaction is not None
+
+
+class AsyncDatabaseFactory:
+    """异步数据库适配器工厂类"""
+
+    @staticmethod
+    def create_adapter(db_type: str, config: dict[str, Any]) -> AsyncDatabaseAdapter:
+        """
+        创建异步数据库适配器实例
+
+        :param db_type: 数据库类型(sqlite、mysql、postgresql)
+        :param config: 数据库配置
+        :return: 异步数据库适配器实例
+        """
+        if db_type == "sqlite":
+            return AsyncSQLiteAdapter(config)
+        elif db_type == "mysql":
+            return AsyncMySQLAdapter(config)
+        elif db_type == "postgresql":
+            return AsyncPostgreSQLAdapter(config)
+        else:
+            raise ValueError(f"不支持的数据库类型: {db_type}")
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# lmoadll_bl platform
+#
+# @copyright  Copyright (c) 2025 lmoadll_bl team
+# @license  GNU General Public License 3.0
+"""
+SQL方言转换模块
+
+调用方统一使用 ? 占位符和反引号标识符(如 `group`)编写SQL,
+执行前按数据库类型转换为驱动可用的写法:
+    - sqlite: 原样执行
+    - mysql: ? 转换为 %s, 有参数时 % 转义为 %%
+    - postgresql: ? 转换为 %s, 有参数时 % 转义为 %%, 反引号标识符转换为双引号
+单引号字符串字面量内的内容不做转换。转换结果按语句文本缓存(LRU), 同一语句只转换一次。
+"""
+
+import re
+from functools import lru_cache
+
+# 转换结果缓存的语句数上限
+TRANSLATION_CACHE_SIZE = 1024
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+# 需要用反引号引用的列名(SQL保留字), 其余列名不引用,
+# 以免PostgreSQL中未加引号建立的列(如 createdAt 实际为 createdat)因大小写不匹配而找不到
+RESERVED_WORDS = frozenset({
+    "all", "and", "as", "asc", "between", "by", "case", "check", "column", "default", "desc", "distinct",
+    "from", "group", "having", "in", "index", "is", "key", "like", "limit", "not", "null", "offset",
+    "on", "or", "order", "primary", "select", "table", "to", "user", "when", "where",
+})
+
+# 占位符模式
+#   qmark: 保留 ?
+#   format: ? 转换为 %s, % 转义为 %%, 用于带参数执行
+#   numeric: ? 转换为 $1, $2, ..., 用于PostgreSQL的PREPARE
+#   literal: 不带参数执行, 只转换标识符
+PLACEHOLDER_MODES = ("qmark", "format", "numeric", "literal")
+
+
+@lru_cache(maxsize=TRANSLATION_CACHE_SIZE)
+def translate_sql(sql: str, dialect: str, placeholder: str) -> str:
+    """
+    将使用 ? 占位符和反引号标识符的SQL转换为指定数据库的写法
+
+    :param sql: 原始SQL
+    :param dialect: 数据库类型(sqlite、mysql、postgresql)
+    :param placeholder: 占位符模式, 见 PLACEHOLDER_MODES
+    :return: 转换后的SQL
+    """
+    quote_identifiers = dialect == "postgresql"
+    if not quote_identifiers and placeholder in ("qmark", "literal"):
+        return sql
+    if placeholder not in PLACEHOLDER_MODES:
+        raise ValueError(f"不支持的占位符模式: {placeholder}")
+
+    parts: list[str] = []
+    in_string = False
+    index = 0
+    for char in sql:
+        if in_string:
+            if char == "'":
+                in_string = False
+            elif char == "%" and placeholder == "format":
+                char = "%%"
+        elif char == "'":
+            in_string = True
+        elif char == "?":
+            if placeholder == "format":
+                char = "%s"
+            elif placeholder == "numeric":
+                index += 1
+                char = f"${index}"
+        elif char == "%":
+            if placeholder == "format":
+                char = "%%"
+        elif char == "`" and quote_identifiers:
+            char = '"'
+        parts.append(char)
+    return "".join(parts)
+
+
+def quote_identifier(name: str, quote: bool = False) -> str:
+    """
+    校验列名, 保留字和 quote=True 时用反引号引用, 执行前按数据库类型转换, 见 translate_sql
+
+    :raises ValueError: 不是有效的标识符时
+    """
+    if not _IDENTIFIER.fullmatch(name):
+        raise ValueError(f"无效的列名: {name}")
+    if quote or name.lower() in RESERVED_WORDS:
+        return f"`{name}`"
+    return name
+
+
+def escape_like(value: str) -> str:
+    """转义LIKE模式中的通配符, 配合 ESCAPE '!' 使用(各数据库都把 ! 当作普通字符)"""
+    return value.replace("!", "!!").replace("%", "!%").replace("_", "!_")
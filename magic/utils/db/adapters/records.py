@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# lmoadll_bl platform
+#
+# @copyright  Copyright (c) 2025 lmoadll_bl team
+# @license  GNU General Public License 3.0
+"""
+查询结果记录模块
+
+各数据库驱动的结果行统一转换为记录(Record): 元组子类, 没有实例字典(__slots__ = ()),
+同时支持下标 row[0]、列名 row["name"] 和属性 row.name 访问, 可以直接解包。
+每组列名只生成一次记录类型, 同一语句的所有结果行共用该类型, 不再为每一行创建字典。
+"""
+from functools import lru_cache
+from keyword import iskeyword
+from operator import itemgetter
+from typing import Any, Dict, Iterator, Sequence, Tuple
+
+
+# 缓存的记录类型数上限(不同的列名组合数)
+RECORD_CACHE_SIZE = 512
+
+
+class Record(tuple):
+    """查询结果记录基类, 子类由 record_type 按列名生成"""
+
+    __slots__ = ()
+
+    _fields: Tuple[str, ...] = ()
+    _index: Dict[str, int] = {}
+
+    def __getitem__(self, key: Any) -> Any:  # pyright: ignore[reportIncompatibleMethodOverride]
+        """按下标、切片或列名取值"""
+        if key.__class__ is str:
+            try:
+                key = self._index[key]
+            except KeyError:
+                raise KeyError(key) from None
+        return tuple.__getitem__(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """按列名取值, 列不存在时返回default"""
+        index = self._index.get(key)
+        if index is None:
+            return default
+        return tuple.__getitem__(self, index)
+
+    def keys(self) -> Tuple[str, ...]:
+        """列名, 使 dict(row) 可用"""
+        return self._fields
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """(列名, 值) 对"""
+        return zip(self._fields, self)
+
+    def _asdict(self) -> Dict[str, Any]:
+        """转换为 {列名: 值}, 用于JSON序列化"""
+        return dict(zip(self._fields, self))
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{name}={value!r}" for name, value in zip(self._fields, self))
+        return f"{self.__class__.__name__}({values})"
+
+    def __reduce__(self):
+        """按列名重建记录类型, 使记录可以pickle"""
+        return (_rebuild_record, (self._fields, tuple(self)))
+
+
+@lru_cache(maxsize=RECORD_CACHE_SIZE)
+def record_type(fields: Tuple[str, ...]) -> type[Record]:
+    """
+    获取列名对应的记录类型, 同一组列名返回同一个类型
+
+    列名为合法标识符且不与记录的方法重名时生成同名只读属性, 其余列只能通过下标或列名访问。
+
+    :param fields: 列名
+    :return: Record的子类
+    """
+    namespace: Dict[str, Any] = {
+        "__slots__": (),
+        "_fields": fields,
+        # 重复的列名按第一次出现的位置访问
+        "_index": {name: index for index, name in reversed(list(enumerate(fields)))},
+    }
+    for index, name in enumerate(fields):
+        if name.isidentifier() and not iskeyword(name) and not hasattr(Record, name) and name not in namespace:
+            namespace[name] = property(itemgetter(index))
+    return type("Record", (Record,), namespace)
+
+
+def record_type_for(description: Sequence[Sequence[Any]]) -> type[Record]:
+    """根据 DB-API 游标的 description 获取记录类型"""
+    return record_type(tuple([column[0] for column in description]))
+
+
+def _rebuild_record(fields: Tuple[str, ...], values: Tuple[Any, ...]) -> Record:
+    """pickle还原记录"""
+    return record_type(fields)(values)
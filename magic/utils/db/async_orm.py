@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步ORM模块
+
+ORM 的asyncio版本, 供异步路由和ASGI部署使用, 与同步的 db_orm 并存:
+    - 数据库可以通过 register_db 单独注册, 未注册的名称沿用 db_orm 中同名数据库的类型和配置,
+      迁移期间同步和异步代码使用同一个已配置的数据库
+    - 连接属于创建它的事件循环, 每个事件循环使用各自的连接池;
+      ASGI服务器的每个工作进程只有一个事件循环, 连接在所有请求间复用
+    - Flask 的 async 视图每个请求运行在新的事件循环中, 连接无法跨请求复用,
+      视图结束前需调用 await async_db_orm.close_all() 关闭本次事件循环的连接
+
+用法:
+    async with async_db_orm.connection() as db:
+        user = await UserModel.afind_by_id(db, 1)
+"""
+import os
+import asyncio
+import logging
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from magic.utils.db.adapters.async_adapters import AsyncDatabaseAdapter
+from magic.utils.db.async_pool import AsyncConnectionPool
+from magic.utils.db.connection_pool import ConnectionPool
+from magic.utils.db.migrations import EnsureSchema
+from magic.utils.db.orm import db_orm
+
+
+class AsyncORM:
+    """
+    异步ORM主类, 按事件循环管理多个数据库连接池
+
+    提供数据库注册、连接作用域和事务作用域。
+    """
+
+    def __init__(self):
+        """初始化异步ORM实例"""
+        # 数据库名称 -> (数据库类型, 配置, 连接池参数)
+        self._databases: Dict[str, Tuple[str, Dict[str, Any], Dict[str, Any]]] = {}
+        # 事件循环 -> {数据库名称: 连接池}, 事件循环被回收后对应的连接池一起释放
+        self._pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, AsyncConnectionPool]]" = weakref.WeakKeyDictionary()
+        self._default_db: Optional[str] = None
+
+    def register_db(self, name: str, db_type: str, config: Dict[str, Any], pool_size: int = 5, migrate: bool = True, **pool_options: Any) -> None:
+        """
+        注册数据库连接
+
+        Args:
+            name: 数据库名称
+            db_type: 数据库类型 (sqlite/mysql/postgresql)
+            config: 数据库配置字典
+            pool_size: 连接池大小,默认为5
+            migrate: 是否执行尚未执行的结构迁移, 见 migrations 模块
+            **pool_options: 其他连接池参数, 如 max_overflow、timeout, 见 AsyncConnectionPool
+
+        Raises:
+            ValueError: 当数据库类型不支持时
+        """
+        if db_type not in ("sqlite", "mysql", "postgresql"):
+            raise ValueError(f"不支持的数据库类型: {db_type}")
+        config["type"] = db_type
+        self._databases[name] = (db_type, config, dict(pool_options, pool_size=pool_size))
+
+        # 结构迁移使用同步适配器, 每个数据库在每个进程中只检查一次
+        if migrate:
+            pool = ConnectionPool(db_type, config, pool_size=0, max_overflow=1)
+            try:
+                EnsureSchema(pool)
+            except Exception as e:
+                logging.error(f"数据库结构迁移失败: {e}")
+            finally:
+                pool.close()
+
+        if self._default_db is None:
+            self._default_db = name
+
+    def _resolve(self, name: Optional[str]) -> Tuple[str, Tuple[str, Dict[str, Any], Dict[str, Any]]]:
+        """获取数据库名称及其类型、配置和连接池参数, 未注册时沿用 db_orm 中的同名数据库"""
+        if name is None:
+            name = self._default_db or db_orm._default_db
+        database = self._databases.get(name)  # pyright: ignore[reportArgumentType]
+        if database is not None:
+            return name, database  # pyright: ignore[reportReturnType]
+        sync_pool = db_orm._pools.get(name)  # pyright: ignore[reportArgumentType]
+        if sync_pool is None:
+            raise ValueError(f"未注册的数据库: {name}")
+        return name, (  # pyright: ignore[reportReturnType]
+            sync_pool.db_type,
+            sync_pool.config,
+            {"pool_size": sync_pool.pool_size, "max_overflow": sync_pool.max_overflow, "timeout": sync_pool.timeout},
+        )
+
+    async def get_pool(self, name: Optional[str] = None) -> AsyncConnectionPool:
+        """
+        获取当前事件循环中的连接池, 尚未创建或配置已变更时创建
+
+        Raises:
+            ValueError: 当指定的数据库未注册时
+        """
+        name, (db_type, config, pool_options) = self._resolve(name)
+        loop = asyncio.get_running_loop()
+        pools = self._pools.get(loop)
+        if pools is None:
+            pools = {}
+            self._pools[loop] = pools
+
+        pool = pools.get(name)
+        if pool is not None and pool.config is config and not pool.closed:
+            return pool
+        # 数据库被重新注册(如安装流程), 旧连接池关闭
+        if pool is not None:
+            await pool.close()
+        pool = AsyncConnectionPool(db_type, config, **pool_options)
+        pools[name] = pool
+        return pool
+
+    @asynccontextmanager
+    async def connection(self, name: Optional[str] = None) -> AsyncIterator[AsyncDatabaseAdapter]:
+        """
+        在作用域内使用一个数据库连接
+
+        作用域内抛出异常时先回滚未提交的事务, 无论是否出错连接都会归还到连接池。
+
+        Args:
+            name: 数据库名称,如果为None则使用默认数据库
+
+        Raises:
+            ValueError: 当指定的数据库未注册时
+        """
+        pool = await self.get_pool(name)
+        async with pool.connection() as adapter:
+            yield adapter
+
+    @asynccontextmanager
+    async def transaction(self, name: Optional[str] = None) -> AsyncIterator[AsyncDatabaseAdapter]:
+        """
+        在作用域内执行事务, 作用域正常结束时提交, 抛出异常时回滚
+
+        Args:
+            name: 数据库名称,如果为None则使用默认数据库
+        """
+        async with self.connection(name) as adapter:
+            yield adapter
+            await adapter.commit()
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        获取所有连接池的指标
+
+        Returns:
+            {数据库名称: AsyncConnectionPool.get_metrics() 的结果}, 有多个事件循环时
+            第二个起的事件循环中的连接池名称为 "数据库名称#序号"
+        """
+        metrics: Dict[str, Dict[str, Any]] = {}
+        for index, pools in enumerate(list(self._pools.values())):
+            for name, pool in list(pools.items()):
+                metrics[name if index == 0 else f"{name}#{index}"] = pool.get_metrics()
+        return metrics
+
+    async def close_all(self) -> None:
+        """关闭当前事件循环中的所有连接池"""
+        pools = self._pools.pop(asyncio.get_running_loop(), None)
+        if not pools:
+            return
+        for pool in pools.values():
+            await pool.close()
+
+
+# 全局异步ORM实例
+async_db_orm = AsyncORM()
+
+
+def _reset_after_fork() -> None:
+    """子进程中丢弃从父进程继承的连接池, 各工作进程使用自己的事件循环和连接"""
+    async_db_orm._pools = weakref.WeakKeyDictionary()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+# lmoadll_bl platform
+#
+# @copyright  Copyright (c) 2025 lmoadll_bl team
+# @license  GNU General Public License 3.0
+"""
+异步数据库连接池模块
+
+ConnectionPool 的asyncio版本: 最多保持 pool_size 个常驻连接, 突发负载时最多再创建 max_overflow 个溢出连接,
+达到上限后获取连接的协程按先来先到排队等待, 超过 timeout 秒仍无可用连接时抛出 PoolExhaustedError。
+等待连接和执行查询时只挂起当前协程, 一个工作进程可以同时进行数百个查询。
+
+连接属于创建它的事件循环, 一个连接池只能在一个事件循环中使用, 见 async_orm 模块。
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+from magic.utils.db.adapters.async_adapters import AsyncDatabaseAdapter, AsyncDatabaseFactory
+from magic.utils.db.connection_pool import PoolExhaustedError
+
+
+class AsyncConnectionPool:
+    """异步数据库连接池"""
+
+    def __init__(
+        self,
+        db_type: str,
+        config: dict[str, Any],
+        pool_size: int = 5,
+        max_idle_time: float = 300,
+        max_overflow: int = 10,
+        timeout: float = 30.0,
+        overflow_idle_time: float = 10.0,
+        validate_after: float = 30.0,
+    ):
+        """
+        初始化连接池, 连接在第一次使用时创建
+
+        :param db_type: 数据库类型
+        :param config: 数据库配置
+        :param pool_size: 连接池大小(常驻连接数)
+        :param max_idle_time: 连接最大空闲时间(秒), 超过后借出前关闭
+        :param max_overflow: 常驻连接用尽时最多额外创建的溢出连接数
+        :param timeout: 连接数达到上限时获取连接的最长等待时间(秒)
+        :param overflow_idle_time: 空闲连接多于 pool_size 时, 空闲超过该时间(秒)的连接被关闭, 避免突发负载下反复建立/断开连接
+        :param validate_after: 空闲超过该时间(秒)的连接借出前检测是否可用
+        """
+        self.db_type: str = db_type
+        self.config: dict[str, Any] = config
+        self.pool_size: int = pool_size
+        self.max_idle_time: float = max_idle_time
+        self.max_overflow: int = max_overflow
+        self.timeout: float = timeout
+        self.overflow_idle_time: float = overflow_idle_time
+        self.validate_after: float = validate_after
+        # 空闲连接及归还时间, 右端为最近归还的连接
+        self.pool: deque[tuple[AsyncDatabaseAdapter, float]] = deque()
+        # 已打开(含借出和正在创建)的连接数
+        self.connection_count: int = 0
+        self.acquired_count: int = 0
+        self.released_count: int = 0
+        self.created_count: int = 0
+        self.closed_count: int = 0
+        self.validation_failures: int = 0
+        self.timeout_count: int = 0
+        self.closed: bool = False
+        # 借出名额, 总数为 pool_size + max_overflow, asyncio.Semaphore 按先来先到唤醒等待者
+        self._slots: asyncio.Semaphore = asyncio.Semaphore(self.max_size)
+        self._waiting: int = 0
+
+    @property
+    def max_size(self) -> int:
+        """连接数上限(常驻 + 溢出)"""
+        return self.pool_size + self.max_overflow
+
+    @property
+    def checked_out(self) -> int:
+        """当前已借出、尚未归还的连接数, 每次获取都配对归还时应为0"""
+        return self.acquired_count - self.released_count
+
+    async def _disconnect(self, adapter: AsyncDatabaseAdapter) -> None:
+        """关闭一个连接"""
+        self.connection_count -= 1
+        self.closed_count += 1
+        try:
+            await adapter.close()
+        except Exception as e:
+            logging.warning(f"关闭数据库连接失败: {e}")
+
+    async def _create_connection(self) -> AsyncDatabaseAdapter:
+        """创建新连接"""
+        adapter = AsyncDatabaseFactory.create_adapter(self.db_type, self.config)
+        self.connection_count += 1
+        try:
+            await adapter.connect()
+        except Exception:
+            self.connection_count -= 1
+            raise
+        self.created_count += 1
+        return adapter
+
+    async def get_connection(self, timeout: float | None = None) -> AsyncDatabaseAdapter:
+        """
+        从连接池获取连接
+
+        :param timeout: 最长等待时间(秒), 默认使用连接池的timeout
+        :raises PoolExhaustedError: 连接数已达上限且等待超时
+        """
+        if self.closed:
+            raise RuntimeError("连接池已关闭")
+
+        timeout = self.timeout if timeout is None else timeout
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.timeout_count += 1
+            raise PoolExhaustedError(self.pool_size, self.max_overflow, timeout, self.checked_out, self._waiting - 1)
+        finally:
+            self._waiting -= 1
+
+        try:
+            now = time.monotonic()
+            # 突发负载过后多出的空闲连接, 从最早归还的开始关闭
+            while len(self.pool) > self.pool_size and now - self.pool[0][1] > self.overflow_idle_time:
+                await self._disconnect(self.pool.popleft()[0])
+            while self.pool:
+                adapter, returned_at = self.pool.pop()
+                idle = now - returned_at
+                if idle > self.max_idle_time:
+                    await self._disconnect(adapter)
+                    continue
+                if idle > self.validate_after and not await adapter.ping():
+                    self.validation_failures += 1
+                    await self._disconnect(adapter)
+                    continue
+                break
+            else:
+                adapter = await self._create_connection()
+        except BaseException:
+            self._slots.release()
+            raise
+
+        self.acquired_count += 1
+        return adapter
+
+    async def return_connection(self, adapter: AsyncDatabaseAdapter | None) -> None:
+        """归还连接到连接池, 未提交的事务先回滚"""
+        if adapter is None:
+            return
+        self.released_count += 1
+        try:
+            if self.closed:
+                await self._disconnect(adapter)
+                return
+            if adapter.in_transaction():
+                try:
+                    await adapter.rollback()
+                except Exception as e:
+                    logging.warning(f"回滚归还的连接失败, 关闭该连接: {e}")
+                    await self._disconnect(adapter)
+                    return
+            self.pool.append((adapter, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[AsyncDatabaseAdapter]:
+        """在作用域内借出一个连接, 作用域内抛出异常时先回滚"""
+        adapter = await self.get_connection()
+        try:
+            yield adapter
+        except Exception:
+            try:
+                await adapter.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            await self.return_connection(adapter)
+
+    def get_metrics(self) -> dict[str, Any]:
+        """获取连接池指标, 字段与 ConnectionPool.get_metrics 一致"""
+        in_use = self.checked_out
+        return {
+            "pid": os.getpid(),
+            "db_type": self.db_type,
+            "closed": self.closed,
+            "pool_size": self.pool_size,
+            "max_overflow": self.max_overflow,
+            "max_size": self.max_size,
+            "connections": self.connection_count,
+            "in_use": in_use,
+            "idle": len(self.pool),
+            "overflow": max(0, self.connection_count - self.pool_size),
+            "waiting": self._waiting,
+            "acquired_total": self.acquired_count,
+            "released_total": self.released_count,
+            "created_total": self.created_count,
+            "closed_total": self.closed_count,
+            "validation_failures": self.validation_failures,
+            "timeouts": self.timeout_count,
+        }
+
+    async def close(self) -> None:
+        """关闭连接池和所有空闲连接, 借出中的连接归还时关闭"""
+        self.closed = True
+        while self.pool:
+            adapter, _ = self.pool.pop()
+            await self._disconnect(adapter)
@@ -7,150 +7,462 @@
 数据库连接池模块
 
 提供线程安全的数据库连接池管理,支持连接复用、连接验证和空闲连接回收。
+
+连接池最多保持 pool_size 个常驻连接, 突发负载时最多再创建 max_overflow 个溢出连接;
+达到上限后获取连接的线程按先来先到(FIFO)排队等待, 超过 timeout 秒仍无可用连接时抛出 PoolExhaustedError。
+
+借出连接时的验证策略(validation):
+    - "always":   每次借出都执行 SELECT 1
+    - "ping":     每次借出都使用驱动自带的检测(pymysql ping / psycopg2 连接状态)
+    - "idle":     仅当连接空闲超过 validate_after 秒时检测, 刚归还的热连接直接复用(默认)
+    - "on_error": 借出时不检测, 语句因断线失败时重连并重试一次
+
+设置 maintenance_interval 后, 每个连接池会启动一个后台维护线程, 在请求线程之外
+关闭空闲超过 max_idle_time 或存活超过 max_lifetime 的连接, 并保持 min_idle 个预热的空闲连接。
 """
+import os
 import threading
 import time
 import logging
-from queue import Queue, Empty
-
-try:
-    import sqlite3
-except ImportError:
-    pass
-try:
-    import pymysql
-except ImportError:
-    pass
-try:
-    import psycopg2
-except ImportError:
-    pass
+from bisect import bisect_left
+from collections import deque
+from typing import Any
 
 from magic.utils.db.adapters.adapters import DatabaseFactory
 
 
+VALIDATION_STRATEGIES = ("always", "ping", "idle", "on_error")
+
+# 获取连接等待时间直方图的桶上限(毫秒), 最后一个桶收集所有更长的等待
+ACQUIRE_WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class PoolExhaustedError(RuntimeError):
+    """连接池已耗尽: 等待超时仍没有可用连接"""
+
+    def __init__(self, pool_size: int, max_overflow: int, timeout: float, in_use: int, waiting: int):
+        self.pool_size: int = pool_size
+        self.max_overflow: int = max_overflow
+        self.timeout: float = timeout
+        self.in_use: int = in_use
+        self.waiting: int = waiting
+        super().__init__(
+            f"连接池已耗尽: 等待{timeout}秒仍无可用连接 "
+            f"(pool_size={pool_size}, max_overflow={max_overflow}, 使用中={in_use}, 等待中={waiting})"
+        )
+
+
+class _Waiter:
+    """排队等待连接的线程"""
+
+    __slots__ = ("event", "adapter", "slot")
+
+    def __init__(self):
+        self.event = threading.Event()
+        # 归还方直接交给等待者的连接
+        self.adapter = None
+        # 连接被丢弃后让出的创建名额
+        self.slot: bool = False
+
+
 class ConnectionPool:
     """数据库连接池基类"""
 
-    def __init__(self, db_type: str, config: dict[str, str | int], pool_size: int = 5, max_idle_time: int = 300):
+    def __init__(
+        self,
+        db_type: str,
+        config: dict[str, str | int],
+        pool_size: int = 5,
+        max_idle_time: int = 300,
+        max_overflow: int = 10,
+        timeout: float = 30.0,
+        overflow_idle_time: float = 10.0,
+        validation: str = "idle",
+        validate_after: float = 30.0,
+        max_lifetime: float = 0,
+        min_idle: int = 0,
+        maintenance_interval: float = 0,
+    ):
         """
         初始化连接池
 
         :param db_type: 数据库类型
         :param config: 数据库配置
-        :param pool_size: 连接池大小
+        :param pool_size: 连接池大小(常驻连接数)
         :param max_idle_time: 连接最大空闲时间(秒)
+        :param max_overflow: 常驻连接用尽时最多额外创建的溢出连接数
+        :param timeout: 连接数达到上限时获取连接的最长等待时间(秒)
+        :param overflow_idle_time: 溢出连接空闲超过该时间(秒)后才被回收, 避免突发负载下反复建立/断开连接
+        :param validation: 借出连接时的验证策略, 见模块说明
+        :param validate_after: validation为"idle"时, 空闲超过该时间(秒)的连接才检测
+        :param max_lifetime: 连接从创建起的最长存活时间(秒), 0表示不限制
+        :param min_idle: 后台维护线程保持的最少空闲连接数
+        :param maintenance_interval: 后台维护线程的运行间隔(秒), 0表示不启动维护线程
         """
+        if validation not in VALIDATION_STRATEGIES:
+            raise ValueError(f"不支持的连接验证策略: {validation}")
+
         self.db_type: str = db_type
         self.config: dict[str, str | int] = config
         self.pool_size: int = pool_size
         self.max_idle_time: int = max_idle_time
-        self.pool: Queue = Queue(maxsize=pool_size)
+        self.max_overflow: int = max_overflow
+        self.timeout: float = timeout
+        self.overflow_idle_time: float = overflow_idle_time
+        self.validation: str = validation
+        self.validate_after: float = validate_after
+        self.max_lifetime: float = max_lifetime
+        self.min_idle: int = min(min_idle, pool_size + max_overflow)
+        self.maintenance_interval: float = maintenance_interval
+        # 空闲连接, 右端为最近归还的连接
+        self.pool: deque = deque()
+        # 已打开(含借出和正在创建)的连接数
         self.connection_count: int = 0
+        self.acquired_count: int = 0
+        self.released_count: int = 0
+        self.created_count: int = 0
+        self.closed_count: int = 0
+        self.validation_failures: int = 0
+        self.timeout_count: int = 0
         self.lock: threading.RLock = threading.RLock()
+        self._started_at: float = time.time()
+        # 最近的连接创建时间, 用于计算创建速率
+        self._recent_creations: deque[float] = deque(maxlen=1024)
+        # 获取连接等待时间直方图
+        self._wait_buckets: list[int] = [0] * (len(ACQUIRE_WAIT_BUCKETS_MS) + 1)
+        self._wait_total_ms: float = 0.0
+        self._wait_max_ms: float = 0.0
+        # 借出中的连接: id(adapter) -> (线程名, 借出时间)
+        self._holders: dict[int, tuple[str, float]] = {}
         self.closed: bool = False
+        self._waiters: deque[_Waiter] = deque()
 
         # 预创建连接
         for _ in range(pool_size):
-            self._create_connection()
+            adapter = self._create_connection()
+            if adapter is None:
+                break
+            self.pool.append(adapter)
 
-    def _create_connection(self):
-        """创建新的数据库连接"""
-        if self.closed:
-            return None
+        self._maintainer: _PoolMaintainer | None = None
+        if maintenance_interval > 0:
+            self._maintainer = _PoolMaintainer(self, maintenance_interval)
+            self._maintainer.start()
+
+    @property
+    def max_size(self) -> int:
+        """连接数上限(常驻连接 + 溢出连接)"""
+        return self.pool_size + self.max_overflow
 
+    def _open_connection(self):
+        """打开新的数据库连接, 不计入连接数"""
         try:
             adapter = DatabaseFactory.create_adapter(self.db_type, self.config)
             adapter.connect()
+            adapter.retry_on_disconnect = self.validation in ("idle", "on_error")
             adapter._created_at = time.time()
-
+            adapter._last_used_at = adapter._created_at
             with self.lock:
-                self.connection_count += 1
-
+                self.created_count += 1
+                self._recent_creations.append(adapter._created_at)
             return adapter
         except Exception as e:
             logging.error(f"创建数据库连接失败: {e}")
             return None
 
+    def _create_connection(self):
+        """创建新的数据库连接"""
+        if self.closed:
+            return None
+
+        adapter = self._open_connection()
+        if adapter is not None:
+            with self.lock:
+                self.connection_count += 1
+        return adapter
+
+    def _disconnect(self, adapter) -> None:
+        """断开连接, 忽略断开时的错误"""
+        with self.lock:
+            self.closed_count += 1
+        try:
+            adapter.disconnect()
+        except Exception:
+            pass
+
+    def _is_expired(self, adapter, now: float) -> bool:
+        """连接是否空闲过久或超过最大存活时间"""
+        if now - adapter._last_used_at > self.max_idle_time:
+            return True
+        return bool(self.max_lifetime) and now - adapter._created_at > self.max_lifetime
+
     def _is_connection_valid(self, adapter):
-        """验证连接是否有效"""
+        """按验证策略检查连接是否有效"""
         # 检查连接是否超时
-        idle_time = time.time() - adapter._created_at
-        if idle_time > self.max_idle_time:
+        now = time.time()
+        if self._is_expired(adapter, now):
             return False
+        idle_time = now - adapter._last_used_at
 
-        # 尝试简单查询验证连接
-        try:
-            if adapter.db_type == "sqlite":
+        if self.validation == "always":
+            # 尝试简单查询验证连接
+            try:
                 adapter.execute("SELECT 1")
-            else:
-                adapter.execute("SELECT 1;")
+                return True
+            except Exception:
+                valid = False
+        elif self.validation == "ping" or (self.validation == "idle" and idle_time > self.validate_after):
+            valid = adapter.ping()
+        else:
             return True
-        except (sqlite3.Error, pymysql.Error, psycopg2.Error, Exception):
-            return False
 
-    def _clean_transaction_state(self, adapter):
-        """清理事务状态, 确保连接在不同线程间传递时的一致性"""
+        if not valid:
+            with self.lock:
+                self.validation_failures += 1
+        return valid
+
+    def _reset_connection(self, adapter) -> bool:
+        """归还前结束未完成的事务, 只有确实处于事务中时才回滚; 回滚失败返回False"""
         try:
-            # 回滚任何未提交的事务
-            adapter.rollback()
-            # 确保自动提交模式(可选, 根据需求设置)
-            if hasattr(adapter.conn, "autocommit"):
-                adapter.conn.autocommit = True
-        except (sqlite3.Error, pymysql.Error, psycopg2.Error, Exception):
-            pass
+            if adapter.in_transaction():
+                adapter.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _release_slot(self) -> None:
+        """释放一个连接名额, 有线程在等待时把名额直接交给最早的等待者"""
+        with self.lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.slot = True
+                waiter.event.set()
+            else:
+                self.connection_count -= 1
+
+    def _acquire(self, timeout: float):
+        """
+        取得一个空闲连接或一个创建名额
+
+        :return: 空闲连接; 返回None表示已为调用方预留了创建名额
+        :raises PoolExhaustedError: 等待超时
+        """
+        with self.lock:
+            # 已有线程在排队时新来的线程也排队, 保证先来先到
+            if not self._waiters:
+                if self.pool:
+                    return self.pool.pop()
+                if self.connection_count < self.max_size:
+                    self.connection_count += 1
+                    return None
+            waiter = _Waiter()
+            self._waiters.append(waiter)
+
+        if not waiter.event.wait(timeout):
+            with self.lock:
+                if not waiter.event.is_set():
+                    self._waiters.remove(waiter)
+                    raise PoolExhaustedError(
+                        self.pool_size,
+                        self.max_overflow,
+                        timeout,
+                        self.acquired_count - self.released_count,
+                        len(self._waiters),
+                    )
+
+        if waiter.adapter is None and not waiter.slot:
+            raise RuntimeError("连接池已关闭")
+        return waiter.adapter
+
+    def get_connection(self, timeout: float | None = None):
+        """
+        从连接池获取连接
 
-    def get_connection(self):
-        """从连接池获取连接"""
+        :param timeout: 最长等待时间(秒), 默认使用连接池的timeout
+        :raises PoolExhaustedError: 连接数已达上限且等待超时
+        """
         if self.closed:
             raise RuntimeError("连接池已关闭")
 
-        # 尝试从队列获取连接
+        start = time.perf_counter()
         try:
-            adapter = self.pool.get_nowait()
-        except Empty:
-            # 队列为空, 创建新连接
-            adapter = self._create_connection()
+            adapter = self._acquire(self.timeout if timeout is None else timeout)
+        except PoolExhaustedError:
+            with self.lock:
+                self.timeout_count += 1
+            raise
 
         # 验证连接是否有效且未超时
-        if adapter and self._is_connection_valid(adapter):
-            # 清理事务状态
-            self._clean_transaction_state(adapter)
-            return adapter
-
-        # 连接无效, 重新创建
-        if adapter:
-            try:
-                adapter.disconnect()
-                with self.lock:
-                    self.connection_count -= 1
-            except (sqlite3.Error, pymysql.Error, psycopg2.Error, Exception):
-                pass
+        if adapter is not None:
+            if self._is_connection_valid(adapter):
+                return self._checkout(adapter, start)
+            # 连接无效, 沿用它的名额重新创建
+            self._disconnect(adapter)
 
-        # 重新创建连接
-        adapter = self._create_connection()
+        adapter = self._open_connection()
         if adapter is None:
+            self._release_slot()
             raise RuntimeError("无法创建数据库连接")
+        return self._checkout(adapter, start)
+
+    def _checkout(self, adapter, start: float):
+        """记录一次借出: 借出计数、等待时间和持有者"""
+        wait_ms = (time.perf_counter() - start) * 1000
+        with self.lock:
+            self.acquired_count += 1
+            self._wait_buckets[bisect_left(ACQUIRE_WAIT_BUCKETS_MS, wait_ms)] += 1
+            self._wait_total_ms += wait_ms
+            if wait_ms > self._wait_max_ms:
+                self._wait_max_ms = wait_ms
+            self._holders[id(adapter)] = (threading.current_thread().name, time.time())
         return adapter
 
+    @property
+    def checked_out(self) -> int:
+        """当前已借出、尚未归还的连接数, 每次获取都配对归还时应为0"""
+        with self.lock:
+            return self.acquired_count - self.released_count
+
     def return_connection(self, adapter):
         """归还连接到连接池"""
-        if self.closed or adapter is None:
+        if adapter is None:
             return
 
-        try:
-            # 更新连接的最后使用时间
-            adapter._created_at = time.time()
-            # 尝试将连接放回队列
-            self.pool.put_nowait(adapter)
-        except Exception:
-            # 如果队列已满或发生其他错误,关闭连接
-            try:
-                adapter.disconnect()
-                with self.lock:
+        with self.lock:
+            self.released_count += 1
+            self._holders.pop(id(adapter), None)
+
+        if self.closed:
+            # 连接池已关闭, 归还的连接直接断开
+            self._disconnect(adapter)
+            return
+
+        # 清理事务状态, 回滚失败或超过最大存活时间的连接直接丢弃
+        now = time.time()
+        too_old = bool(self.max_lifetime) and now - adapter._created_at > self.max_lifetime
+        if too_old or not self._reset_connection(adapter):
+            self._disconnect(adapter)
+            self._release_slot()
+            return
+
+        # 更新连接的最后使用时间
+        adapter._last_used_at = now
+        expired = []
+        with self.lock:
+            if self._waiters:
+                # 直接交给最早排队的线程
+                waiter = self._waiters.popleft()
+                waiter.adapter = adapter
+                waiter.event.set()
+                return
+
+            self.pool.append(adapter)
+
+            # 惰性回收: 只有空闲超过overflow_idle_time的溢出连接才会被关闭
+            while (
+                self.connection_count > self.pool_size
+                and self.pool
+                and now - self.pool[0]._last_used_at > self.overflow_idle_time
+            ):
+                expired.append(self.pool.popleft())
+                self.connection_count -= 1
+
+        for stale in expired:
+            self._disconnect(stale)
+
+    def get_metrics(self, top_holders: int = 5) -> dict[str, Any]:
+        """
+        获取连接池指标
+
+        :param top_holders: 返回借出时间最长的前几个持有者
+        :return: 连接数(使用中/空闲/溢出/等待)、累计计数、获取等待时间直方图、创建速率和最久的借出者
+        """
+        now = time.time()
+        with self.lock:
+            in_use = self.acquired_count - self.released_count
+            acquired = self.acquired_count
+            bounds = [f"<={bound}ms" for bound in ACQUIRE_WAIT_BUCKETS_MS] + [f">{ACQUIRE_WAIT_BUCKETS_MS[-1]}ms"]
+            histogram = dict(zip(bounds, self._wait_buckets))
+            recent = sum(1 for created in self._recent_creations if now - created <= 60)
+            holders = sorted(self._holders.values(), key=lambda holder: holder[1])[:top_holders]
+            return {
+                "pid": os.getpid(),
+                "db_type": self.db_type,
+                "closed": self.closed,
+                "pool_size": self.pool_size,
+                "max_overflow": self.max_overflow,
+                "max_size": self.max_size,
+                "connections": self.connection_count,
+                "in_use": in_use,
+                "idle": len(self.pool),
+                "overflow": max(0, self.connection_count - self.pool_size),
+                "waiting": len(self._waiters),
+                "acquired_total": acquired,
+                "released_total": self.released_count,
+                "created_total": self.created_count,
+                "closed_total": self.closed_count,
+                "validation_failures": self.validation_failures,
+                "timeouts": self.timeout_count,
+                "creations_per_minute": recent,
+                "creation_rate_avg_per_minute": round(self.created_count * 60 / max(now - self._started_at, 1), 3),
+                "acquire_wait_ms": {
+                    "histogram": histogram,
+                    "avg": round(self._wait_total_ms / acquired, 3) if acquired else 0.0,
+                    "max": round(self._wait_max_ms, 3),
+                },
+                "longest_checkouts": [
+                    {"thread": thread_name, "held_seconds": round(now - since, 3)}
+                    for thread_name, since in holders
+                ],
+            }
+
+    def run_maintenance(self) -> None:
+        """关闭空闲过久或超过最大存活时间的空闲连接, 并补足min_idle个空闲连接"""
+        now = time.time()
+        expired = []
+        with self.lock:
+            if self.closed:
+                return
+            for adapter in list(self.pool):
+                if self._is_expired(adapter, now):
+                    self.pool.remove(adapter)
                     self.connection_count -= 1
-            except (sqlite3.Error, pymysql.Error, psycopg2.Error, Exception):
-                pass
+                    expired.append(adapter)
+
+        for adapter in expired:
+            self._disconnect(adapter)
+
+        # 预热空闲连接, 有线程排队时交给等待者
+        while True:
+            with self.lock:
+                if (
+                    self.closed
+                    or self._waiters
+                    or len(self.pool) >= self.min_idle
+                    or self.connection_count >= self.max_size
+                ):
+                    return
+                self.connection_count += 1
+
+            adapter = self._open_connection()
+            if adapter is None:
+                self._release_slot()
+                return
+
+            with self.lock:
+                if self.closed:
+                    self.connection_count -= 1
+                elif self._waiters:
+                    waiter = self._waiters.popleft()
+                    waiter.adapter = adapter
+                    waiter.event.set()
+                    continue
+                else:
+                    # 新连接放在最旧的一端, 保持右端为最近使用的热连接
+                    self.pool.appendleft(adapter)
+                    continue
+            self._disconnect(adapter)
+            return
 
     def close(self):
         """关闭连接池"""
@@ -158,23 +470,50 @@ class ConnectionPool:
             if self.closed:
                 return
             self.closed = True
+            idle = list(self.pool)
+            self.pool.clear()
+            waiters = list(self._waiters)
+            self._waiters.clear()
+
+        # 唤醒所有等待者, 它们会收到连接池已关闭的错误
+        for waiter in waiters:
+            waiter.event.set()
 
         # 关闭所有连接
-        while True:
-            try:
-                adapter = self.pool.get_nowait()
-                try:
-                    adapter.disconnect()
-                except (sqlite3.Error, pymysql.Error, psycopg2.Error, Exception):
-                    pass
-            except Empty:
-                break
+        for adapter in idle:
+            self._disconnect(adapter)
 
         with self.lock:
             self.connection_count = 0
 
+        if self._maintainer is not None:
+            self._maintainer.stop()
+
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
+
+
+class _PoolMaintainer(threading.Thread):
+    """连接池后台维护线程"""
+
+    def __init__(self, pool: ConnectionPool, interval: float):
+        super().__init__(name=f"db-pool-maintainer-{pool.db_type}", daemon=True)
+        self.pool: ConnectionPool = pool
+        self.interval: float = interval
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.pool.run_maintenance()
+            except Exception as e:
+                logging.error(f"连接池维护失败: {e}")
+
+    def stop(self) -> None:
+        """停止维护线程"""
+        self._stopped.set()
+        if self is not threading.current_thread() and self.is_alive():
+            self.join(timeout=self.interval + 1)
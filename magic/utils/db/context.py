@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库上下文模块
+
+启动时从配置文件解析一次默认数据库(类型、表前缀、连接参数), 注册连接池并预先计算表名,
+之后的每次查询直接使用已解析的上下文, 不再读取配置。
+"""
+import os
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+from magic.utils.TomlConfig import DoesitexistConfigToml, ReadConfigToml
+from magic.utils.db.orm import db_orm
+from magic.utils.db.connection_pool import ConnectionPool
+
+
+# 系统使用的数据表(不含前缀)
+TABLES = ("users", "options", "usermeta")
+
+
+class DatabaseContext:
+    """已解析的数据库上下文"""
+
+    __slots__ = ("name", "db_type", "prefix", "pool", "tables")
+
+    def __init__(self, name: str, db_type: str, prefix: str, pool: ConnectionPool):
+        """
+        初始化数据库上下文
+
+        Args:
+            name: 连接池在ORM中注册的名称
+            db_type: 数据库类型 (sqlite/mysql/postgresql)
+            prefix: 表前缀
+            pool: 连接池
+        """
+        self.name: str = name
+        self.db_type: str = db_type
+        self.prefix: str = prefix
+        self.pool: ConnectionPool = pool
+        self.tables: Dict[str, str] = {table: f"{prefix}{table}" for table in TABLES}
+
+    def table(self, tablename: str) -> str:
+        """获取带前缀的表名"""
+        table_name = self.tables.get(tablename)
+        if table_name is None:
+            table_name = f"{self.prefix}{tablename}"
+        return table_name
+
+    def get_db(self):
+        """从连接池获取数据库连接"""
+        return self.pool.get_connection()
+
+    def return_db(self, adapter) -> None:
+        """归还数据库连接到连接池"""
+        self.pool.return_connection(adapter)
+
+
+_context: Optional[DatabaseContext] = None
+_context_lock = threading.Lock()
+
+
+def _read_db_config() -> tuple[str, str, Dict[str, Any]]:
+    """从配置文件读取默认数据库的类型、表前缀和连接参数
+
+    Raises:
+        ValueError: 配置缺失或数据库类型不支持时
+    """
+    try:
+        db_type = DoesitexistConfigToml("db", "sql_rd")
+        db_prefix = DoesitexistConfigToml("db", "sql_prefix")
+    except KeyError:
+        raise ValueError("数据库配置缺失")
+
+    if not db_type or not db_prefix:
+        raise ValueError("数据库配置缺失")
+
+    if db_type == "sqlite":
+        sql_sqlite_path = DoesitexistConfigToml("db", "sql_sqlite_path")
+        if not sql_sqlite_path:
+            raise ValueError("SQLite路径配置缺失")
+        return db_type, db_prefix, {
+            "path": sql_sqlite_path,
+            "prefix": db_prefix,
+            "type": "sqlite",
+            # [db.sqlite] 中的PRAGMA设置, 见 adapters.SQLITE_PRAGMA_DEFAULTS
+            "pragmas": dict(ReadConfigToml("db", "sqlite", {}) or {}),
+        }
+
+    if db_type in ("mysql", "postgresql"):
+        # 从配置中获取MySQL/PostgreSQL连接信息
+        return db_type, db_prefix, {
+            "host": DoesitexistConfigToml("db", "sql_host"),
+            "port": DoesitexistConfigToml("db", "sql_port"),
+            "user": DoesitexistConfigToml("db", "sql_user"),
+            "password": DoesitexistConfigToml("db", "sql_password"),
+            "database": DoesitexistConfigToml("db", "sql_database"),
+            "prefix": db_prefix,
+            "type": db_type,
+        }
+
+    raise ValueError(f"不支持的数据库类型: {db_type}")
+
+
+# 副本配置中可覆盖的连接参数: 配置项 -> 连接配置键
+REPLICA_CONFIG_KEYS = {
+    "sql_sqlite_path": "path",
+    "sql_host": "host",
+    "sql_port": "port",
+    "sql_user": "user",
+    "sql_password": "password",
+    "sql_database": "database",
+}
+
+
+def _read_replica_configs(config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """从配置文件读取只读副本的连接参数, 未配置的参数沿用主库
+
+    配置示例:
+        [db]
+        replica_strategy = "least_in_use"
+
+        [[db.replicas]]
+        sql_host = "10.0.0.2"
+
+        [[db.replicas]]
+        sql_host = "10.0.0.3"
+    """
+    replicas = ReadConfigToml("db", "replicas", []) or []
+    if not isinstance(replicas, list):
+        raise ValueError("副本配置 [[db.replicas]] 格式错误")
+    configs: List[Dict[str, Any]] = []
+    for replica in replicas:
+        replica_config = dict(config)
+        for key, value in dict(replica).items():
+            if key not in REPLICA_CONFIG_KEYS:
+                logging.warning(f"忽略未知的副本配置项: {key}")
+                continue
+            replica_config[REPLICA_CONFIG_KEYS[key]] = value
+        configs.append(replica_config)
+    return configs
+
+
+def _read_pool_options() -> Dict[str, Any]:
+    """从配置文件读取连接池参数, 未配置的使用ConnectionPool的默认值"""
+    options: Dict[str, Any] = {}
+    for key, option in (
+        ("pool_size", "pool_size"),
+        ("pool_max_overflow", "max_overflow"),
+        ("pool_timeout", "timeout"),
+        ("pool_max_idle_time", "max_idle_time"),
+        ("pool_overflow_idle_time", "overflow_idle_time"),
+        ("pool_validation", "validation"),
+        ("pool_validate_after", "validate_after"),
+        ("pool_max_lifetime", "max_lifetime"),
+        ("pool_min_idle", "min_idle"),
+        ("pool_maintenance_interval", "maintenance_interval"),
+    ):
+        value = ReadConfigToml("db", key)
+        if value is not None:
+            options[option] = value
+    return options
+
+
+def _build_context(name: str) -> DatabaseContext:
+    """读取配置、注册连接池并创建上下文, 调用方需持有_context_lock"""
+    global _context
+    db_type, db_prefix, config = _read_db_config()
+    replica_configs = _read_replica_configs(config)
+    pool_options = _read_pool_options()
+    db_orm.register_db(
+        name,
+        db_type,
+        config,
+        replica_strategy=ReadConfigToml("db", "replica_strategy", "round_robin"),
+        **pool_options,
+    )
+    for replica_config in replica_configs:
+        db_orm.register_replica(name, replica_config, **pool_options)
+    _context = DatabaseContext(name, db_type, db_prefix, db_orm._pools[name])
+    return _context
+
+
+def ReloadDatabaseContext(name: str = "default") -> DatabaseContext:
+    """根据当前配置重新解析数据库上下文并注册连接池
+
+    启动时和数据库配置变更后调用。
+
+    Raises:
+        ValueError: 配置缺失或数据库类型不支持时
+    """
+    with _context_lock:
+        return _build_context(name)
+
+
+def GetDatabaseContext() -> DatabaseContext:
+    """获取已解析的数据库上下文, 尚未解析时根据配置解析一次
+
+    Raises:
+        ValueError: 配置缺失或数据库类型不支持时
+    """
+    global _context
+    context = _context
+    if context is not None and db_orm._pools.get(context.name) is context.pool:
+        return context
+
+    with _context_lock:
+        pool = db_orm._pools.get("default")
+        if pool is None:
+            return _build_context("default")
+        if _context is None or _context.pool is not pool:
+            # 连接池已在别处注册或被重新注册(如安装流程), 直接沿用该连接池
+            _context = DatabaseContext("default", pool.db_type, str(pool.config.get("prefix", "")), pool)
+        return _context
+
+
+def InitDatabaseContext() -> Optional[DatabaseContext]:
+    """启动时初始化数据库上下文, 数据库尚未配置(安装前)时跳过"""
+    try:
+        return ReloadDatabaseContext()
+    except ValueError as e:
+        logging.info(f"数据库尚未配置, 跳过数据库上下文初始化: {e}")
+        return None
+
+
+def _reset_after_fork() -> None:
+    """子进程中丢弃从父进程继承的上下文和连接, 各工作进程使用自己的连接池"""
+    global _context, _context_lock
+    _context = None
+    _context_lock = threading.Lock()
+    db_orm._pools.clear()
+    db_orm._replicas.clear()
+    db_orm._default_db = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -7,78 +7,28 @@
 """
 import logging
 import time
+import weakref
 from typing import List, Tuple, Dict, Any, Optional, Union
-from magic.utils.TomlConfig import DoesitexistConfigToml, WriteConfigToml
+from magic.utils.TomlConfig import ReadConfigToml, UpdateConfigToml
 from magic.utils.db.orm import db_orm
+from magic.utils.db.connection_pool import ConnectionPool
+from magic.utils.db.adapters import Record, escape_like
+from magic.utils.db.context import GetDatabaseContext
+from magic.utils.db.identity_cache import GetUserLoader
+from magic.utils.db.options_cache import GetSiteOptions, InvalidateSiteOptionsCache, NewSiteOptionsVersion
+from magic.utils.db.query import Query
 
 
 def GetDbConnection(tablename=None):
-    """从连接池获取数据库连接"""
-    try:
-        db_type = DoesitexistConfigToml("db", "sql_rd")
-        db_prefix = DoesitexistConfigToml("db", "sql_prefix")
-
-        if not db_type or not db_prefix:
-            return [False, "数据库配置缺失", None, None, None]
-
-        # 确保default数据库已注册到连接池
-        if "default" not in db_orm._pools:
-            if db_type == "sqlite":
-                sql_sqlite_path = DoesitexistConfigToml("db", "sql_sqlite_path")
-                if not sql_sqlite_path:
-                    return [False, "SQLite路径配置缺失", None, None, None]
-                db_orm.register_db(
-                    "default",
-                    "sqlite",
-                    {"path": sql_sqlite_path, "prefix": db_prefix, "type": "sqlite"},
-                )
-
-            elif db_type == "mysql":
-                # 从配置中获取MySQL连接信息
-                db_host = DoesitexistConfigToml("db", "sql_host")
-                db_port = DoesitexistConfigToml("db", "sql_port")
-                db_name = DoesitexistConfigToml("db", "sql_database")
-                db_user = DoesitexistConfigToml("db", "sql_user")
-                db_password = DoesitexistConfigToml("db", "sql_password")
-                db_orm.register_db(
-                    "default",
-                    "mysql",
-                    {
-                        "host": db_host,
-                        "port": db_port,
-                        "user": db_user,
-                        "password": db_password,
-                        "database": db_name,
-                        "prefix": db_prefix,
-                        "type": "mysql",
-                    },
-                )
-
-            elif db_type == "postgresql":
-                # 从配置中获取PostgreSQL连接信息
-                db_host = DoesitexistConfigToml("db", "sql_host")
-                db_port = DoesitexistConfigToml("db", "sql_port")
-                db_name = DoesitexistConfigToml("db", "sql_database")
-                db_user = DoesitexistConfigToml("db", "sql_user")
-                db_password = DoesitexistConfigToml("db", "sql_password")
-                db_orm.register_db(
-                    "default",
-                    "postgresql",
-                    {
-                        "host": db_host,
-                        "port": db_port,
-                        "user": db_user,
-                        "password": db_password,
-                        "database": db_name,
-                        "prefix": db_prefix,
-                        "type": "postgresql",
-                    },
-                )
-            else:
-                return [False, f"不支持的数据库类型: {db_type}", None, None, None]
+    """从连接池获取数据库连接
 
-        db = db_orm.get_db("default")
-        table_name = f"{db_prefix}{tablename}" if tablename else None
+    调用方需要在使用完毕后通过 db_orm.return_db 归还连接,
+    新代码请使用 db_orm.connection() 作用域。
+    """
+    try:
+        context = GetDatabaseContext()
+        db = context.get_db()
+        table_name = context.table(tablename) if tablename else None
         return [True, "数据库连接成功", db, db.cursor, table_name]
     except Exception as e:
         return [False, str(e), None, None, None]
@@ -86,7 +36,7 @@ def GetDbConnection(tablename=None):
 
 def CheckSuperadminExists(admin_username, admin_email, admin_password, db_prefix=None, db_config=None):
     """检查超级管理员是否存在
-    
+
     Args:
         admin_username: 管理员用户名
         admin_email: 管理员邮箱
@@ -94,80 +44,57 @@ def CheckSuperadminExists(admin_username, admin_email, admin_password, db_prefix
         db_prefix: 数据库表前缀（可选，默认为配置中的前缀）
         db_config: 数据库配置字典（可选，用于安装过程中的临时配置）
     """
-    db = None
     try:
         # 如果提供了数据库配置，优先使用它（安装过程）
         if db_config:
             if "default" not in db_orm._pools:
                 db_type = db_config.get("type", "sqlite")
                 db_orm.register_db("default", db_type, db_config)
+            table_name = f"{db_prefix}users"
         else:
-            # 使用统一的数据库连接获取方式（正常运行过程）
-            success, message, db, cursor, table_name = GetDbConnection("users")
-            if not success:
-                return [False, message]
-            
-            # 从配置中获取数据库前缀
-            db_prefix = DoesitexistConfigToml("db", "sql_prefix")
-            if not db_prefix:
-                return [False, "数据库前缀配置缺失"]
-
-        db = db_orm.get_db("default")
-        table_name = f"{db_prefix}users"
-        db.execute(
-            f"SELECT COUNT(*) FROM {table_name} WHERE `group` = ?",
-            ("superadministrator",),
-        )
-        count = db.fetchone()[0]
-
-        if count > 0:
-            return [False, "超级管理员账号已存在"]
-
-        current_time = int(time.time())
-        db.execute(
-            f"INSERT INTO {table_name} (name, password, mail, createdAt, isActive, `group`) VALUES (?, ?, ?, ?, ?, ?)",
-            (
-                admin_username,
-                admin_password,
-                admin_email,
-                current_time,
-                1,
-                "superadministrator",
-            ),
-        )
-        db.commit()
+            # 使用统一的数据库上下文（正常运行过程）
+            table_name = GetDatabaseContext().table("users")
+
+        with db_orm.connection("default") as db:
+            if Query(table_name).where(group="superadministrator").exists(db):
+                return [False, "超级管理员账号已存在"]
+
+            current_time = int(time.time())
+            db.execute(
+                f"INSERT INTO {table_name} (name, password, mail, createdAt, isActive, `group`) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    admin_username,
+                    admin_password,
+                    admin_email,
+                    current_time,
+                    1,
+                    "superadministrator",
+                ),
+            )
+            db.commit()
 
         return [True, "超级管理员账号创建成功"]
     except Exception as e:
         return [False, str(e)]
-    finally:
-        if db:
-            db_orm.return_db(db, "default")
 
 
 def CreateSiteOption(db_prefix: str, sql_sqlite_path: str, option_name: str, option_value: str, user_id: int = 0) -> List[Union[bool, str]]:
     """创建网站选项"""
-    db = None
     try:
-        success, message, db, cursor, table_name = GetDbConnection("options")
-        if not success:
-            return [False, message]
         table_name = f"{db_prefix}options"
-        db = db_orm.get_db("default")
-
-        db.execute(
-            f"INSERT INTO {table_name} (name, user, value) VALUES (?, ?, ?)",
-            (option_name, user_id, option_value),
-        )
-        db.commit()
+        with db_orm.connection(GetDatabaseContext().name) as db:
+            db.execute(
+                f"INSERT INTO {table_name} (name, `user`, value) VALUES (?, ?, ?)",
+                (option_name, user_id, option_value),
+            )
+            db.upsert(table_name, ("name", "user", "value"), ("name", "user"), [NewSiteOptionsVersion()])
+            db.commit()
+        InvalidateSiteOptionsCache()
 
         return [True, "网站选项创建成功"]
     except Exception as e:
         logging.error(f"创建网站选项失败: {e}")
         return [False, str(e)]
-    finally:
-        if db:
-            db_orm.return_db(db, "default")
 
 
 def InitVerificationDbConn(db_type: str, **kwargs) -> List[Union[bool, Union[int, str]]]:
@@ -178,9 +105,13 @@ def InitVerificationDbConn(db_type: str, **kwargs) -> List[Union[bool, Union[int
             db_prefix = kwargs.get("db_prefix", "")
 
             # 保存配置
-            WriteConfigToml("db", "sql_rd", "sqlite")
-            WriteConfigToml("db", "sql_prefix", db_prefix)
-            WriteConfigToml("db", "sql_sqlite_path", db_path)
+            UpdateConfigToml({
+                "db": {
+                    "sql_rd": "sqlite",
+                    "sql_prefix": db_prefix,
+                    "sql_sqlite_path": db_path,
+                }
+            })
 
             db_orm.register_db(
                 "default",
@@ -188,11 +119,10 @@ def InitVerificationDbConn(db_type: str, **kwargs) -> List[Union[bool, Union[int
                 {"path": db_path, "prefix": db_prefix, "type": "sqlite"},
             )
             # 测试连接
-            db = db_orm.get_db()
-            db.connect()
-            db.disconnect()
+            with db_orm.connection() as db:
+                db.execute("SELECT 1")
             return [True, 0]
-        
+
         elif db_type == "mysql":
             db_prefix = kwargs.get("db_prefix", "")
             db_host = kwargs.get("sql_host", "localhost")
@@ -213,11 +143,10 @@ def InitVerificationDbConn(db_type: str, **kwargs) -> List[Union[bool, Union[int
                 },
             )
             # 测试连接
-            db = db_orm.get_db()
-            db.connect()
-            db.disconnect()
+            with db_orm.connection() as db:
+                db.execute("SELECT 1")
             return [True, 0]
-        
+
         elif db_type == "postgresql":
             db_prefix = kwargs.get("db_prefix", "")
             db_host = kwargs.get("sql_host", "localhost")
@@ -238,82 +167,90 @@ def InitVerificationDbConn(db_type: str, **kwargs) -> List[Union[bool, Union[int
                 },
             )
             # 测试连接
-            db = db_orm.get_db()
-            db.connect()
-            db.disconnect()
+            with db_orm.connection() as db:
+                db.execute("SELECT 1")
 
             return [True, 0]
         else:
             return [False, f"不支持的数据库类型: {db_type}"]
     except Exception as e:
         return [False, str(e)]
-    
+
 
 def GetOrSetSiteOption(db_prefix: str,sql_sqlite_path: str,option_name: str,option_value: Optional[str] = None,user_id: int = 0) -> List[Union[bool, str]]:
     """获取或设置网站选项"""
-    db = None
     try:
-        success, message, db, cursor, table_name = GetDbConnection("options")
-        if not success:
-            return [False, message]
         table_name = f"{db_prefix}options"
-        db = db_orm.get_db("default")
-
+        context = GetDatabaseContext()
         # 如果提供了option_value,则设置或更新选项
         if option_value is not None:
-            # 检查选项是否已存在
-            db.execute(
-                f"SELECT COUNT(*) FROM {table_name} WHERE name = ? AND user = ?",
-                (option_name, user_id),
-            )
-            count = db.fetchone()[0]
-
-            if count > 0:
-                db.execute(
-                    f"UPDATE {table_name} SET value = ? WHERE name = ? AND user = ?",
-                    (option_value, option_name, user_id),
-                )
-            else:
-                db.execute(
-                    f"INSERT INTO {table_name} (name, user, value) VALUES (?, ?, ?)",
-                    (option_name, user_id, option_value),
+            with db_orm.connection(context.name) as db:
+                # 依赖 (name, user) 唯一索引, 选项和版本行在一条语句中插入或更新
+                db.upsert(
+                    table_name,
+                    ("name", "user", "value"),
+                    ("name", "user"),
+                    [(option_name, user_id, option_value), NewSiteOptionsVersion()],
                 )
-
-            db.commit()
+                db.commit()
+            InvalidateSiteOptionsCache()
             return [True, "网站选项设置成功"]
-        else:
-            db.execute(
-                f"SELECT value FROM {table_name} WHERE name = ? AND user = ?",
-                (option_name, user_id),
-            )
-            result = db.fetchone()
 
-            if result:
-                return [True, result[0]]
+        # 全站选项从缓存读取
+        if user_id == 0 and table_name == context.table("options"):
+            options = GetSiteOptions()
+            if option_name in options:
+                return [True, options[option_name]]
             return [False, "选项不存在"]
+
+        with db_orm.connection(context.name) as db:
+            result = Query(table_name, "name").select("value").where(name=option_name, user=user_id).first(db)
+
+        if result:
+            return [True, result[0]]
+        return [False, "选项不存在"]
     except Exception as e:
         return [False, str(e)]
-    finally:
-        if db:
-            db_orm.return_db(db, "default")
 
 
-def GetSiteOptionByName(option_name: str):
-    """查询网站设置"""
-    success, message, db, cursor, _ = GetDbConnection("users")
-    if not success:
-        return [False, message]
+def SetSiteOptions(options: Dict[str, Any], user_id: int = 0) -> List[Union[bool, str]]:
+    """批量设置网站选项, 所有选项和选项版本行在一条语句中插入或更新
 
+    Args:
+        options: {选项名: 选项值}
+        user_id: 选项所属用户, 0 为全站选项
+    """
+    if not options:
+        return [True, "网站选项设置成功"]
     try:
-        db_prefix = DoesitexistConfigToml("db", "sql_prefix")
-        if not db_prefix:
-            return [False, "数据库前缀配置缺失"]
-        table_name = f"{db_prefix}options"
-        db = db_orm.get_db("default")
-        db.execute(
-            f"SELECT name, user, value FROM {table_name} WHERE name = ?", (option_name,)
-        )
-        result = db.fetchone()
+        context = GetDatabaseContext()
+        with db_orm.connection(context.name) as db:
+            db.upsert(
+                context.table("options"),
+                ("name", "user", "value"),
+                ("name", "user"),
+                [(name, user_id, value) for name, value in options.items()] + [NewSiteOptionsVersion()],
+            )
+            db.commit()
+        InvalidateSiteOptionsCache()
+        return [True, "网站选项设置成功"]
+    except Exception as e:
+        logging.error(f"设置网站选项失败: {e}")
+        return [False, str(e)]
+
+
+def GetSiteOptionByName(option_name: str):
+    """查询网站设置, 全站选项从缓存读取"""
+    try:
+        options = GetSiteOptions()
+        if option_name in options:
+            return [True, {"name": option_name, "user": 0, "value": options[option_name]}]
+
+        # 缓存中只有全站选项, 未命中时确认是否为其他用户的选项
+        context = GetDatabaseContext()
+        table_name = context.table("options")
+        with db_orm.connection(context.name, readonly=True) as db:
+            result = Query(table_name, "name").select("name", "user", "value").where(name=option_name).first(db)
 
         if result:
             name, user, value = result
@@ -331,163 +268,160 @@ def GetSiteOptionByName(option_name: str):
     except Exception as e:
         logging.error(f"查询网站设置失败: {e}")
         return [False, str(e)]
-    finally:
-        if db:
-            db_orm.return_db(db, "default")
 
 
-def GetUserByEmail(username_email: str):
-    """根据用户名或邮箱获取用户信息"""
-    db = None
+def GetUserByEmail(username_email: str) -> Optional[Record]:
+    """根据邮箱获取登录所需的用户信息, 通过邮箱唯一索引查询
+
+    Returns:
+        记录(uid, name, password, email, group), 可以按属性或列名访问; 用户不存在或查询失败时返回None
+    """
     try:
-        success, message, db, cursor, table_name = GetDbConnection("users")
-        if not success:
-            logging.error(f"数据库连接失败: {message}")
-            return None
-        db = db_orm.get_db("default")
-        db.execute(
-            f"SELECT uid, name, password, mail, `group` FROM {table_name} WHERE mail = ?",
-            (username_email,),
-        )
-        user = db.fetchone()
-
-        if user:
-            return {
-                "uid": user[0],
-                "name": user[1],
-                "password": user[2],
-                "email": user[3],
-                "group": user[4],
-            }
-        return None
+        context = GetDatabaseContext()
+        table_name = context.table("users")
+        with db_orm.connection(context.name, readonly=True) as db:
+            query = Query(table_name).select("uid", "name", "password", email="mail").select("group")
+            return query.where(mail=username_email).first(db)
     except Exception as e:
         logging.error(f"查询用户信息失败: {e}")
         return None
-    finally:
-        if db:
-            db_orm.return_db(db, "default")
 
 
-def GetUserRoleByIdentity(user_identity: int) -> Union[List[Union[bool, str]], Optional[Tuple[str, ...]]]:
-    """通过用户的uid查找用户的身份权限"""
-    success, message, db, cursor, table_name = GetDbConnection("users")
-    if not success:
-        return [False, message]
-    db = db_orm.get_db("default")
+def CheckUserEmailExists(email: str) -> bool:
+    """检查邮箱是否已被注册, 只访问邮箱索引, 不读取用户记录
 
-    try:
-        db.execute(f"SELECT `group` FROM {table_name} WHERE uid = ?", (user_identity,))
-        user_group = db.fetchone()
+    注册前的检查需要看到最新的数据, 始终查询主库。
 
-        # 统一处理不同驱动返回类型（dict, 序列/元组, sqlite3.Row, None）
-        if not user_group:
-            return None
+    Raises:
+        Exception: 数据库查询失败时
+    """
+    context = GetDatabaseContext()
+    table_name = context.table("users")
+    with db_orm.connection(context.name) as db:
+        return Query(table_name).where(mail=email).exists(db)
 
-        # dict 情况(如 pymysql DictCursor)
-        if isinstance(user_group, dict):
-            group_val = user_group.get("group") or user_group.get("group")
-            return (str(group_val),) if group_val is not None else None
 
-        # 序列或可索引对象(如 psycopg2/SQLite 返回的 tuple 或 Row)
-        try:
-            first = user_group[0]
-            return (str(first),)
-        except Exception:
-            # 回退：尝试通过属性或映射访问
-            if hasattr(user_group, "get"):
-                group_val = user_group.get("group")
-                return (str(group_val),) if group_val is not None else None
+def GetUserRoleByIdentity(user_identity: int) -> Union[List[Union[bool, str]], Optional[Tuple[str, ...]]]:
+    """通过用户的uid查找用户的身份权限, 结果来自请求内的用户加载器和身份缓存"""
+    try:
+        identity = GetUserLoader().load(user_identity)
+        if identity is None:
             return None
+        return (str(identity.group),)
     except Exception as e:
         logging.error(f"查询用户角色失败: {e}")
         return [False, str(e)]
-    finally:
-        if db:
-            db_orm.return_db(db, "default")
 
 
 def GetUserNameByIdentity(user_identity: int):
-    """通过用户的uid查找用户名"""
-    success, message, db, cursor, table_name = GetDbConnection("users")
-    if not success:
-        return [False, message]
-    db = db_orm.get_db("default")
-
+    """通过用户的uid查找用户名, 结果来自请求内的用户加载器和身份缓存"""
     try:
-        db.execute(f"SELECT name FROM {table_name} WHERE uid = ?", (user_identity,))
-        user_name = db.fetchone()
-        return user_name  # 期望返回,如: ('admin',)
+        identity = GetUserLoader().load(user_identity)
+        if identity is None:
+            return None
+        return (identity.name,)  # 期望返回,如: ('admin',)
     except Exception as e:
         logging.error(f"查询用户名失败: {e}")
         return [False, str(e)]
-    finally:
-        if db:
-            db_orm.return_db(db, "default")
 
 
 def GetUserCount():
     """获取用户数量"""
-    success, message, db, cursor, table_name = GetDbConnection("users")
-    if not success:
-        return [False, message]
-    db = db_orm.get_db("default")
-
     try:
-        db.execute(f"SELECT COUNT(*) FROM {table_name}")
-        user_count = db.fetchone()[0]
+        context = GetDatabaseContext()
+        table_name = context.table("users")
+        with db_orm.connection(context.name, readonly=True) as db:
+            user_count = Query(table_name).count(db)
         return user_count
     except Exception as e:
         logging.error(f"查询用户数量失败: {e}")
         return [False, str(e)]
-    finally:
-        if db:
-            db_orm.return_db(db, "default")
 
 
-def SearchUsers(keyword: str) -> Union[List[Union[bool, str]], List[Dict[str, Any]]]:
+# 用户搜索模式
+#   prefix: 用户名/邮箱前缀匹配, 使用 users 表的 name、mail 索引
+#   contains: 任意位置匹配, 需要全表扫描
+#   fulltext: 任意位置匹配, 使用 SQLite FTS5 trigram / PostgreSQL pg_trgm 索引, 不支持时退回 prefix
+SEARCH_MODES = ("prefix", "contains", "fulltext")
+# 每页最多返回的用户数
+SEARCH_MAX_LIMIT = 200
+
+# 连接池 -> 全文搜索结构是否可用, 全文搜索结构由结构迁移建立, 这里只记录检查结果;
+# 重新注册数据库(如重新安装)后为新的连接池, 会重新检查
+_fulltext_available: "weakref.WeakKeyDictionary[ConnectionPool, bool]" = weakref.WeakKeyDictionary()
+
+
+def SearchUsers(keyword: str, after_uid: int = 0, limit: int = 50, mode: Optional[str] = None) -> Union[List[Union[bool, str]], List[Dict[str, Any]]]:
     """
     根据关键词搜索用户
-    支持搜索用户ID、姓名或邮箱
-    
+    支持搜索用户ID、姓名或邮箱, 姓名和邮箱不区分大小写, 结果按uid升序, 通过 after_uid 翻页
+
     :param keyword: 搜索关键词
+    :param after_uid: 上一页最后一个用户的uid, 只返回uid大于该值的用户
+    :param limit: 每页条数, 最大为 SEARCH_MAX_LIMIT
+    :param mode: 搜索模式(见 SEARCH_MODES), 默认使用配置 [db] search_mode, 未配置时为 prefix
     :return: 用户列表或错误信息
     """
-    success, message, db, cursor, table_name = GetDbConnection("users")
-    if not success:
-        return [False, message]
-    db = db_orm.get_db("default")
-
     try:
+        context = GetDatabaseContext()
+        table_name = context.table("users")
+        limit = max(1, min(int(limit), SEARCH_MAX_LIMIT))
+        after_uid = int(after_uid or 0)
+        if mode is None:
+            mode = ReadConfigToml("db", "search_mode", "prefix")
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"不支持的搜索模式: {mode}")
+
         # 尝试将关键词转换为整数
         user_id = None
         try:
             user_id = int(keyword)
         except ValueError:
             pass
-        
-        if user_id is not None:
-            # 根据用户ID精确搜索
-            db.execute(f"SELECT uid, name, mail FROM {table_name} WHERE uid = ?", (user_id,))
-        else:
-            # 根据姓名或邮箱模糊搜索
-            search_pattern = f"%{keyword}%"
-            db.execute(f"SELECT uid, name, mail FROM {table_name} WHERE name LIKE ? OR mail LIKE ? LIMIT 50", 
-                      (search_pattern, search_pattern))
-        
-        users = db.fetchall()
-        # 转换为字典列表
-        user_list = []
-        for user in users:
-            user_list.append({
-                'id': user[0],
-                'name': user[1],
-                'email': user[2]
-            })
-        return user_list
+
+        with db_orm.connection(context.name, readonly=True) as db:
+            if user_id is not None:
+                # 根据用户ID精确搜索
+                users = Query(table_name).select("uid", "name", "mail").where(uid=user_id, uid__gt=after_uid).all(db)
+            else:
+                searched = False
+                if mode == "fulltext":
+                    available = _fulltext_available.get(context.pool)
+                    if available is None:
+                        available = _fulltext_available[context.pool] = db.user_fulltext_available(table_name)
+                    if available:
+                        searched = db.execute_user_fulltext_search(table_name, keyword, after_uid, limit)
+
+                if searched:
+                    pass
+                elif mode == "contains":
+                    # 根据姓名或邮箱模糊搜索
+                    search_pattern = f"%{escape_like(keyword)}%"
+                    db.execute_statement(
+                        ("SearchUsers.contains", table_name),
+                        lambda: (
+                            f"SELECT uid, name, mail FROM {table_name} "
+                            f"WHERE ({db.ilike_condition('name')} OR {db.ilike_condition('mail')}) AND uid > ? ORDER BY uid LIMIT ?"
+                        ),
+                        (search_pattern, search_pattern, after_uid, limit),
+                    )
+                else:
+                    # 根据姓名或邮箱前缀搜索, 两个条件分别走各自的索引后合并
+                    search_pattern = f"{escape_like(keyword)}%"
+                    db.execute_statement(
+                        ("SearchUsers.prefix", table_name),
+                        lambda: (
+                            f"SELECT uid, name, mail FROM {table_name} WHERE uid IN ("
+                            f"SELECT uid FROM {table_name} WHERE {db.ilike_condition('name')} AND uid > ? "
+                            f"UNION SELECT uid FROM {table_name} WHERE {db.ilike_condition('mail')} AND uid > ?"
+                            f") ORDER BY uid LIMIT ?"
+                        ),
+                        (search_pattern, after_uid, search_pattern, after_uid, limit),
+                    )
+
+                users = db.fetchall()
+        # 转换为字典列表, 用于JSON响应
+        return [{'id': uid, 'name': name, 'email': mail} for uid, name, mail in users]
     except Exception as e:
         logging.error(f"搜索用户失败: {e}")
         return [False, str(e)]
-    finally:
-        if db:
-            db_orm.return_db(db, "default")
-
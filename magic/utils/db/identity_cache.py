@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用户身份缓存模块
+
+按uid缓存用户的身份信息(用户名、邮箱、身份权限), 一次查询取出全部字段,
+后台每个请求的权限检查和用户名显示共用同一条缓存记录。
+缓存有容量上限(LRU)和较短的有效期(TTL), 用户被修改或删除时主动失效;
+其他工作进程中的旧记录最多保留 IDENTITY_CACHE_TTL 秒。
+
+一次需要多个用户时(插件按uid逐个查询、后台列表), 使用请求内的批量加载器:
+    loader = GetUserLoader()
+    loader.prime(uids)                # 登记本次请求稍后要用的uid
+    identity = loader.load(uid)       # 第一次load时所有已登记的uid在一条 uid IN (...) 查询中取出
+加载结果在本次请求内保留, 同一uid/邮箱在请求内只查询一次。
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from flask import g, has_app_context
+from magic.utils.db.orm import db_orm
+from magic.utils.db.context import GetDatabaseContext
+from magic.utils.db.query import Query
+
+
+# 缓存的用户数上限
+IDENTITY_CACHE_SIZE = 1024
+# 缓存记录的有效期(秒)
+IDENTITY_CACHE_TTL = 10.0
+# 批量查询时每条 IN 列表的最大长度, 低于SQLite的参数个数上限
+IDENTITY_BATCH_SIZE = 512
+
+
+class UserIdentity(NamedTuple):
+    """用户身份信息"""
+
+    uid: int
+    name: Optional[str]
+    mail: Optional[str]
+    group: Optional[str]
+
+
+_identities: "OrderedDict[Any, Tuple[UserIdentity, float]]" = OrderedDict()
+_identity_lock = threading.Lock()
+_identity_stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0, "batch_queries": 0}
+
+
+def _cache_key(user_identity: Any) -> Any:
+    """JWT中的uid可能是字符串, 统一转换为整数作为缓存键"""
+    try:
+        return int(user_identity)
+    except (TypeError, ValueError):
+        return user_identity
+
+
+def _query_identity(user_identity: Any) -> Optional[UserIdentity]:
+    """一次查询取出用户的uid、用户名、邮箱和身份权限"""
+    context = GetDatabaseContext()
+    table_name = context.table("users")
+    with db_orm.connection(context.name) as db:
+        row = Query(table_name).select(*UserIdentity._fields).where(uid=user_identity).first(db)
+
+    if row is None:
+        return None
+    return UserIdentity._make(row)
+
+
+def _query_identities(column: str, values: List[Any]) -> List[UserIdentity]:
+    """按uid或邮箱批量查询, 每 IDENTITY_BATCH_SIZE 个值一条 IN 查询
+
+    IN 列表补齐到2的幂(重复最后一个值), 不同数量的批量查询共用少数几条已缓存的语句。
+    """
+    context = GetDatabaseContext()
+    query = Query(context.table("users")).select(*UserIdentity._fields)
+    identities: List[UserIdentity] = []
+    with db_orm.connection(context.name) as db:
+        for start in range(0, len(values), IDENTITY_BATCH_SIZE):
+            chunk = values[start:start + IDENTITY_BATCH_SIZE]
+            size = 1 << (len(chunk) - 1).bit_length()
+            chunk += chunk[-1:] * (size - len(chunk))
+            identities.extend(UserIdentity._make(row) for row in query.where(**{f"{column}__in": chunk}).all(db))
+            with _identity_lock:
+                _identity_stats["batch_queries"] += 1
+    return identities
+
+
+def _cached_identity(key: Any, now: float) -> Optional[UserIdentity]:
+    """读取未过期的缓存记录, 调用方需持有_identity_lock"""
+    entry = _identities.get(key)
+    if entry is not None:
+        if entry[1] > now:
+            _identities.move_to_end(key)
+            _identity_stats["hits"] += 1
+            return entry[0]
+        del _identities[key]
+        _identity_stats["expired"] += 1
+    _identity_stats["misses"] += 1
+    return None
+
+
+def _store_identities(identities: Iterable[UserIdentity]) -> None:
+    """写入缓存, 超出容量时淘汰最久未使用的记录"""
+    expires_at = time.monotonic() + IDENTITY_CACHE_TTL
+    with _identity_lock:
+        for identity in identities:
+            _identities[identity.uid] = (identity, expires_at)
+            _identities.move_to_end(identity.uid)
+        while len(_identities) > IDENTITY_CACHE_SIZE:
+            _identities.popitem(last=False)
+            _identity_stats["evictions"] += 1
+
+
+def GetUserIdentity(user_identity: Any) -> Optional[UserIdentity]:
+    """获取用户身份信息, 优先从缓存读取, 用户不存在时返回None
+
+    Raises:
+        ValueError: 数据库尚未配置时
+    """
+    key = _cache_key(user_identity)
+    with _identity_lock:
+        identity = _cached_identity(key, time.monotonic())
+    if identity is not None:
+        return identity
+
+    identity = _query_identity(key)
+    # 不存在的用户不缓存, 注册后可以立即查到
+    if identity is None:
+        return None
+    _store_identities((identity,))
+    return identity
+
+
+def GetUserIdentities(user_identities: Iterable[Any]) -> Dict[Any, UserIdentity]:
+    """批量获取用户身份信息, 缓存未命中的用户在一条 uid IN (...) 查询中取出
+
+    Returns:
+        {uid: 身份信息}, 不存在的用户不在结果中
+
+    Raises:
+        ValueError: 数据库尚未配置时
+    """
+    found: Dict[Any, UserIdentity] = {}
+    missing: List[Any] = []
+    now = time.monotonic()
+    with _identity_lock:
+        for key in dict.fromkeys(map(_cache_key, user_identities)):
+            identity = _cached_identity(key, now)
+            if identity is None:
+                missing.append(key)
+            else:
+                found[key] = identity
+
+    if missing:
+        identities = _query_identities("uid", missing)
+        _store_identities(identities)
+        found.update((identity.uid, identity) for identity in identities)
+    return found
+
+
+def GetUserIdentitiesByMail(mails: Iterable[str]) -> Dict[str, UserIdentity]:
+    """按邮箱批量获取用户身份信息, 始终查询数据库(缓存以uid为键), 结果写入缓存
+
+    MySQL默认排序规则比较邮箱时不区分大小写, 查到的邮箱可能与传入的大小写不同;
+    没有完全相同的邮箱时, 不区分大小写只匹配到一个用户则视为该用户。
+
+    Returns:
+        {传入的邮箱: 身份信息}, 不存在的用户不在结果中
+    """
+    mails = list(dict.fromkeys(mails))
+    if not mails:
+        return {}
+    identities = _query_identities("mail", mails)
+    _store_identities(identities)
+
+    exact = {identity.mail: identity for identity in identities}
+    folded: Dict[str, List[UserIdentity]] = {}
+    for identity in identities:
+        if identity.mail is not None:
+            folded.setdefault(identity.mail.lower(), []).append(identity)
+    found: Dict[str, UserIdentity] = {}
+    for mail in mails:
+        identity = exact.get(mail)
+        if identity is None:
+            matches = folded.get(mail.lower(), [])
+            if len(matches) == 1:
+                identity = matches[0]
+        if identity is not None:
+            found[mail] = identity
+    return found
+
+
+class UserLoader:
+    """
+    请求内的用户批量加载器, 通过 GetUserLoader() 获取
+
+    prime 登记的uid/邮箱在下一次 load 时与本次要加载的键一起查询,
+    加载结果(包括不存在的用户)在加载器内保留, 不再重复查询。
+    """
+
+    __slots__ = ("_by_uid", "_by_mail", "_pending_uids", "_pending_mails")
+
+    def __init__(self):
+        """初始化加载器"""
+        self._by_uid: Dict[Any, Optional[UserIdentity]] = {}
+        self._by_mail: Dict[str, Optional[UserIdentity]] = {}
+        self._pending_uids: Dict[Any, None] = {}
+        self._pending_mails: Dict[str, None] = {}
+
+    def prime(self, uids: Iterable[Any] = (), mails: Iterable[str] = ()) -> None:
+        """登记稍后要加载的uid和邮箱, 不执行查询"""
+        for key in map(_cache_key, uids):
+            if key not in self._by_uid:
+                self._pending_uids[key] = None
+        for mail in mails:
+            if mail not in self._by_mail:
+                self._pending_mails[mail] = None
+
+    def dispatch(self) -> None:
+        """一次查询取出所有已登记、尚未加载的uid, 邮箱同样一次查询
+
+        Raises:
+            ValueError: 数据库尚未配置时
+        """
+        uids = [key for key in self._pending_uids if key not in self._by_uid]
+        mails = [mail for mail in self._pending_mails if mail not in self._by_mail]
+        self._pending_uids.clear()
+        self._pending_mails.clear()
+
+        if uids:
+            found = GetUserIdentities(uids)
+            for key in uids:
+                self._remember(found.get(key))
+                self._by_uid.setdefault(key, None)
+        if mails:
+            found_by_mail = GetUserIdentitiesByMail(mails)
+            for mail in mails:
+                identity = found_by_mail.get(mail)
+                self._remember(identity)
+                # 按传入的邮箱记录, 大小写与数据库中不同时也能命中
+                self._by_mail[mail] = identity
+
+    def _remember(self, identity: Optional[UserIdentity]) -> None:
+        """记录加载结果, 同时按uid和邮箱索引"""
+        if identity is None:
+            return
+        self._by_uid[identity.uid] = identity
+        if identity.mail is not None:
+            self._by_mail[identity.mail] = identity
+
+    def load(self, uid: Any) -> Optional[UserIdentity]:
+        """按uid加载用户, 用户不存在时返回None"""
+        key = _cache_key(uid)
+        if key not in self._by_uid:
+            self._pending_uids[key] = None
+            self.dispatch()
+        return self._by_uid[key]
+
+    def load_many(self, uids: Iterable[Any]) -> List[Optional[UserIdentity]]:
+        """按uid批量加载用户, 结果顺序与 uids 一致, 不存在的用户为None"""
+        keys = [_cache_key(uid) for uid in uids]
+        self.prime(keys)
+        if self._pending_uids:
+            self.dispatch()
+        return [self._by_uid[key] for key in keys]
+
+    def load_by_mail(self, mail: str) -> Optional[UserIdentity]:
+        """按邮箱加载用户, 用户不存在时返回None"""
+        if mail not in self._by_mail:
+            self._pending_mails[mail] = None
+            self.dispatch()
+        return self._by_mail[mail]
+
+    def load_many_by_mail(self, mails: Iterable[str]) -> List[Optional[UserIdentity]]:
+        """按邮箱批量加载用户, 结果顺序与 mails 一致, 不存在的用户为None"""
+        mails = list(mails)
+        self.prime(mails=mails)
+        if self._pending_mails:
+            self.dispatch()
+        return [self._by_mail[mail] for mail in mails]
+
+    def clear(self, uid: Any = None) -> None:
+        """丢弃已加载的用户, uid为None时全部丢弃"""
+        if uid is None:
+            self._by_uid.clear()
+            self._by_mail.clear()
+            return
+        identity = self._by_uid.pop(_cache_key(uid), None)
+        if identity is not None and identity.mail is not None:
+            self._by_mail.pop(identity.mail, None)
+
+
+def GetUserLoader() -> UserLoader:
+    """获取当前请求的用户加载器, 请求结束时随 flask.g 一起丢弃; 不在请求(应用上下文)内时返回新的加载器"""
+    if not has_app_context():
+        return UserLoader()
+    loader = g.get("_user_loader")
+    if loader is None:
+        loader = UserLoader()
+        g._user_loader = loader
+    return loader
+
+
+def InvalidateUserIdentity(user_identity: Any = None) -> None:
+    """使用户的身份缓存失效, user_identity为None时清空全部缓存"""
+    with _identity_lock:
+        if user_identity is None:
+            _identities.clear()
+        else:
+            _identities.pop(_cache_key(user_identity), None)
+        _identity_stats["invalidations"] += 1
+    # 当前请求内已加载的记录同样失效, 修改后的读取能看到新数据
+    if has_app_context():
+        loader = g.get("_user_loader")
+        if loader is not None:
+            loader.clear(user_identity)
+
+
+def GetIdentityCacheStats() -> Dict[str, int]:
+    """获取身份缓存的统计信息"""
+    with _identity_lock:
+        stats = dict(_identity_stats)
+        stats["size"] = len(_identities)
+    return stats
+
+
+def _reset_after_fork() -> None:
+    """子进程中重建锁"""
+    global _identity_lock
+    _identity_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库结构迁移模块
+
+表结构按版本号顺序迁移, 已执行的版本记录在 {前缀}schema_migrations 表中。
+注册连接池时(ORM.register_db)在跨进程锁内执行尚未执行的迁移,
+新建连接不再执行任何DDL。同一进程再次注册已迁移过的数据库时只读取一次版本号,
+数据库被删除重建(如重新安装)后会重新迁移。
+
+添加迁移:
+    @migration(5, "users表添加avatar列")
+    def _add_users_avatar(db):
+        db.add_column(f"{db.db_prefix}users", "avatar", "VARCHAR(255) DEFAULT NULL")
+        db._create_index(f"{db.db_prefix}users_avatar", f"{db.db_prefix}users", "avatar")
+
+版本号只能递增, 已发布的迁移不要修改。
+"""
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, List, NamedTuple, Set, Tuple
+from magic.utils.db.adapters import DatabaseAdapter
+from magic.utils.db.connection_pool import ConnectionPool
+
+
+# 等待其他进程执行迁移的最长时间(秒)
+MIGRATION_LOCK_TIMEOUT = 60.0
+
+
+class Migration(NamedTuple):
+    """结构迁移"""
+
+    version: int
+    description: str
+    apply: Callable[[DatabaseAdapter], None]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str) -> Callable[[Callable[[DatabaseAdapter], None]], Callable[[DatabaseAdapter], None]]:
+    """注册结构迁移的装饰器
+
+    Args:
+        version: 版本号, 必须大于已注册的所有版本
+        description: 迁移说明
+    """
+    def decorator(apply: Callable[[DatabaseAdapter], None]) -> Callable[[DatabaseAdapter], None]:
+        if MIGRATIONS and version <= MIGRATIONS[-1].version:
+            raise ValueError(f"迁移版本号必须递增: {version}")
+        MIGRATIONS.append(Migration(version, description, apply))
+        return apply
+    return decorator
+
+
+@migration(1, "创建 users、options、usermeta 表及索引")
+def _initial_tables(db: DatabaseAdapter) -> None:
+    db._initialize_tables()
+
+
+@migration(2, "users表邮箱唯一索引, 用户名和邮箱搜索索引")
+def _users_indexes(db: DatabaseAdapter) -> None:
+    db._create_users_indexes(f"{db.db_prefix}users")
+
+
+@migration(3, "用户名和邮箱全文搜索结构")
+def _users_fulltext(db: DatabaseAdapter) -> None:
+    # 数据库不支持(如SQLite缺少FTS5 trigram、没有创建pg_trgm扩展的权限)时不影响迁移, fulltext 搜索退回前缀搜索
+    if not db.setup_user_fulltext(f"{db.db_prefix}users"):
+        logging.warning("当前数据库不支持全文搜索, fulltext 搜索模式将使用前缀搜索")
+
+
+@migration(4, "用户名和邮箱搜索索引改为不区分大小写")
+def _users_search_indexes_ignore_case(db: DatabaseAdapter) -> None:
+    db._recreate_users_search_indexes(f"{db.db_prefix}users")
+
+
+def _migrations_table(db: DatabaseAdapter) -> str:
+    """迁移记录表名"""
+    return f"{db.db_prefix}schema_migrations"
+
+
+def _ensure_migrations_table(db: DatabaseAdapter) -> None:
+    """创建迁移记录表"""
+    db.execute(
+        f"CREATE TABLE IF NOT EXISTS {_migrations_table(db)} ("
+        f"version INTEGER NOT NULL PRIMARY KEY, "
+        f"description VARCHAR(255) DEFAULT NULL, "
+        f"applied_at INTEGER DEFAULT 0)"
+    )
+    db.commit()
+
+
+def GetSchemaVersion(db: DatabaseAdapter) -> int:
+    """获取数据库当前的结构版本, 没有执行过迁移时返回0"""
+    _ensure_migrations_table(db)
+    db.execute(f"SELECT MAX(version) FROM {_migrations_table(db)}")
+    version = db.fetchscalar()
+    db.commit()
+    return int(version or 0)
+
+
+def MigrateDatabase(db: DatabaseAdapter) -> int:
+    """在跨进程锁内执行尚未执行的迁移
+
+    Args:
+        db: 数据库适配器
+
+    Returns:
+        本次执行的迁移数量
+
+    Raises:
+        TimeoutError: 等待其他进程的迁移锁超时
+    """
+    if MIGRATIONS and GetSchemaVersion(db) >= MIGRATIONS[-1].version:
+        return 0
+
+    if not db.acquire_migration_lock(MIGRATION_LOCK_TIMEOUT):
+        raise TimeoutError("等待数据库结构迁移锁超时")
+    try:
+        # 获取锁期间其他进程可能已完成迁移, 重新读取版本
+        current = GetSchemaVersion(db)
+        applied = 0
+        for item in MIGRATIONS:
+            if item.version <= current:
+                continue
+            logging.info(f"执行数据库结构迁移 {item.version}: {item.description}")
+            try:
+                item.apply(db)
+                db.execute(
+                    f"INSERT INTO {_migrations_table(db)} (version, description, applied_at) VALUES (?, ?, ?)",
+                    (item.version, item.description, int(time.time())),
+                )
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            applied += 1
+        return applied
+    finally:
+        db.release_migration_lock()
+
+
+_migrated: Set[Tuple[Any, ...]] = set()
+_migrate_lock = threading.Lock()
+
+
+def _read_schema_version(db: DatabaseAdapter) -> int:
+    """只读地查询结构版本, 不创建迁移记录表, 表不存在时返回0"""
+    table_name = _migrations_table(db)
+    if not db.column_exists(table_name, "version"):
+        db.commit()
+        return 0
+    db.execute(f"SELECT MAX(version) FROM {table_name}")
+    version = db.fetchscalar()
+    db.commit()
+    return int(version or 0)
+
+
+def _target_key(pool: ConnectionPool) -> Tuple[Any, ...]:
+    """标识同一个数据库的键, 同一进程(及fork出的子进程)中已迁移过的数据库只需确认版本号"""
+    config = pool.config
+    return (
+        pool.db_type,
+        config.get("path"),
+        config.get("host"),
+        config.get("port"),
+        config.get("database"),
+        config.get("prefix", ""),
+    )
+
+
+def EnsureSchema(pool: ConnectionPool) -> int:
+    """确保连接池对应的数据库已迁移到最新版本
+
+    Returns:
+        本次执行的迁移数量
+    """
+    key = _target_key(pool)
+    with _migrate_lock:
+        adapter = pool.get_connection()
+        try:
+            # 已迁移过的数据库可能已被删除重建, 版本号仍是最新时不再执行任何DDL
+            if key in _migrated and MIGRATIONS and _read_schema_version(adapter) >= MIGRATIONS[-1].version:
+                return 0
+            _migrated.discard(key)
+            applied = MigrateDatabase(adapter)
+        finally:
+            pool.return_connection(adapter)
+        _migrated.add(key)
+        return applied
+
+
+def _reset_after_fork() -> None:
+    """子进程中重建锁, 已迁移的记录沿用父进程的"""
+    global _migrate_lock
+    _migrate_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -6,7 +6,23 @@
 包含ORM模型基类及核心数据模型。
 """
 from __future__ import annotations
-from magic.utils.db.adapters import DatabaseAdapter
+from typing import Any, AsyncIterator, Callable, Iterable, Iterator
+from magic.utils.db.adapters import DatabaseAdapter, Record, quote_identifier
+from magic.utils.db.adapters.adapters import STREAM_BATCH_SIZE
+from magic.utils.db.adapters.async_adapters import AsyncDatabaseAdapter
+from magic.utils.db.identity_cache import InvalidateUserIdentity
+from magic.utils.db.query import Query
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+
+# 单条SQL语句的参数个数上限, 多行VALUES按此拆分
+MAX_STATEMENT_PARAMS = {"sqlite": 999, "mysql": 65535, "postgresql": 65535}
+# PostgreSQL 批量插入达到该行数且不需要返回主键时使用 COPY
+COPY_THRESHOLD = 10000
 
 
 class Model():
@@ -29,107 +45,190 @@ class Model():
         return cls._table_name
 
     @classmethod
-    def find(cls, db: DatabaseAdapter, **kwargs: str) -> object:
-        """根据条件查找记录"""
-        table_name = cls.get_table_name()
+    def _statement_key(cls, operation: str, columns: tuple[str, ...] = ()) -> tuple[object, ...]:
+        """语句缓存键: (模型, 表名, 操作, 列名)"""
+        return (cls, cls.get_table_name(), operation, columns)
 
-        # 构建查询条件
-        if not kwargs:
-            query = f"SELECT * FROM {table_name}"
-            params = None
-        else:
-            conditions: list[str] = []
-            params_list: list[object] = []
-            for key, value in kwargs.items():
-                conditions.append(f"{key} = ?")
-                params_list.append(value)
+    @classmethod
+    def select(cls, *columns: str, **aliases: str) -> Query:
+        """
+        创建只查询指定列的查询, 见 query 模块
 
-            # 替换参数占位符为数据库特定的格式
-            query = f"SELECT * FROM {table_name} WHERE {' AND '.join(conditions)}"
-            if db.config.get("type") == "mysql":
-                query = query.replace("?", "%s")
-            elif db.config.get("type") == "postgresql":
-                query = query.replace("?", "%s")
+        用法:
+            UserModel.select("uid", "name").where(group="admin").order_by("uid").limit(20).all(db)
+        """
+        return Query(cls.get_table_name(), cls._primary_key).select(*columns, **aliases)
 
-            params = tuple(params_list) if params_list else None
+    @classmethod
+    def where(cls, **conditions: Any) -> Query:
+        """创建带条件的 SELECT * 查询, 条件写法见 query 模块"""
+        return Query(cls.get_table_name(), cls._primary_key).where(**conditions)
 
-        db.execute(query, params)
-        return db.fetchall()
+    @classmethod
+    def _find_by_id_sql(cls) -> str:
+        """生成按主键查询的语句"""
+        return f"SELECT * FROM {cls.get_table_name()} WHERE {cls._primary_key} = ?"
 
     @classmethod
-    def find_by_id(cls, db, id_value):
-        """根据主键查找记录"""
-        table_name = cls.get_table_name()
-        query = f"SELECT * FROM {table_name} WHERE {cls._primary_key} = ?"
+    def _create_sql(cls, columns: tuple[str, ...], db_type: str | None) -> str:
+        """生成插入语句, PostgreSQL 通过 RETURNING 直接返回主键"""
+        placeholders = ", ".join(["?" for _ in columns])
+        query = f"INSERT INTO {cls.get_table_name()} ({', '.join(map(quote_identifier, columns))}) VALUES ({placeholders})"
+        if db_type == "postgresql":
+            query += f" RETURNING {cls._primary_key}"
+        return query
 
-        # 替换参数占位符为数据库特定的格式
-        if db.config.get("type") == "mysql":
-            query = query.replace("?", "%s")
-        elif db.config.get("type") == "postgresql":
-            query = query.replace("?", "%s")
+    @classmethod
+    def _update_sql(cls, columns: tuple[str, ...]) -> str:
+        """生成更新语句, id 放到参数末尾"""
+        updates = " ,".join(f"{quote_identifier(key)} = ?" for key in columns)
+        return f"UPDATE {cls.get_table_name()} SET {updates} WHERE {cls._primary_key} = ?"
 
-        db.execute(query, (id_value,))
-        return db.fetchone()
+    @classmethod
+    def _delete_sql(cls) -> str:
+        """生成按主键删除的语句"""
+        return f"DELETE FROM {cls.get_table_name()} WHERE {cls._primary_key} = ?"
 
     @classmethod
-    def create(cls, db, **kwargs):
-        """创建新记录"""
+    def _bulk_values(cls, rows: list[dict[str, Any]], db_type: str | None, returning: bool) -> tuple[tuple[str, ...], list[tuple[Any, ...]]]:
+        """
+        取出批量插入的列名和各行的值
+
+        Raises:
+            ValueError: 各行列名不一致, 或当前数据库不支持 RETURNING 时
+        """
+        columns = tuple(rows[0])
+        column_set = set(columns)
+        values: list[tuple[Any, ...]] = []
+        for row in rows:
+            if row.keys() != column_set:
+                raise ValueError("批量插入的各行列名必须一致")
+            values.append(tuple(row[column] for column in columns))
+
+        if returning and not (db_type == "postgresql" or (db_type == "sqlite" and sqlite3.sqlite_version_info >= (3, 35, 0))):
+            raise ValueError(f"当前数据库不支持 RETURNING: {db_type}")
+        return columns, values
+
+    @classmethod
+    def _bulk_statements(
+        cls,
+        db_type: str | None,
+        columns: tuple[str, ...],
+        values: list[tuple[Any, ...]],
+        batch_size: int,
+        returning: bool,
+    ) -> Iterator[tuple[tuple[object, ...], Callable[[], str], tuple[Any, ...]]]:
+        """将批量插入按参数个数上限拆分为多行 VALUES 语句, 逐条返回 (缓存键, 生成函数, 参数)"""
         table_name = cls.get_table_name()
+        max_params = MAX_STATEMENT_PARAMS.get(db_type, 999)  # pyright: ignore[reportArgumentType]
+        chunk_size = max(1, min(batch_size, max_params // len(columns)))
+        row_placeholder = f"({', '.join(['?'] * len(columns))})"
+        for start in range(0, len(values), chunk_size):
+            chunk = values[start:start + chunk_size]
+
+            def build(count: int = len(chunk)) -> str:
+                query = f"INSERT INTO {table_name} ({', '.join(map(quote_identifier, columns))}) VALUES {', '.join([row_placeholder] * count)}"
+                if returning:
+                    query += f" RETURNING {cls._primary_key}"
+                return query
+
+            yield (
+                cls._statement_key("bulk_create", (*columns, len(chunk), returning)),
+                build,
+                tuple(value for row in chunk for value in row),
+            )
 
-        # 构建插入语句
-        columns = ", ".join(kwargs.keys())
-        placeholders = ", ".join(["?" for _ in kwargs])
-        params_list = list(kwargs.values())
+    @classmethod
+    def find(cls, db: DatabaseAdapter, **kwargs: Any) -> list[Record]:
+        """根据条件查找记录, 条件写法见 query 模块"""
+        return cls.where(**kwargs).all(db)
 
-        query = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
+    @classmethod
+    def iter(cls, db: DatabaseAdapter, batch_size: int = STREAM_BATCH_SIZE, **kwargs: Any) -> Iterator[Record]:
+        """
+        根据条件逐行迭代记录, 使用服务器端游标分批读取, 适合导出等遍历整表的场景
 
-        # 替换参数占位符为数据库特定的格式
-        if db.config.get("type") == "mysql":
-            query = query.replace("?", "%s")
-        elif db.config.get("type") == "postgresql":
-            query = query.replace("?", "%s")
+        用法:
+            for user in UserModel.iter(db, batch_size=500):
+                ...
 
-        db.execute(query, tuple(params_list))
-        db.commit()
+        Args:
+            db: 数据库适配器
+            batch_size: 每批从数据库取回的行数
+            **kwargs: 查询条件, 与 find 相同
+        """
+        return cls.where(**kwargs).iter(db, batch_size)
+
+    @classmethod
+    def find_by_id(cls, db, id_value):
+        """根据主键查找记录"""
+        db.execute_statement(cls._statement_key("find_by_id"), cls._find_by_id_sql, (id_value,))
+        return db.fetchone()
+
+    @classmethod
+    def create(cls, db, **kwargs):
+        """创建新记录"""
+        columns = tuple(kwargs)
+        db_type = db.config.get("type")
+        db.execute_statement(cls._statement_key("create", columns), lambda: cls._create_sql(columns, db_type), tuple(kwargs.values()))
 
         # 返回插入的ID
-        if db.config.get("type") == "sqlite":
-            return db.cursor.lastrowid
-        elif db.config.get("type") == "mysql":
-            db.execute("SELECT LAST_INSERT_ID()")
-            return db.fetchone()[0]
-        elif db.config.get("type") == "postgresql":
-            db.execute(
-                "SELECT CURRVAL(pg_get_serial_sequence('%s', '%s'))"
-                % (table_name, cls._primary_key)
-            )
-            return db.fetchone()[0]
+        if db_type == "postgresql":
+            row = db.fetchone()
+            db.commit()
+            return row[0] if row else None
+        db.commit()
+        return db.cursor.lastrowid
+
+    @classmethod
+    def bulk_create(cls, db, rows: Iterable[dict[str, Any]], batch_size: int = 500, returning: bool = False, commit: bool = True) -> int | list[Any]:
+        """
+        批量创建记录, 所有行在同一事务中插入
+
+        - sqlite/mysql: 使用驱动的 executemany(pymysql 会改写为多行 INSERT)
+        - postgresql: 达到 COPY_THRESHOLD 行时使用 COPY, 否则使用多行 VALUES
+        - returning=True 时使用多行 VALUES ... RETURNING 返回主键(postgresql, sqlite 3.35+)
+
+        Args:
+            db: 数据库适配器
+            rows: 行数据, 每行是 {列名: 值}, 各行列名必须一致
+            batch_size: 每条多行 INSERT 语句包含的最大行数
+            returning: 是否返回插入记录的主键
+            commit: 插入完成后是否提交事务
+
+        Returns:
+            returning=True 时返回主键列表, 否则返回插入的行数
+
+        Raises:
+            ValueError: 各行列名不一致, 或当前数据库不支持 RETURNING 时
+        """
+        rows = list(rows)
+        if not rows:
+            return [] if returning else 0
+
+        db_type = db.config.get("type")
+        columns, values = cls._bulk_values(rows, db_type, returning)
+        ids: list[Any] = []
+        if not returning and db_type == "postgresql" and len(values) >= COPY_THRESHOLD:
+            db.copy_rows(cls.get_table_name(), columns, values)
+        elif not returning and db_type != "postgresql":
+            query = db.statement(cls._statement_key("create", columns), lambda: cls._create_sql(columns, db_type))
+            db.executemany(query, values)
+        else:
+            for key, build, params in cls._bulk_statements(db_type, columns, values, batch_size, returning):
+                db.execute_statement(key, build, params)
+                if returning:
+                    ids.extend(row[0] for row in db.fetchall())
+
+        if commit:
+            db.commit()
+        return ids if returning else len(values)
 
     @classmethod
     def update(cls, db, id_value, **kwargs):
         """更新记录"""
-        table_name = cls.get_table_name()
-
-        # 构建更新语句
-        updates = []
-        params_list: list[object] = []
-        for key, value in kwargs.items():
-            updates.append(f"{key} = ?")
-            params_list.append(value)
-        # 将 id 放到参数末尾
-        params_list.append(id_value)
-
-        query = (
-            f"UPDATE {table_name} SET {' ,'.join(updates)} WHERE {cls._primary_key} = ?"
-        )
-
-        # 替换参数占位符为数据库特定的格式
-        if db.config.get("type") == "mysql":
-            query = query.replace("?", "%s")
-        elif db.config.get("type") == "postgresql":
-            query = query.replace("?", "%s")
-
-        db.execute(query, tuple(params_list))
+        columns = tuple(kwargs)
+        db.execute_statement(cls._statement_key("update", columns), lambda: cls._update_sql(columns), (*kwargs.values(), id_value))
         db.commit()
 
         return db.cursor.rowcount
@@ -137,20 +236,85 @@ class Model():
     @classmethod
     def delete(cls, db, id_value):
         """删除记录"""
-        table_name = cls.get_table_name()
+        db.execute_statement(cls._statement_key("delete"), cls._delete_sql, (id_value,))
+        db.commit()
 
-        query = f"DELETE FROM {table_name} WHERE {cls._primary_key} = ?"
+        return db.cursor.rowcount
 
-        # 替换参数占位符为数据库特定的格式
-        if db.config.get("type") == "mysql":
-            query = query.replace("?", "%s")
-        elif db.config.get("type") == "postgresql":
-            query = query.replace("?", "%s")
+    # 异步版本, 参数和返回值与同步方法相同, db 为 AsyncDatabaseAdapter
 
-        db.execute(query, (id_value,))
-        db.commit()
+    @classmethod
+    async def afind(cls, db: AsyncDatabaseAdapter, **kwargs: Any) -> list[Record]:
+        """根据条件查找记录"""
+        return await cls.where(**kwargs).aall(db)
 
-        return db.cursor.rowcount
+    @classmethod
+    def aiter(cls, db: AsyncDatabaseAdapter, batch_size: int = STREAM_BATCH_SIZE, **kwargs: Any) -> AsyncIterator[Record]:
+        """根据条件逐行迭代记录, 用法为 async for row in Model.aiter(db)"""
+        return cls.where(**kwargs).aiter(db, batch_size)
+
+    @classmethod
+    async def afind_by_id(cls, db: AsyncDatabaseAdapter, id_value: Any) -> Any:
+        """根据主键查找记录"""
+        await db.execute_statement(cls._statement_key("find_by_id"), cls._find_by_id_sql, (id_value,))
+        return await db.fetchone()
+
+    @classmethod
+    async def acreate(cls, db: AsyncDatabaseAdapter, **kwargs: Any) -> Any:
+        """创建新记录, 返回插入的ID"""
+        columns = tuple(kwargs)
+        db_type = db.config.get("type")
+        await db.execute_statement(cls._statement_key("create", columns), lambda: cls._create_sql(columns, db_type), tuple(kwargs.values()))
+
+        if db_type == "postgresql":
+            row = await db.fetchone()
+            await db.commit()
+            return row[0] if row else None
+        lastrowid = db.lastrowid
+        await db.commit()
+        return lastrowid
+
+    @classmethod
+    async def abulk_create(cls, db: AsyncDatabaseAdapter, rows: Iterable[dict[str, Any]], batch_size: int = 500, returning: bool = False, commit: bool = True) -> int | list[Any]:
+        """批量创建记录, 所有行在同一事务中插入, 见 bulk_create"""
+        rows = list(rows)
+        if not rows:
+            return [] if returning else 0
+
+        db_type = db.config.get("type")
+        columns, values = cls._bulk_values(rows, db_type, returning)
+        ids: list[Any] = []
+        if not returning and db_type == "postgresql" and len(values) >= COPY_THRESHOLD:
+            await db.copy_rows(cls.get_table_name(), columns, values)  # pyright: ignore[reportAttributeAccessIssue]
+        elif not returning and db_type != "postgresql":
+            query = db.statement(cls._statement_key("create", columns), lambda: cls._create_sql(columns, db_type))
+            await db.executemany(query, values)
+        else:
+            for key, build, params in cls._bulk_statements(db_type, columns, values, batch_size, returning):
+                await db.execute_statement(key, build, params)
+                if returning:
+                    ids.extend(row[0] for row in await db.fetchall())
+
+        if commit:
+            await db.commit()
+        return ids if returning else len(values)
+
+    @classmethod
+    async def aupdate(cls, db: AsyncDatabaseAdapter, id_value: Any, **kwargs: Any) -> int:
+        """更新记录, 返回影响的行数"""
+        columns = tuple(kwargs)
+        await db.execute_statement(cls._statement_key("update", columns), lambda: cls._update_sql(columns), (*kwargs.values(), id_value))
+        rowcount = db.rowcount
+        await db.commit()
+        return rowcount
+
+    @classmethod
+    async def adelete(cls, db: AsyncDatabaseAdapter, id_value: Any) -> int:
+        """删除记录, 返回影响的行数"""
+        await db.execute_statement(cls._statement_key("delete"), cls._delete_sql, (id_value,))
+        rowcount = db.rowcount
+        await db.commit()
+        return rowcount
 
 
 class UserModel(Model):
@@ -158,6 +322,34 @@ class UserModel(Model):
 
     _primary_key = "uid"
 
+    @classmethod
+    def update(cls, db, id_value, **kwargs):
+        """更新用户, 同时使该用户的身份缓存失效"""
+        rowcount = super().update(db, id_value, **kwargs)
+        InvalidateUserIdentity(id_value)
+        return rowcount
+
+    @classmethod
+    def delete(cls, db, id_value):
+        """删除用户, 同时使该用户的身份缓存失效"""
+        rowcount = super().delete(db, id_value)
+        InvalidateUserIdentity(id_value)
+        return rowcount
+
+    @classmethod
+    async def aupdate(cls, db, id_value, **kwargs):
+        """更新用户, 同时使该用户的身份缓存失效"""
+        rowcount = await super().aupdate(db, id_value, **kwargs)
+        InvalidateUserIdentity(id_value)
+        return rowcount
+
+    @classmethod
+    async def adelete(cls, db, id_value):
+        """删除用户, 同时使该用户的身份缓存失效"""
+        rowcount = await super().adelete(db, id_value)
+        InvalidateUserIdentity(id_value)
+        return rowcount
+
 
 class OptionModel(Model):
     """选项模型"""
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+网站选项缓存模块
+
+一次查询载入所有全站选项(user = 0)并缓存在内存中, 读取时不再访问数据库。
+写入选项时在同一条语句中更新版本行(name = _options_version, user = -1),
+各工作进程每隔 VERSION_CHECK_INTERVAL 秒查询一次版本行, 版本变化时重新载入。
+选项和版本行可以从只读副本读取, 副本落后时载入的旧版本会在副本追上后的下一次版本检查中更新。
+"""
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+from magic.utils.db.orm import db_orm
+from magic.utils.db.context import GetDatabaseContext
+from magic.utils.db.query import Query
+
+
+# 版本行, user = -1 不属于任何用户, 不会作为全站选项载入
+OPTIONS_VERSION_NAME = "_options_version"
+OPTIONS_VERSION_USER = -1
+# 两次检查版本行之间的最短间隔(秒)
+VERSION_CHECK_INTERVAL = 2.0
+
+_options: Optional[Dict[str, Any]] = None
+_options_table: Optional[str] = None
+_options_version: Optional[str] = None
+_checked_at: float = 0.0
+_options_lock = threading.Lock()
+_options_stats = {"hits": 0, "loads": 0, "version_checks": 0, "invalidations": 0}
+
+
+def NewSiteOptionsVersion() -> Tuple[str, int, str]:
+    """生成新的版本行 (name, user, value), 写入选项时与选项一起 upsert"""
+    return (OPTIONS_VERSION_NAME, OPTIONS_VERSION_USER, f"{time.time_ns()}-{os.getpid()}")
+
+
+def _load_options(table_name: str) -> None:
+    """一次查询载入全站选项和版本行, 调用方需持有_options_lock"""
+    global _options, _options_table, _options_version, _checked_at
+    options: Dict[str, Any] = {}
+    version = None
+    with db_orm.connection(GetDatabaseContext().name, readonly=True) as db:
+        rows = Query(table_name).select("name", "user", "value").where(user__in=(0, OPTIONS_VERSION_USER)).all(db)
+        for name, user, value in rows:
+            if user == OPTIONS_VERSION_USER:
+                if name == OPTIONS_VERSION_NAME:
+                    version = value
+            else:
+                options[name] = value
+
+    _options = options
+    _options_table = table_name
+    _options_version = version
+    _checked_at = time.monotonic()
+    _options_stats["loads"] += 1
+
+
+def _read_version(table_name: str) -> Optional[str]:
+    """查询版本行"""
+    with db_orm.connection(GetDatabaseContext().name, readonly=True) as db:
+        return Query(table_name).select("value").where(name=OPTIONS_VERSION_NAME, user=OPTIONS_VERSION_USER).scalar(db)
+
+
+def GetSiteOptions() -> Dict[str, Any]:
+    """获取所有全站选项 {选项名: 选项值}
+
+    返回的字典为缓存本身, 调用方不要修改。
+
+    Raises:
+        ValueError: 数据库尚未配置时
+    """
+    global _checked_at
+    table_name = GetDatabaseContext().table("options")
+    options = _options
+    if options is not None and _options_table == table_name and time.monotonic() - _checked_at < VERSION_CHECK_INTERVAL:
+        _options_stats["hits"] += 1
+        return options
+
+    with _options_lock:
+        if _options is None or _options_table != table_name:
+            _load_options(table_name)
+        elif time.monotonic() - _checked_at >= VERSION_CHECK_INTERVAL:
+            # 其他工作进程写入选项后版本行会变化
+            _options_stats["version_checks"] += 1
+            if _read_version(table_name) != _options_version:
+                _load_options(table_name)
+            else:
+                _checked_at = time.monotonic()
+        else:
+            _options_stats["hits"] += 1
+        return _options  # pyright: ignore[reportReturnType]
+
+
+def GetSiteOptionValue(option_name: str, default: Any = None) -> Any:
+    """从缓存读取全站选项的值, 选项不存在时返回default"""
+    return GetSiteOptions().get(option_name, default)
+
+
+def LoadSiteOptionsCache() -> bool:
+    """启动时预先载入全站选项, 数据库尚未配置(安装前)时跳过"""
+    try:
+        table_name = GetDatabaseContext().table("options")
+        with _options_lock:
+            _load_options(table_name)
+        return True
+    except Exception as e:
+        logging.info(f"跳过网站选项缓存预载入: {e}")
+        return False
+
+
+def InvalidateSiteOptionsCache() -> None:
+    """使当前进程的选项缓存失效, 下次读取时重新载入"""
+    global _options
+    with _options_lock:
+        _options = None
+        _options_stats["invalidations"] += 1
+
+
+def GetSiteOptionsCacheStats() -> Dict[str, int]:
+    """获取选项缓存的统计信息"""
+    return dict(_options_stats)
+
+
+def _reset_after_fork() -> None:
+    """子进程中重建锁, 缓存的数据通过版本行检查保持有效"""
+    global _options_lock, _checked_at
+    _options_lock = threading.Lock()
+    _checked_at = 0.0
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
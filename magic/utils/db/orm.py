@@ -4,9 +4,27 @@
 ORM核心模块
 
 提供数据库连接池管理和ORM主类。
+
+每个逻辑数据库由一个主库连接池和任意个只读副本连接池组成:
+    - connection(readonly=True) 的只读查询按 replica_strategy 分配到副本
+      (round_robin 轮询, least_in_use 选择借出连接最少的副本), 没有副本时使用主库
+    - 其余的 connection() 和 transaction() 始终使用主库
+    - 请求内在主库上提交过写入或开启过 transaction() 后, 该请求剩余的只读查询也使用主库,
+      保证读到自己的写入; 请求之外的只读查询不做此保证
+副本的数据复制由数据库自身负责, ORM只做读写分流。
 """
-from typing import Dict, Optional, Any
+import logging
+import itertools
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Any, Set, Tuple
+from flask import Flask, current_app, g, has_app_context
+from magic.utils.db.adapters import DatabaseAdapter
 from magic.utils.db.connection_pool import ConnectionPool
+from magic.utils.db.migrations import EnsureSchema
+
+
+# 只读副本的负载均衡策略
+REPLICA_STRATEGIES = ("round_robin", "least_in_use")
 
 
 class ORM:
@@ -14,14 +32,28 @@ class ORM:
     ORM主类,管理多个数据库连接池
     
     提供数据库注册、连接获取和归还功能。
+    通过 init_app 绑定到Flask应用后, 同一请求内的 connection() 作用域共用一个连接,
+    只读作用域共用一个副本连接。
     """
     
     def __init__(self):
         """初始化ORM实例"""
         self._pools: Dict[str, ConnectionPool] = {}
+        self._replicas: Dict[str, List[ConnectionPool]] = {}
+        self._replica_strategies: Dict[str, str] = {}
+        self._replica_counters: Dict[str, "itertools.count[int]"] = {}
         self._default_db: Optional[str] = None
 
-    def register_db(self, name: str, db_type: str, config: Dict[str, Any], pool_size: int = 5) -> None:
+    def register_db(
+        self,
+        name: str,
+        db_type: str,
+        config: Dict[str, Any],
+        pool_size: int = 5,
+        migrate: bool = True,
+        replica_strategy: str = "round_robin",
+        **pool_options: Any,
+    ) -> None:
         """
         注册数据库连接
         
@@ -30,19 +62,61 @@ class ORM:
             db_type: 数据库类型 (sqlite/mysql/postgresql)
             config: 数据库配置字典
             pool_size: 连接池大小,默认为5
+            migrate: 是否执行尚未执行的结构迁移, 见 migrations 模块
+            replica_strategy: 只读副本的负载均衡策略, 见 REPLICA_STRATEGIES
+            **pool_options: 其他连接池参数, 如 max_overflow、timeout, 见 ConnectionPool
         
         Raises:
-            ValueError: 当数据库类型不支持时
+            ValueError: 当数据库类型或负载均衡策略不支持时
         """
+        if replica_strategy not in REPLICA_STRATEGIES:
+            raise ValueError(f"不支持的副本负载均衡策略: {replica_strategy}")
         config["type"] = db_type  # 保存数据库类型
         
-        # 创建连接池
-        pool = ConnectionPool(db_type, config, pool_size=pool_size)
+        # 创建连接池, 同名的旧连接池及其副本先关闭, 避免连接泄漏
+        pool = ConnectionPool(db_type, config, pool_size=pool_size, **pool_options)
+        old_pool = self._pools.get(name)
+        old_replicas = self._replicas.pop(name, [])
         self._pools[name] = pool
+        self._replica_strategies[name] = replica_strategy
+        self._replica_counters[name] = itertools.count()
+        if old_pool is not None:
+            old_pool.close()
+        for replica in old_replicas:
+            replica.close()
+
+        # 每个数据库在每个进程中只检查一次结构版本, 数据库不可用时不影响注册
+        if migrate:
+            try:
+                EnsureSchema(pool)
+            except Exception as e:
+                logging.error(f"数据库结构迁移失败: {e}")
         
         # 如果是第一个注册的数据库,设置为默认数据库
         if self._default_db is None:
             self._default_db = name
+
+    def register_replica(self, name: str, config: Dict[str, Any], pool_size: int = 5, **pool_options: Any) -> None:
+        """
+        为已注册的数据库添加只读副本
+
+        副本使用与主库相同的数据库类型, 不执行结构迁移, 重新注册主库(register_db)时一并移除。
+
+        Args:
+            name: 数据库名称, 需先通过 register_db 注册
+            config: 副本的数据库配置字典
+            pool_size: 连接池大小,默认为5
+            **pool_options: 其他连接池参数, 见 ConnectionPool
+
+        Raises:
+            ValueError: 当指定的数据库未注册时
+        """
+        if name not in self._pools:
+            raise ValueError(f"未注册的数据库: {name}")
+        db_type = self._pools[name].db_type
+        config["type"] = db_type
+        replica = ConnectionPool(db_type, config, pool_size=pool_size, **pool_options)
+        self._replicas[name] = self._replicas.get(name, []) + [replica]
     
     def get_db(self, name: Optional[str] = None):
         """
@@ -80,6 +154,231 @@ class ORM:
         if name in self._pools:
             self._pools[name].return_connection(adapter)
     
+    def init_app(self, app: Flask) -> None:
+        """
+        绑定到Flask应用, 启用请求级连接
+
+        请求内第一次进入 connection() 时从连接池获取连接并绑定到 flask.g,
+        之后的 connection() 作用域复用该连接, 请求结束(teardown)时统一归还一次。
+
+        Args:
+            app: Flask应用实例
+        """
+        app.extensions["db_orm"] = self
+        app.teardown_appcontext(self._release_request_connections)
+
+    def _request_connections(self) -> Optional[Dict[str, Tuple[ConnectionPool, DatabaseAdapter]]]:
+        """获取当前请求绑定的连接, 不在已绑定应用的请求(应用上下文)内时返回None"""
+        if not has_app_context() or current_app.extensions.get("db_orm") is not self:
+            return None
+        bound = g.get("_db_connections")
+        if bound is None:
+            bound = {}
+            g._db_connections = bound
+        return bound
+
+    def _request_replica_connections(self) -> Dict[str, Tuple[ConnectionPool, DatabaseAdapter]]:
+        """获取当前请求绑定的副本连接, 调用方需已确认处于绑定的请求内"""
+        bound = g.get("_db_replica_connections")
+        if bound is None:
+            bound = {}
+            g._db_replica_connections = bound
+        return bound
+
+    def _release_request_connections(self, exc: Optional[BaseException] = None) -> None:
+        """请求结束时归还绑定的连接, 出错时先回滚未提交的事务"""
+        g.pop("_db_sticky", None)
+        for key in ("_db_connections", "_db_replica_connections"):
+            bound = g.pop(key, None)
+            if not bound:
+                continue
+            for pool, adapter in bound.values():
+                if exc is not None:
+                    try:
+                        adapter.rollback()
+                    except Exception:
+                        pass
+                pool.return_connection(adapter)
+
+    def _is_sticky(self, name: str) -> bool:
+        """当前请求是否已写入过主库, 之后的只读查询需使用主库"""
+        sticky: Optional[Set[str]] = g.get("_db_sticky")
+        return sticky is not None and name in sticky
+
+    def _mark_sticky(self, name: str) -> None:
+        """标记当前请求已写入主库"""
+        sticky: Optional[Set[str]] = g.get("_db_sticky")
+        if sticky is None:
+            sticky = set()
+            g._db_sticky = sticky
+        sticky.add(name)
+
+    def _choose_replica(self, name: str) -> Optional[ConnectionPool]:
+        """按负载均衡策略选择只读副本, 没有副本时返回None"""
+        replicas = self._replicas.get(name)
+        if not replicas:
+            return None
+        if self._replica_strategies.get(name) == "least_in_use":
+            return min(replicas, key=lambda replica: replica.checked_out)
+        return replicas[next(self._replica_counters[name]) % len(replicas)]
+
+    def _get_replica_db(self, name: str, replica: ConnectionPool) -> Tuple[ConnectionPool, DatabaseAdapter]:
+        """从副本获取连接, 副本不可用时改用主库"""
+        try:
+            return replica, replica.get_connection()
+        except Exception as e:
+            logging.warning(f"只读副本不可用, 改用主库: {e}")
+            pool = self._pools[name]
+            return pool, pool.get_connection()
+
+    def _get_request_replica_db(self, name: str, bound: Dict[str, Tuple[ConnectionPool, DatabaseAdapter]]) -> DatabaseAdapter:
+        """获取当前请求绑定的副本连接, 尚未绑定时选择副本获取并绑定, 副本不可用时使用请求的主库连接"""
+        replicas = self._request_replica_connections()
+        entry = replicas.get(name)
+        if entry is not None:
+            if entry[0] in self._replicas.get(name, ()):
+                return entry[1]
+            # 副本已被移除(主库重新注册), 旧连接归还给原连接池
+            del replicas[name]
+            entry[0].return_connection(entry[1])
+
+        replica = self._choose_replica(name)
+        try:
+            adapter = replica.get_connection()  # pyright: ignore[reportOptionalMemberAccess]
+        except Exception as e:
+            logging.warning(f"只读副本不可用, 改用主库: {e}")
+            return self._get_request_db(name, bound)
+        replicas[name] = (replica, adapter)  # pyright: ignore[reportArgumentType]
+        return adapter
+
+    def _get_request_db(self, name: str, bound: Dict[str, Tuple[ConnectionPool, DatabaseAdapter]]) -> DatabaseAdapter:
+        """获取当前请求绑定的连接, 尚未绑定时从连接池获取并绑定"""
+        if name not in self._pools:
+            raise ValueError(f"未注册的数据库: {name}")
+        pool = self._pools[name]
+
+        entry = bound.get(name)
+        if entry is not None:
+            if entry[0] is pool:
+                return entry[1]
+            # 请求内连接池被重新注册(如安装流程), 旧连接归还给原连接池
+            del bound[name]
+            entry[0].return_connection(entry[1])
+
+        adapter = pool.get_connection()
+        bound[name] = (pool, adapter)
+        return adapter
+
+    @staticmethod
+    @contextmanager
+    def _rollback_on_error(adapter: DatabaseAdapter) -> Iterator[DatabaseAdapter]:
+        """作用域内抛出异常时回滚未提交的事务
+
+        连接处于外层 transaction() 中时作用域不拥有该事务, rollback 只标记整个事务需要回滚,
+        调用方捕获了异常也不会撤销外层已执行的写入, 外层结束时回滚并抛出异常。
+        """
+        try:
+            yield adapter
+        except Exception:
+            try:
+                adapter.rollback()
+            except Exception:
+                pass
+            raise
+
+    @contextmanager
+    def connection(self, name: Optional[str] = None, readonly: bool = False) -> Iterator[DatabaseAdapter]:
+        """
+        在作用域内使用一个数据库连接, 保证每次逻辑操作只获取、归还一次连接
+
+        作用域内抛出异常时先回滚未提交的事务, 无论是否出错连接都会归还到连接池。
+        在已通过 init_app 绑定的Flask请求内, 连接由请求持有, 作用域结束时不归还,
+        而是在请求结束时统一归还。
+
+        用法:
+            with db_orm.connection() as db:
+                db.execute("SELECT COUNT(*) FROM users")
+                count = db.fetchone()[0]
+
+        Args:
+            name: 数据库名称,如果为None则使用默认数据库
+            readonly: 作用域内只有查询, 可以使用只读副本(见模块说明), 副本可能落后于主库
+
+        Raises:
+            ValueError: 当指定的数据库未注册时
+        """
+        if name is None:
+            name = self._default_db
+        if name not in self._pools:
+            raise ValueError(f"未注册的数据库: {name}")
+
+        bound = self._request_connections()
+        if readonly and self._replicas.get(name) and (bound is None or not self._is_sticky(name)):
+            if bound is not None:
+                with self._rollback_on_error(self._get_request_replica_db(name, bound)) as adapter:
+                    yield adapter
+                return
+
+            pool, adapter = self._get_replica_db(name, self._choose_replica(name))  # pyright: ignore[reportArgumentType]
+            try:
+                with self._rollback_on_error(adapter):
+                    yield adapter
+            finally:
+                pool.return_connection(adapter)
+            return
+
+        if bound is not None:
+            adapter = self._get_request_db(name, bound)
+            commit_count = adapter.commit_count
+            try:
+                with self._rollback_on_error(adapter):
+                    yield adapter
+            finally:
+                # 主库上提交过写入, 请求剩余的只读查询改用主库
+                if adapter.commit_count != commit_count and self._replicas.get(name):
+                    self._mark_sticky(name)  # pyright: ignore[reportArgumentType]
+            return
+
+        adapter = self.get_db(name)
+        try:
+            with self._rollback_on_error(adapter):
+                yield adapter
+        finally:
+            self.return_db(adapter, name)
+
+    @contextmanager
+    def transaction(self, name: Optional[str] = None) -> Iterator[DatabaseAdapter]:
+        """
+        在主库上执行事务, 作用域正常结束时提交, 抛出异常时回滚
+
+        请求内开启事务后, 该请求剩余的只读查询都使用主库。
+        请求内的作用域共用同一个连接, 事务期间其他作用域(如 db_utils 中的函数)调用的
+        commit 不会提前提交, 出错时也不会单独回滚, 整个事务在最外层 transaction() 结束时提交或回滚;
+        嵌套的 transaction() 是外层事务的一部分。
+
+        用法:
+            with db_orm.transaction() as db:
+                db.execute("UPDATE users SET ...")
+
+        Args:
+            name: 数据库名称,如果为None则使用默认数据库
+
+        Raises:
+            ValueError: 当指定的数据库未注册时
+        """
+        if name is None:
+            name = self._default_db
+        with self.connection(name) as adapter:
+            if self._request_connections() is not None:
+                self._mark_sticky(name)  # pyright: ignore[reportArgumentType]
+            adapter.begin_transaction()
+            try:
+                yield adapter
+            except BaseException:
+                adapter.end_transaction(commit=False)
+                raise
+            adapter.end_transaction()
+    
     def set_default_db(self, name: str) -> None:
         """
         设置默认数据库
@@ -95,11 +394,28 @@ class ORM:
         
         self._default_db = name
     
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        获取所有连接池的指标
+
+        Returns:
+            {数据库名称: ConnectionPool.get_metrics() 的结果}, 副本的名称为 "数据库名称.replica序号"
+        """
+        metrics = {name: pool.get_metrics() for name, pool in list(self._pools.items())}
+        for name, replicas in list(self._replicas.items()):
+            for index, replica in enumerate(replicas):
+                metrics[f"{name}.replica{index}"] = replica.get_metrics()
+        return metrics
+    
     def close_all(self) -> None:
         """关闭所有连接池"""
         for pool in self._pools.values():
             pool.close()
+        for replicas in self._replicas.values():
+            for replica in replicas:
+                replica.close()
         self._pools.clear()
+        self._replicas.clear()
 
 
 # 全局ORM实例
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+查询构造模块
+
+用链式调用描述 SELECT 查询, 只取需要的列:
+    UserModel.select("uid", "name").where(group="admin", uid__gt=100).order_by("-uid").limit(20).all(db)
+
+条件写作 列名__操作符=值, 省略操作符时为等于, 多个条件之间为 AND:
+    eq(=)  ne(<>)  lt(<)  le(<=)  gt(>)  ge(>=)
+    in / not_in: 值为序列, 空序列分别视为恒假/恒真
+    like: 值为LIKE模式, 使用 ESCAPE '!', 见 escape_like
+    startswith: 值为普通字符串, 自动转义后按前缀匹配
+值为 None 的 eq/ne 转换为 IS NULL / IS NOT NULL。
+列名是保留字(如 group、user)时自动加引号, 别名总是加引号以保留大小写。
+
+查询的"形状"(表名、列、条件的列和操作符、IN列表长度、排序、是否有LIMIT/OFFSET/游标)
+相同时生成的SQL相同, SQL按形状编译一次后缓存, 值全部作为参数传入,
+在各连接上通过 execute_statement 复用已转换(PostgreSQL下为已PREPARE)的语句。
+
+列名只能是标识符, 不要把用户输入作为列名。
+"""
+from functools import lru_cache, partial
+from typing import Any, AsyncIterator, Iterator, Optional, Tuple
+
+from magic.utils.db.adapters import Record, escape_like, quote_identifier
+from magic.utils.db.adapters.adapters import STREAM_BATCH_SIZE
+
+# 按形状缓存的已编译SQL数量上限
+QUERY_CACHE_SIZE = 512
+
+# 条件操作符 -> SQL运算符
+OPERATORS = {
+    "eq": "=",
+    "ne": "<>",
+    "lt": "<",
+    "le": "<=",
+    "gt": ">",
+    "ge": ">=",
+    "in": "IN",
+    "not_in": "NOT IN",
+    "like": "LIKE",
+    "startswith": "LIKE",
+}
+
+# 形状中的一个条件: (列名, 操作符, IN列表长度或None)
+Condition = Tuple[str, str, Optional[int]]
+
+
+def _condition_sql(column: str, operator: str, size: Optional[int]) -> str:
+    """生成单个条件"""
+    quoted = quote_identifier(column)
+    if operator == "is_null":
+        return f"{quoted} IS NULL"
+    if operator == "not_null":
+        return f"{quoted} IS NOT NULL"
+    if operator in ("in", "not_in"):
+        if not size:
+            return "1 = 0" if operator == "in" else "1 = 1"
+        return f"{quoted} {OPERATORS[operator]} ({', '.join(['?'] * size)})"
+    if operator in ("like", "startswith"):
+        return f"{quoted} LIKE ? ESCAPE '!'"
+    return f"{quoted} {OPERATORS[operator]} ?"
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def compile_query(shape: Tuple[Any, ...]) -> str:
+    """
+    将查询形状编译为SQL
+
+    :param shape: Query.shape(), (操作, 表名, 列, 条件, 排序, 游标列数, 是否有LIMIT, 是否有OFFSET)
+    :return: 使用 ? 占位符和反引号标识符的SQL
+    """
+    operation, table, columns, conditions, order, keyset, has_limit, has_offset = shape
+    if operation == "count":
+        selected = "COUNT(*)"
+    elif operation == "exists":
+        selected = "1"
+    elif columns:
+        selected = ", ".join(
+            quote_identifier(column) if alias is None else f"{quote_identifier(column)} AS {quote_identifier(alias, quote=True)}"
+            for column, alias in columns
+        )
+    else:
+        selected = "*"
+
+    where = [_condition_sql(*condition) for condition in conditions]
+    if keyset:
+        # 游标分页: 取排序在上一页最后一行之后的记录, 多列时使用行值比较
+        keys = [quote_identifier(column) for column, _ in order[:keyset]]
+        comparison = "<" if order[0][1] else ">"
+        if keyset == 1:
+            where.append(f"{keys[0]} {comparison} ?")
+        else:
+            where.append(f"({', '.join(keys)}) {comparison} ({', '.join(['?'] * keyset)})")
+
+    parts = [f"SELECT {selected} FROM {table}"]
+    if where:
+        parts.append("WHERE " + " AND ".join(where))
+    if operation == "select":
+        if order:
+            parts.append("ORDER BY " + ", ".join(f"{quote_identifier(column)} DESC" if desc else quote_identifier(column) for column, desc in order))
+        if has_limit:
+            parts.append("LIMIT ?")
+        if has_offset:
+            parts.append("OFFSET ?")
+    elif operation == "exists":
+        parts.append("LIMIT 1")
+    return " ".join(parts)
+
+
+class Query:
+    """
+    不可变的SELECT查询, 每个构造方法返回新的Query
+
+    通常通过 Model.select / Model.where 创建, 也可以直接指定表名:
+        Query(context.table("users")).select("uid").where(mail=email).first(db)
+    """
+
+    __slots__ = ("_table", "_primary_key", "_columns", "_conditions", "_params", "_order", "_after", "_limit", "_offset")
+
+    def __init__(self, table: str, primary_key: str = "uid"):
+        """
+        :param table: 表名(含前缀)
+        :param primary_key: 主键列名, 没有指定排序时游标分页按主键升序
+        """
+        self._table: str = table
+        self._primary_key: str = primary_key
+        self._columns: Tuple[Tuple[str, Optional[str]], ...] = ()
+        self._conditions: Tuple[Condition, ...] = ()
+        self._params: Tuple[Any, ...] = ()
+        self._order: Tuple[Tuple[str, bool], ...] = ()
+        self._after: Tuple[Any, ...] = ()
+        self._limit: Optional[int] = None
+        self._offset: Optional[int] = None
+
+    def _copy(self) -> "Query":
+        """复制查询"""
+        query = Query.__new__(Query)
+        query._table = self._table
+        query._primary_key = self._primary_key
+        query._columns = self._columns
+        query._conditions = self._conditions
+        query._params = self._params
+        query._order = self._order
+        query._after = self._after
+        query._limit = self._limit
+        query._offset = self._offset
+        return query
+
+    def table(self, table: str) -> "Query":
+        """改为查询指定的表, 用于按数据库上下文加前缀的表名"""
+        query = self._copy()
+        query._table = table
+        return query
+
+    def select(self, *columns: str, **aliases: str) -> "Query":
+        """
+        指定查询的列, 不调用时为 SELECT *
+
+        :param columns: 列名
+        :param aliases: 别名=列名, 如 email="mail" 生成 mail AS email, 排在 columns 之后
+        """
+        selected = [(column, None) for column in columns]
+        if aliases:
+            selected += [(column, alias) for alias, column in aliases.items()]
+        query = self._copy()
+        query._columns = self._columns + tuple(selected)
+        return query
+
+    def where(self, **conditions: Any) -> "Query":
+        """
+        追加条件, 与已有条件之间为 AND
+
+        :param conditions: 列名__操作符=值, 见模块说明
+        :raises ValueError: 操作符不支持时
+        """
+        shape = list(self._conditions)
+        params = list(self._params)
+        for key, value in conditions.items():
+            column, _, operator = key.rpartition("__")
+            if not column:
+                column, operator = key, "eq"
+            elif operator not in OPERATORS:
+                raise ValueError(f"不支持的条件操作符: {operator}")
+            if value is None and operator in ("eq", "ne"):
+                shape.append((column, "is_null" if operator == "eq" else "not_null", None))
+            elif operator in ("in", "not_in"):
+                values = tuple(value)
+                shape.append((column, operator, len(values)))
+                params.extend(values)
+            else:
+                if operator == "startswith":
+                    value = f"{escape_like(value)}%"
+                shape.append((column, operator, None))
+                params.append(value)
+        query = self._copy()
+        query._conditions = tuple(shape)
+        query._params = tuple(params)
+        return query
+
+    def order_by(self, *columns: str) -> "Query":
+        """
+        指定排序, 替换已有排序
+
+        :param columns: 列名, 前缀 - 表示降序, 如 order_by("-createdAt", "uid")
+        :raises ValueError: 已经调用过 after 时, 游标值对应的是原来的排序列
+        """
+        if self._after:
+            raise ValueError("游标分页的排序已确定, 请在 after 之前调用 order_by")
+        query = self._copy()
+        query._order = tuple((column[1:], True) if column.startswith("-") else (column, False) for column in columns)
+        return query
+
+    def after(self, *values: Any) -> "Query":
+        """
+        游标分页, 只返回排序在 values 之后的记录, values 为上一页最后一行的排序列的值
+
+        没有指定排序时按主键升序; 多个排序列时方向必须相同。与 OFFSET 分页相比,
+        翻到后面的页时数据库不需要扫描并丢弃前面的行。
+
+        :raises ValueError: 值的个数与排序列数不一致, 或排序方向不同时
+        """
+        query = self if self._order else self.order_by(self._primary_key)
+        if not values or len(values) != len(query._order):
+            raise ValueError("游标分页的值必须与排序列一一对应")
+        if len({desc for _, desc in query._order}) > 1:
+            raise ValueError("游标分页的排序列方向必须相同")
+        query = query._copy()
+        query._after = values
+        return query
+
+    def limit(self, count: int, offset: Optional[int] = None) -> "Query":
+        """限制返回的行数, offset 为跳过的行数"""
+        query = self._copy()
+        query._limit = count
+        query._offset = offset
+        return query
+
+    def shape(self, operation: str = "select") -> Tuple[Any, ...]:
+        """查询形状, 形状相同的查询使用同一条SQL, 同时作为语句缓存键"""
+        return (
+            operation,
+            self._table,
+            self._columns,
+            self._conditions,
+            self._order,
+            len(self._after),
+            self._limit is not None,
+            self._offset is not None,
+        )
+
+    def params(self, operation: str = "select") -> Tuple[Any, ...]:
+        """查询参数, 顺序与 compile_query 生成的占位符一致"""
+        params = self._params + self._after
+        if operation == "select":
+            if self._limit is not None:
+                params += (self._limit,)
+            if self._offset is not None:
+                params += (self._offset,)
+        return params
+
+    def sql(self, operation: str = "select") -> str:
+        """生成的SQL, 用于调试"""
+        return compile_query(self.shape(operation))
+
+    def _statement(self, operation: str) -> Tuple[Tuple[Any, ...], Any, Optional[Tuple[Any, ...]]]:
+        """语句缓存键、SQL生成函数和参数"""
+        shape = self.shape(operation)
+        return ("query", shape), partial(compile_query, shape), self.params(operation) or None
+
+    # 执行, db 为 DatabaseAdapter
+
+    def all(self, db) -> list[Record]:
+        """返回所有结果"""
+        db.execute_statement(*self._statement("select"))
+        return db.fetchall()
+
+    def first(self, db) -> Optional[Record]:
+        """返回第一行, 没有结果时返回None; 未指定 limit 时加上 LIMIT 1"""
+        query = self if self._limit is not None else self.limit(1)
+        db.execute_statement(*query._statement("select"))
+        return db.fetchone()
+
+    def scalar(self, db) -> Any:
+        """返回第一行第一列, 没有结果时返回None"""
+        query = self if self._limit is not None else self.limit(1)
+        db.execute_statement(*query._statement("select"))
+        return db.fetchscalar()
+
+    def count(self, db) -> int:
+        """返回满足条件的行数, 忽略排序和 LIMIT/OFFSET"""
+        db.execute_statement(*self._statement("count"))
+        return int(db.fetchscalar() or 0)
+
+    def exists(self, db) -> bool:
+        """是否存在满足条件的行, 找到第一行即停止"""
+        db.execute_statement(*self._statement("exists"))
+        return db.fetchone() is not None
+
+    def iter(self, db, batch_size: int = STREAM_BATCH_SIZE) -> Iterator[Record]:
+        """逐行迭代结果, 见 DatabaseAdapter.stream"""
+        key, build, params = self._statement("select")
+        return db.stream(db.statement(key, build), params, batch_size)
+
+    # 异步版本, db 为 AsyncDatabaseAdapter
+
+    async def aall(self, db) -> list[Record]:
+        """返回所有结果"""
+        await db.execute_statement(*self._statement("select"))
+        return await db.fetchall()
+
+    async def afirst(self, db) -> Optional[Record]:
+        """返回第一行, 没有结果时返回None"""
+        query = self if self._limit is not None else self.limit(1)
+        await db.execute_statement(*query._statement("select"))
+        return await db.fetchone()
+
+    async def ascalar(self, db) -> Any:
+        """返回第一行第一列, 没有结果时返回None"""
+        query = self if self._limit is not None else self.limit(1)
+        await db.execute_statement(*query._statement("select"))
+        return await db.fetchscalar()
+
+    async def acount(self, db) -> int:
+        """返回满足条件的行数"""
+        await db.execute_statement(*self._statement("count"))
+        return int(await db.fetchscalar() or 0)
+
+    async def aexists(self, db) -> bool:
+        """是否存在满足条件的行"""
+        await db.execute_statement(*self._statement("exists"))
+        return await db.fetchone() is not None
+
+    def aiter(self, db, batch_size: int = STREAM_BATCH_SIZE) -> AsyncIterator[Record]:
+        """逐行迭代结果, 用法为 async for row in query.aiter(db)"""
+        key, build, params = self._statement("select")
+        return db.stream(db.statement(key, build), params, batch_size)
+
+    def __repr__(self) -> str:
+        return f"<Query {self.sql()!r} {self.params()!r}>"
@@ -225,9 +225,8 @@ class install:
                     },
                 )
 
-                # 获取数据库连接
+                # 获取数据库连接, 用完归还到连接池
                 db = db_orm.get_db()
-                db.connect()
 
                 try:
                     # 设置表名
@@ -267,7 +266,7 @@ class install:
                         {"success": False, "message": f"创建管理员账号失败: {str(e)}"}
                     )
                 finally:
-                    db.disconnect()
+                    db_orm.return_db(db)
             elif db_type == "postgresql":
                 # 使用ORM系统创建PostgreSQL数据库的超级管理员
                 db_host = data.get("db_host", "localhost")
@@ -300,9 +299,8 @@ class install:
                     },
                 )
 
-                # 获取数据库连接
+                # 获取数据库连接, 用完归还到连接池
                 db = db_orm.get_db()
-                db.connect()
 
                 try:
                     # 设置表名
@@ -342,7 +340,7 @@ class install:
                         {"success": False, "message": f"创建管理员账号失败: {str(e)}"}
                     )
                 finally:
-                    db.disconnect()
+                    db_orm.return_db(db)
             else:
                 return jsonify(
                     {"success": False, "message": f"不支持的数据库类型: {db_type}"}